@@ -0,0 +1,385 @@
+"""访问控制列表模块"""
+
+import ipaddress
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from .config import ACLConfig
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+ALLOW = "allow"
+DENY = "deny"
+
+IPAddress = Union[ipaddress.IPv4Address, ipaddress.IPv6Address]
+TieBreak = Callable[[Any, Any], bool]
+
+
+class AccessDeniedError(PermissionError):
+    """目标被访问控制列表拒绝"""
+
+
+def _keep_existing(existing: Any, new: Any) -> bool:
+    return False
+
+
+class CidrTrie:
+    """
+    IP前缀树(步长8位的多位radix trie,最长前缀匹配)
+
+    每层按地址的一个字节索引,不在字节边界上的前缀在插入时展开,
+    查找最多访问4层(IPv4)或16层(IPv6),与规则数量无关。
+    """
+
+    def __init__(self):
+        # 节点结构: [子节点 {byte: node}, 本层条目 {byte: (prefixlen, value)}]
+        self._roots: Dict[int, list] = {4: [{}, {}], 6: [{}, {}]}
+        self._defaults: Dict[int, Optional[Tuple[int, Any]]] = {4: None, 6: None}
+        self.size = 0
+
+    def insert(
+        self,
+        network: Union[str, ipaddress.IPv4Network, ipaddress.IPv6Network],
+        value: Any,
+        replace_on_tie: TieBreak = _keep_existing
+    ) -> None:
+        """
+        插入前缀
+
+        Args:
+            network: CIDR字符串或网络对象
+            value: 关联值
+            replace_on_tie: 相同前缀已存在时是否用新值替换
+        """
+        if isinstance(network, str):
+            network = ipaddress.ip_network(network.strip(), strict=False)
+        version = network.version
+        plen = network.prefixlen
+        self.size += 1
+
+        if plen == 0:
+            existing = self._defaults[version]
+            if existing is None or replace_on_tie(existing[1], value):
+                self._defaults[version] = (0, value)
+            return
+
+        packed = network.network_address.packed
+        level = (plen - 1) // 8
+        node = self._roots[version]
+        for i in range(level):
+            children = node[0]
+            child = children.get(packed[i])
+            if child is None:
+                child = children[packed[i]] = [{}, {}]
+            node = child
+
+        # 展开到本层字节的所有取值
+        bits = plen - level * 8
+        base = packed[level] & (0xFF << (8 - bits)) & 0xFF
+        entries = node[1]
+        for byte in range(base, base + (1 << (8 - bits))):
+            existing = entries.get(byte)
+            if (
+                existing is None
+                or existing[0] < plen
+                or (existing[0] == plen and replace_on_tie(existing[1], value))
+            ):
+                entries[byte] = (plen, value)
+
+    def lookup(self, address: Union[str, IPAddress]) -> Optional[Any]:
+        """
+        最长前缀匹配
+
+        Args:
+            address: IP地址
+
+        Returns:
+            Optional[Any]: 匹配的值,无匹配返回None
+        """
+        if isinstance(address, str):
+            address = ipaddress.ip_address(address)
+        if address.version == 6 and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+
+        version = address.version
+        best = self._defaults[version]
+        node = self._roots[version]
+        for byte in address.packed:
+            entry = node[1].get(byte)
+            if entry is not None:
+                best = entry
+            node = node[0].get(byte)
+            if node is None:
+                break
+        return best[1] if best is not None else None
+
+
+class DomainTrie:
+    """
+    域名后缀树(按反转的标签逐级索引)
+
+    规则格式:
+        example.com     精确匹配
+        .example.com    匹配 example.com 及其所有子域名
+        *.example.com   仅匹配子域名
+    精确匹配优先,其次是更长的后缀。同一节点上的 .example.com 和 *.example.com
+    对子域名同样具体,插入时按 replace_on_tie 合并为一个子域名条目。
+    """
+
+    _EXACT = "\0exact"
+    _SUFFIX = "\0suffix"
+    # 匹配该节点所有子域名的合并条目(来自 _SUFFIX 和 *. 规则)
+    _CHILDREN = "\0children"
+
+    def __init__(self):
+        self._root: Dict[str, Any] = {}
+        self.size = 0
+
+    @staticmethod
+    def normalize(domain: str) -> str:
+        return domain.strip().lower().rstrip('.')
+
+    def insert(
+        self,
+        pattern: str,
+        value: Any,
+        replace_on_tie: TieBreak = _keep_existing
+    ) -> None:
+        """
+        插入域名规则
+
+        Args:
+            pattern: 域名规则
+            value: 关联值
+            replace_on_tie: 相同规则已存在时是否用新值替换
+        """
+        pattern = self.normalize(pattern)
+        if pattern.startswith("*."):
+            key, pattern = None, pattern[2:]
+        elif pattern.startswith("."):
+            key, pattern = self._SUFFIX, pattern[1:]
+        else:
+            key = self._EXACT
+        self.size += 1
+
+        node = self._root
+        for label in reversed(pattern.split('.')):
+            child = node.get(label)
+            if child is None:
+                child = node[label] = {}
+            node = child
+
+        if key is not None and (key not in node or replace_on_tie(node[key], value)):
+            node[key] = value
+        if key != self._EXACT:
+            children = self._CHILDREN
+            if children not in node or replace_on_tie(node[children], value):
+                node[children] = value
+
+    def lookup(self, domain: str) -> Optional[Any]:
+        """
+        查找最具体的匹配
+
+        Args:
+            domain: 域名
+
+        Returns:
+            Optional[Any]: 匹配的值,无匹配返回None
+        """
+        labels = self.normalize(domain).split('.')
+        best = None
+        node = self._root
+        remaining = len(labels)
+        for label in reversed(labels):
+            node = node.get(label)
+            if node is None:
+                return best
+            remaining -= 1
+            if remaining:
+                if self._CHILDREN in node:
+                    best = node[self._CHILDREN]
+            else:
+                if self._EXACT in node:
+                    return node[self._EXACT]
+                if self._SUFFIX in node:
+                    return node[self._SUFFIX]
+        return best
+
+
+def parse_port_range(item: Union[int, str]) -> Tuple[int, int]:
+    """解析端口或端口范围 (如 443 或 "8000-9000")"""
+    if isinstance(item, int):
+        return item, item
+    if '-' in item:
+        low, high = item.split('-', 1)
+        return int(low), int(high)
+    return int(item), int(item)
+
+
+def parse_address(host: str) -> Optional[IPAddress]:
+    """如果host是IP地址字面量则返回地址对象"""
+    # 域名的最后一个标签不会是纯数字,跳过代价较高的异常路径
+    if ':' not in host and not host[-1:].isdigit():
+        return None
+    try:
+        return ipaddress.ip_address(host.strip('[]'))
+    except ValueError:
+        return None
+
+
+def read_rule_file(path: Union[str, Path]) -> Iterable[str]:
+    """读取规则文件,忽略空行和 # 注释"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                yield line
+
+
+def _deny_wins(existing: Any, new: Any) -> bool:
+    return new == DENY
+
+
+class AccessControl:
+    """
+    编译后的访问控制列表
+
+    客户端地址、目标地址(IP或域名)、目标端口三个维度分别匹配,
+    每个维度取最具体的规则;同样具体时拒绝优先;
+    无规则匹配时,若该维度配置了允许列表则拒绝,否则允许。
+    """
+
+    def __init__(self, config: ACLConfig):
+        self.config = config
+
+        self.client_cidrs = CidrTrie()
+        self.target_cidrs = CidrTrie()
+        self.target_domains = DomainTrie()
+        self.ports: List[Optional[str]] = [None] * 65536
+
+        self.client_allow_only = bool(config.client_allow)
+        self.target_allow_only = bool(config.target_allow or config.target_allow_files)
+        self.port_allow_only = bool(config.port_allow)
+
+        for network in config.client_allow:
+            self.client_cidrs.insert(network, ALLOW, _deny_wins)
+        for network in config.client_deny:
+            self.client_cidrs.insert(network, DENY, _deny_wins)
+
+        for action, rules, files in (
+            (ALLOW, config.target_allow, config.target_allow_files),
+            (DENY, config.target_deny, config.target_deny_files),
+        ):
+            for rule in rules:
+                self._add_target(rule, action)
+            for path in files:
+                for rule in read_rule_file(path):
+                    self._add_target(rule, action)
+
+        for action, items in ((ALLOW, config.port_allow), (DENY, config.port_deny)):
+            for item in items:
+                low, high = parse_port_range(item)
+                for port in range(low, high + 1):
+                    if self.ports[port] != DENY:
+                        self.ports[port] = action
+
+        # 统计
+        self.denied_clients = 0
+        self.denied_targets = 0
+
+        logger.info(
+            "acl_compiled",
+            client_rules=self.client_cidrs.size,
+            target_cidr_rules=self.target_cidrs.size,
+            target_domain_rules=self.target_domains.size
+        )
+
+    def _add_target(self, rule: str, action: str) -> None:
+        try:
+            self.target_cidrs.insert(rule, action, _deny_wins)
+        except ValueError:
+            self.target_domains.insert(rule, action, _deny_wins)
+
+    def check_client(self, client_ip: str) -> bool:
+        """
+        检查客户端地址是否允许连接
+
+        Args:
+            client_ip: 客户端IP
+
+        Returns:
+            bool: 是否允许
+        """
+        address = parse_address(client_ip)
+        action = self.client_cidrs.lookup(address) if address is not None else None
+        if action == DENY or (action is None and self.client_allow_only):
+            self.denied_clients += 1
+            return False
+        return True
+
+    def check_target(self, host: str, port: int) -> bool:
+        """
+        检查目标地址和端口是否允许访问
+
+        Args:
+            host: 目标主机(IP或域名)
+            port: 目标端口
+
+        Returns:
+            bool: 是否允许
+        """
+        port_action = self.ports[port] if 0 <= port < 65536 else None
+        if port_action == DENY or (port_action is None and self.port_allow_only):
+            self.denied_targets += 1
+            return False
+
+        address = parse_address(host)
+        if address is not None:
+            action = self.target_cidrs.lookup(address)
+        else:
+            action = self.target_domains.lookup(host)
+        if action == DENY or (action is None and self.target_allow_only):
+            self.denied_targets += 1
+            return False
+        return True
+
+    def check_resolved(self, address: str) -> bool:
+        """
+        检查域名解析后的实际地址
+
+        只有明确命中拒绝规则时才拒绝,防止域名指向内网地址绕过限制。
+
+        Args:
+            address: 实际连接的IP
+
+        Returns:
+            bool: 是否允许
+        """
+        parsed = parse_address(address)
+        if parsed is not None and self.target_cidrs.lookup(parsed) == DENY:
+            self.denied_targets += 1
+            return False
+        return True
+
+    def get_stats_dict(self) -> dict:
+        """获取访问控制统计信息"""
+        return {
+            "denied_clients": self.denied_clients,
+            "denied_targets": self.denied_targets,
+        }
+
+
+def create_access_control(config: Optional[ACLConfig]) -> Optional[AccessControl]:
+    """
+    创建访问控制列表
+
+    Args:
+        config: ACL配置
+
+    Returns:
+        Optional[AccessControl]: 未启用时返回None
+    """
+    if not config or not config.enabled:
+        return None
+    return AccessControl(config)
@@ -0,0 +1,264 @@
+"""管理接口模块"""
+
+import asyncio
+import hmac
+import json
+import threading
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from .config import AdminConfig
+from .logger import get_logger
+from .profiler import LoopMonitor, SamplingProfiler
+from .timeseries import RESOLUTIONS, TimeSeriesRecorder
+
+if TYPE_CHECKING:
+    from .proxy import SimpleHTTPProxy
+
+logger = get_logger(__name__)
+
+# (状态码, Content-Type, 响应体)
+Response = Tuple[int, str, bytes]
+Handler = Callable[[Dict[str, str]], Awaitable[Response]]
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    401: "Unauthorized",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    409: "Conflict",
+}
+
+
+def json_response(data, status: int = 200) -> Response:
+    return status, "application/json", json.dumps(data, ensure_ascii=False, default=str).encode('utf-8')
+
+
+def error_response(status: int, message: str) -> Response:
+    return json_response({"error": message}, status)
+
+
+class AdminServer:
+    """
+    管理接口(HTTP/JSON)
+
+    路由:
+        GET /stats                               代理统计信息
+        GET /profile?seconds=10&interval_ms=5    采样分析,返回折叠栈文本
+        GET /loop                                事件循环延迟和阻塞记录
+        GET /history?resolution=second&last=60   连接数和吞吐的时间序列(second / minute / hour)
+        GET /connections?top=20&sort=rate        活跃连接(按 rate / bytes / age 排序)
+        DELETE /connections/{id}                 中止指定连接
+    """
+
+    def __init__(self, proxy: "SimpleHTTPProxy", config: AdminConfig):
+        """
+        初始化管理接口
+
+        Args:
+            proxy: 代理服务器
+            config: 管理接口配置
+        """
+        self.proxy = proxy
+        self.config = config
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.loop_monitor = (
+            LoopMonitor(config.loop_monitor_interval, config.slow_callback_threshold)
+            if config.loop_monitor else None
+        )
+        self.history = (
+            TimeSeriesRecorder(
+                proxy.stats,
+                proxy.registry,
+                config.history_seconds,
+                config.history_minutes,
+                config.history_hours
+            )
+            if config.history else None
+        )
+        self._loop_thread_id: Optional[int] = None
+        self._profiling = False
+        self.routes: Dict[Tuple[str, str], Handler] = {
+            ("GET", "/stats"): self._handle_stats,
+            ("GET", "/profile"): self._handle_profile,
+            ("GET", "/loop"): self._handle_loop,
+            ("GET", "/history"): self._handle_history,
+            ("GET", "/connections"): self._handle_connections,
+            ("DELETE", "/connections/{id}"): self._handle_kill,
+        }
+
+    async def start(self) -> None:
+        """启动管理接口和事件循环监控"""
+        self._loop_thread_id = threading.get_ident()
+        if self.loop_monitor is not None:
+            self.loop_monitor.start()
+        if self.history is not None:
+            self.history.start()
+        self.server = await asyncio.start_server(self._handle, self.config.host, self.config.port)
+        addr = self.server.sockets[0].getsockname()
+        logger.info(f"管理接口监听在 {addr[0]}:{addr[1]}")
+
+    async def stop(self) -> None:
+        """停止管理接口"""
+        if self.loop_monitor is not None:
+            self.loop_monitor.stop()
+        if self.history is not None:
+            self.history.stop()
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    def _authorized(self, headers: Dict[str, str]) -> bool:
+        if not self.config.token:
+            return True
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        return scheme.lower() == "bearer" and hmac.compare_digest(
+            token.strip().encode(), self.config.token.encode()
+        )
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if not line or line == b'\r\n':
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            if len(request_line) < 2:
+                response = error_response(400, "无效的请求")
+            elif not self._authorized(headers):
+                response = error_response(401, "未授权")
+            else:
+                method, target = request_line[0].upper(), request_line[1]
+                url = urlsplit(target)
+                params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                response = await self._dispatch(method, url.path.rstrip('/') or '/', params)
+
+            status, content_type, body = response
+            head = (
+                f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                f"Content-Type: {content_type}; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n"
+                "\r\n"
+            )
+            writer.write(head.encode('latin-1') + body)
+            await writer.drain()
+        except Exception as e:
+            logger.error("admin_request_error", error=str(e), exc_info=True)
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method: str, path: str, params: Dict[str, str]) -> Response:
+        handler = self.routes.get((method, path))
+        if handler is not None:
+            return await handler(params)
+
+        # 带路径参数的路由,如 /connections/{id}
+        prefix, _, tail = path.rpartition('/')
+        handler = self.routes.get((method, prefix + "/{id}"))
+        if handler is not None and tail:
+            return await handler({**params, "id": tail})
+
+        if any(route_path == path for _, route_path in self.routes):
+            return error_response(405, "方法不允许")
+        return error_response(404, "未找到")
+
+    async def _handle_stats(self, params: Dict[str, str]) -> Response:
+        return json_response(self.proxy.get_stats_dict())
+
+    async def _handle_profile(self, params: Dict[str, str]) -> Response:
+        try:
+            seconds = float(params.get("seconds", 10))
+            interval_ms = float(params.get("interval_ms", 5))
+        except ValueError:
+            return error_response(400, "无效的参数")
+        if not 0 < seconds <= self.config.max_profile_seconds:
+            return error_response(400, f"seconds 必须在 0 到 {self.config.max_profile_seconds} 之间")
+        if not 1 <= interval_ms <= 1000:
+            return error_response(400, "interval_ms 必须在 1 到 1000 之间")
+        if self._profiling:
+            return error_response(409, "已有采样分析正在进行")
+
+        profiler = SamplingProfiler(
+            self._loop_thread_id,
+            interval=interval_ms / 1000,
+            include_idle=params.get("idle", "0").lower() in ("1", "true", "yes")
+        )
+        self._profiling = True
+        try:
+            logger.info("profile_started", seconds=seconds, interval_ms=interval_ms)
+            await asyncio.to_thread(profiler.run, seconds)
+        finally:
+            self._profiling = False
+        logger.info("profile_finished", samples=profiler.samples, idle_samples=profiler.idle_samples)
+        return 200, "text/plain", profiler.format_collapsed().encode('utf-8')
+
+    async def _handle_loop(self, params: Dict[str, str]) -> Response:
+        if self.loop_monitor is None:
+            return error_response(404, "未启用事件循环监控")
+        return json_response(self.loop_monitor.get_stats_dict())
+
+    async def _handle_history(self, params: Dict[str, str]) -> Response:
+        if self.history is None:
+            return error_response(404, "未启用时间序列记录")
+        resolution = params.get("resolution", "second")
+        if resolution not in RESOLUTIONS:
+            return error_response(400, f"resolution 必须是 {' / '.join(RESOLUTIONS)}")
+        try:
+            last = int(params.get("last", 60))
+        except ValueError:
+            return error_response(400, "无效的参数")
+        return json_response(self.history.query(resolution, last))
+
+    async def _handle_connections(self, params: Dict[str, str]) -> Response:
+        sort = params.get("sort", "rate")
+        if sort not in self.proxy.registry.SORT_KEYS:
+            return error_response(400, f"sort 必须是 {' / '.join(self.proxy.registry.SORT_KEYS)}")
+        try:
+            top = int(params.get("top", 20))
+        except ValueError:
+            return error_response(400, "无效的参数")
+        return json_response({
+            "active": len(self.proxy.registry),
+            "connections": self.proxy.registry.top(max(top, 0), sort),
+        })
+
+    async def _handle_kill(self, params: Dict[str, str]) -> Response:
+        try:
+            conn_id = int(params["id"])
+        except ValueError:
+            return error_response(400, "无效的连接ID")
+        record = self.proxy.registry.get(conn_id)
+        if record is None or not self.proxy.registry.kill(conn_id):
+            return error_response(404, f"连接不存在: {conn_id}")
+        logger.warning(
+            "connection_killed",
+            id=conn_id,
+            client=f"{record.client_ip}:{record.client_port}",
+            target=f"{record.target_host}:{record.target_port}"
+        )
+        return json_response({"killed": conn_id})
+
+
+def create_admin_server(
+    proxy: "SimpleHTTPProxy",
+    config: Optional[AdminConfig]
+) -> Optional[AdminServer]:
+    """
+    创建管理接口
+
+    Args:
+        proxy: 代理服务器
+        config: 管理接口配置
+
+    Returns:
+        Optional[AdminServer]: 未启用时返回None
+    """
+    if not config or not config.enabled:
+        return None
+    return AdminServer(proxy, config)
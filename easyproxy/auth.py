@@ -4,6 +4,7 @@ from typing import Optional, Tuple
 import base64
 from .config import AuthConfig
 from .logger import get_logger
+from .users import UserStore, create_user_store
 
 logger = get_logger(__name__)
 
@@ -18,6 +19,16 @@ class Authenticator:
         """检查认证是否启用"""
         return self.config.enabled
     
+    def start(self) -> None:
+        """启动后台任务(如用户文件变化检测)"""
+    
+    def stop(self) -> None:
+        """停止后台任务"""
+    
+    def get_stats_dict(self) -> Optional[dict]:
+        """获取认证统计信息"""
+        return None
+    
     def authenticate(self, credentials: dict) -> bool:
         """
         认证用户
@@ -34,6 +45,20 @@ class Authenticator:
 class BasicAuthenticator(Authenticator):
     """Basic Auth认证器"""
     
+    def __init__(self, config: AuthConfig):
+        super().__init__(config)
+        self.users: UserStore = create_user_store(config)
+        logger.info(f"已加载 {len(self.users)} 个用户 ({self.users.source})")
+    
+    def start(self) -> None:
+        self.users.start()
+    
+    def stop(self) -> None:
+        self.users.stop()
+    
+    def get_stats_dict(self) -> Optional[dict]:
+        return self.users.get_stats_dict()
+    
     def authenticate_http(self, auth_header: Optional[str]) -> Tuple[bool, Optional[str]]:
         """
         HTTP Basic Auth认证
@@ -56,11 +81,12 @@ class BasicAuthenticator(Authenticator):
         username, password = credentials
         
         # 验证凭据
-        if self.config.verify_credentials(username, password):
-            logger.info("auth_success", username=username)
+        reason = self.users.verify(username, password)
+        if reason is None:
+            logger.debug("auth_success", username=username)
             return (True, username)
         else:
-            logger.warning("auth_failed", username=username, reason="invalid_credentials")
+            logger.warning("auth_failed", username=username, reason=reason)
             return (False, username)
     
     def authenticate_socks5(self, username: str, password: str) -> bool:
@@ -77,11 +103,12 @@ class BasicAuthenticator(Authenticator):
         if not self.config.enabled:
             return True
         
-        if self.config.verify_credentials(username, password):
-            logger.info("socks5_auth_success", username=username)
+        reason = self.users.verify(username, password)
+        if reason is None:
+            logger.debug("socks5_auth_success", username=username)
             return True
         else:
-            logger.warning("socks5_auth_failed", username=username)
+            logger.warning("socks5_auth_failed", username=username, reason=reason)
             return False
     
     def generate_http_challenge(self) -> str:
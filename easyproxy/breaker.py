@@ -0,0 +1,155 @@
+"""目标熔断模块"""
+
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from .config import CircuitBreakerConfig
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(ConnectionRefusedError):
+    """目标处于熔断状态,未尝试连接直接失败"""
+
+
+class _Circuit:
+    """单个目标的熔断状态"""
+
+    __slots__ = ("state", "failures", "opened_at", "cooldown", "probes")
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.cooldown = 0.0
+        self.probes = 0
+
+
+class CircuitBreaker:
+    """
+    按 (host, port) 的熔断器
+
+    连续失败达到阈值后熔断,冷却期内的连接请求直接失败;
+    冷却结束后进入半开状态,只放行有限数量的探测连接:
+    探测成功则恢复,失败则重新熔断并将冷却时间加倍(不超过上限)。
+    只为出现过失败的目标保存状态,条目数量有上限(LRU淘汰)。
+    """
+
+    def __init__(self, config: CircuitBreakerConfig):
+        """
+        初始化熔断器
+
+        Args:
+            config: 熔断配置
+        """
+        self.config = config
+        self._circuits: "OrderedDict[Tuple[str, int], _Circuit]" = OrderedDict()
+
+        # 统计
+        self.fast_failures = 0
+        self.opened = 0
+
+    def check(self, host: str, port: int) -> None:
+        """
+        连接前检查目标是否允许尝试
+
+        Args:
+            host: 目标主机
+            port: 目标端口
+
+        Raises:
+            CircuitOpenError: 目标处于熔断状态或半开探测名额已满
+        """
+        circuit = self._circuits.get((host, port))
+        if circuit is None or circuit.state == CLOSED:
+            return
+
+        if circuit.state == OPEN:
+            remaining = circuit.opened_at + circuit.cooldown - time.monotonic()
+            if remaining > 0:
+                self.fast_failures += 1
+                raise CircuitOpenError(f"目标已熔断,{remaining:.1f}秒后重试: {host}:{port}")
+            circuit.state = HALF_OPEN
+            circuit.probes = 0
+
+        if circuit.probes >= self.config.half_open_max:
+            self.fast_failures += 1
+            raise CircuitOpenError(f"目标熔断探测中: {host}:{port}")
+        circuit.probes += 1
+
+    def record_success(self, host: str, port: int) -> None:
+        """记录连接成功"""
+        circuit = self._circuits.pop((host, port), None)
+        if circuit is not None and circuit.state != CLOSED:
+            logger.info("circuit_closed", target=f"{host}:{port}")
+
+    def release(self, host: str, port: int) -> None:
+        """连接尝试被取消(如客户端断开),归还半开探测名额"""
+        circuit = self._circuits.get((host, port))
+        if circuit is not None and circuit.state == HALF_OPEN and circuit.probes > 0:
+            circuit.probes -= 1
+
+    def record_failure(self, host: str, port: int) -> None:
+        """记录连接失败(超时、拒绝、DNS解析失败等)"""
+        key = (host, port)
+        circuit = self._circuits.get(key)
+        if circuit is None:
+            circuit = self._circuits[key] = _Circuit()
+            if len(self._circuits) > self.config.max_entries:
+                self._circuits.popitem(last=False)
+        else:
+            self._circuits.move_to_end(key)
+
+        if circuit.state == HALF_OPEN:
+            # 探测失败,重新熔断并延长冷却时间
+            circuit.cooldown = min(circuit.cooldown * 2, self.config.max_cooldown)
+            self._open(circuit, host, port)
+            return
+
+        circuit.failures += 1
+        if circuit.state == CLOSED and circuit.failures >= self.config.failure_threshold:
+            circuit.cooldown = self.config.cooldown
+            self._open(circuit, host, port)
+
+    def _open(self, circuit: _Circuit, host: str, port: int) -> None:
+        circuit.state = OPEN
+        circuit.opened_at = time.monotonic()
+        circuit.probes = 0
+        self.opened += 1
+        logger.warning(
+            "circuit_opened",
+            target=f"{host}:{port}",
+            failures=circuit.failures,
+            cooldown=circuit.cooldown
+        )
+
+    def get_stats_dict(self) -> dict:
+        """获取熔断统计信息"""
+        open_count = sum(1 for c in self._circuits.values() if c.state != CLOSED)
+        return {
+            "tracked": len(self._circuits),
+            "open": open_count,
+            "opened_total": self.opened,
+            "fast_failures": self.fast_failures,
+        }
+
+
+def create_circuit_breaker(config: Optional[CircuitBreakerConfig]) -> Optional[CircuitBreaker]:
+    """
+    创建熔断器
+
+    Args:
+        config: 熔断配置
+
+    Returns:
+        Optional[CircuitBreaker]: 未启用时返回None
+    """
+    if not config or not config.enabled:
+        return None
+    return CircuitBreaker(config)
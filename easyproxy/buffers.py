@@ -0,0 +1,122 @@
+"""中继缓冲区池模块"""
+
+from typing import List
+
+
+class BufferPool:
+    """
+    预分配的 bytearray 缓冲区池
+
+    中继通过 recv_into 直接读入池中的缓冲区,避免每次读取都分配新的 bytes 对象。
+    空闲缓冲区数量有上限,超出部分在归还时直接丢弃交给GC。
+    """
+
+    def __init__(self, buffer_size: int, preallocate: int = 0, max_free: int = 0):
+        """
+        初始化缓冲区池
+
+        Args:
+            buffer_size: 单个缓冲区大小(字节)
+            preallocate: 启动时预分配的缓冲区数量
+            max_free: 最多保留的空闲缓冲区数量
+        """
+        self.buffer_size = buffer_size
+        self.max_free = max(max_free, preallocate)
+        self._free: List[bytearray] = [bytearray(buffer_size) for _ in range(preallocate)]
+
+        # 统计
+        self.allocated = preallocate
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.discarded = 0
+
+    def acquire(self) -> bytearray:
+        """取出一个缓冲区,池空时新分配"""
+        if self._free:
+            buffer = self._free.pop()
+        else:
+            buffer = bytearray(self.buffer_size)
+            self.allocated += 1
+
+        self.in_use += 1
+        if self.in_use > self.peak_in_use:
+            self.peak_in_use = self.in_use
+        return buffer
+
+    def release(self, buffer: bytearray) -> None:
+        """归还缓冲区"""
+        self.in_use -= 1
+        if len(self._free) < self.max_free:
+            self._free.append(buffer)
+
+    def discard(self, buffer: bytearray) -> None:
+        """
+        放弃缓冲区(不再放回池中)
+
+        当 transport 可能仍持有对缓冲区的引用时使用,避免数据被后续读取覆盖。
+        """
+        self.in_use -= 1
+        self.discarded += 1
+
+    def get_stats_dict(self) -> dict:
+        """获取缓冲区池统计信息"""
+        return {
+            "buffer_size": self.buffer_size,
+            "free": len(self._free),
+            "in_use": self.in_use,
+            "peak_in_use": self.peak_in_use,
+            "allocated": self.allocated,
+            "discarded": self.discarded,
+            "pooled_bytes": (len(self._free) + self.in_use) * self.buffer_size,
+        }
+
+
+class TieredBufferPool:
+    """
+    按大小分级的缓冲区池
+
+    中继根据流量特征在相邻级别之间切换: 批量传输逐级增大缓冲区,
+    交互式的小包流量逐级缩小,避免空闲隧道占用大缓冲区。
+    """
+
+    def __init__(
+        self,
+        sizes: List[int],
+        initial_size: int,
+        preallocate: int = 0,
+        max_free: int = 0
+    ):
+        """
+        初始化分级缓冲区池
+
+        Args:
+            sizes: 各级缓冲区大小(升序)
+            initial_size: 默认初始级别的大小,预分配只作用于该级别
+            preallocate: 初始级别预分配的缓冲区数量
+            max_free: 初始级别最多保留的空闲缓冲区数量,更大的级别按字节数等比缩减
+        """
+        self.sizes = sorted(set(sizes))
+        self.pools = [
+            BufferPool(
+                size,
+                preallocate if size == initial_size else 0,
+                max_free if size <= initial_size else max(1, max_free * initial_size // size)
+            )
+            for size in self.sizes
+        ]
+
+    def tier_for(self, size: int) -> int:
+        """返回能容纳 size 的最小级别"""
+        for tier, tier_size in enumerate(self.sizes):
+            if tier_size >= size:
+                return tier
+        return len(self.sizes) - 1
+
+    def get_stats_dict(self) -> dict:
+        """获取各级缓冲区池统计信息"""
+        tiers = [pool.get_stats_dict() for pool in self.pools]
+        return {
+            "tiers": tiers,
+            "in_use_bytes": sum(t["in_use"] * t["buffer_size"] for t in tiers),
+            "pooled_bytes": sum(t["pooled_bytes"] for t in tiers),
+        }
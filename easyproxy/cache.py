@@ -0,0 +1,681 @@
+"""HTTP GET响应缓存模块(内存LRU + 磁盘两级)"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from .config import CacheConfig
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+# 可缓存的响应状态码 (RFC 9111 默认可缓存)
+CACHEABLE_STATUS = {200, 203, 300, 301, 404, 410}
+
+# 逐跳头,不能缓存也不能转发
+HOP_BY_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-connection", "proxy-authenticate",
+    "proxy-authorization", "te", "trailer", "transfer-encoding", "upgrade",
+}
+
+OpenOrigin = Callable[[], Awaitable[Tuple[asyncio.StreamReader, asyncio.StreamWriter]]]
+
+
+def parse_cache_control(value: Optional[str]) -> Dict[str, Optional[str]]:
+    """
+    解析Cache-Control头
+
+    Args:
+        value: Cache-Control头的值
+
+    Returns:
+        Dict[str, Optional[str]]: 指令名到参数的映射
+    """
+    directives: Dict[str, Optional[str]] = {}
+    if not value:
+        return directives
+    for item in value.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        if '=' in item:
+            name, arg = item.split('=', 1)
+            directives[name.strip().lower()] = arg.strip().strip('"')
+        else:
+            directives[item.lower()] = None
+    return directives
+
+
+def _parse_http_date(value: Optional[str]) -> Optional[float]:
+    """解析HTTP日期为时间戳,失败返回None"""
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def _header_map(headers: List[Tuple[str, str]]) -> Dict[str, str]:
+    """构建小写头名到值的映射(重复头以逗号合并)"""
+    result: Dict[str, str] = {}
+    for name, value in headers:
+        key = name.lower()
+        result[key] = f"{result[key]}, {value}" if key in result else value
+    return result
+
+
+def _has_set_cookie(headers: List[Tuple[str, str]]) -> bool:
+    return any(name.lower() == "set-cookie" for name, _ in headers)
+
+
+class CacheEntry:
+    """缓存条目"""
+
+    __slots__ = (
+        "key", "status_line", "headers", "body", "size", "stored_at", "expires_at",
+        "etag", "last_modified", "vary", "on_disk",
+    )
+
+    def __init__(
+        self,
+        key: str,
+        status_line: str,
+        headers: List[Tuple[str, str]],
+        body: Optional[bytes],
+        size: int,
+        stored_at: float,
+        expires_at: float,
+        vary: Dict[str, str],
+    ):
+        self.key = key
+        self.status_line = status_line
+        self.headers = headers
+        self.body = body
+        self.size = size
+        self.stored_at = stored_at
+        self.expires_at = expires_at
+        header_map = _header_map(headers)
+        self.etag = header_map.get("etag")
+        self.last_modified = header_map.get("last-modified")
+        self.vary = vary
+        self.on_disk = False
+
+    def is_fresh(self, now: float) -> bool:
+        """条目是否仍然新鲜"""
+        return now < self.expires_at
+
+    def has_validator(self) -> bool:
+        """是否可以条件重验证"""
+        return bool(self.etag or self.last_modified)
+
+    def to_meta(self) -> dict:
+        """序列化元数据(磁盘层使用)"""
+        return {
+            "key": self.key,
+            "status_line": self.status_line,
+            "headers": self.headers,
+            "size": self.size,
+            "stored_at": self.stored_at,
+            "expires_at": self.expires_at,
+            "vary": self.vary,
+        }
+
+    @classmethod
+    def from_meta(cls, meta: dict) -> "CacheEntry":
+        """从元数据恢复(正文留在磁盘)"""
+        entry = cls(
+            key=meta["key"],
+            status_line=meta["status_line"],
+            headers=[tuple(h) for h in meta["headers"]],
+            body=None,
+            size=meta["size"],
+            stored_at=meta["stored_at"],
+            expires_at=meta["expires_at"],
+            vary=meta.get("vary", {}),
+        )
+        entry.on_disk = True
+        return entry
+
+
+class HTTPCache:
+    """
+    HTTP GET响应缓存
+
+    内存层为按字节数限额的LRU,被淘汰的条目降级到磁盘层;
+    磁盘层命中时通过 sendfile 直接从文件发送正文。
+    并发未命中同一URL时只有一个请求回源,其余等待其结果。
+    作为共享缓存,带 Set-Cookie 的响应不缓存;携带 Cookie 的请求,
+    其响应只有显式标记 public 或 s-maxage 时才缓存。
+    """
+
+    def __init__(self, config: CacheConfig, buffer_size: int = 8192):
+        self.config = config
+        self.buffer_size = buffer_size
+
+        self._memory: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._disk_bytes = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        self.disk_dir = Path(config.disk_dir) if config.disk_dir else None
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._load_disk_index()
+
+        # 统计
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.coalesced = 0
+        self.stores = 0
+        self.evictions = 0
+
+    # ------------------------------------------------------------------
+    # 存储层
+    # ------------------------------------------------------------------
+
+    def _disk_path(self, key: str) -> Path:
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return self.disk_dir / digest[:2] / digest
+
+    def _load_disk_index(self) -> None:
+        """启动时扫描磁盘层重建索引"""
+        entries = []
+        for meta_path in self.disk_dir.glob("*/*.meta"):
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    entry = CacheEntry.from_meta(json.load(f))
+            except (OSError, ValueError, KeyError):
+                continue
+            if _has_set_cookie(entry.headers):
+                # 旧版本写入的带 Set-Cookie 的条目不再使用
+                self._remove_disk(entry.key)
+                continue
+            entries.append(entry)
+
+        for entry in sorted(entries, key=lambda e: e.stored_at):
+            self._disk[entry.key] = entry
+            self._disk_bytes += entry.size
+        logger.info("http_cache_disk_loaded", entries=len(self._disk), bytes=self._disk_bytes)
+
+    def _write_disk(self, entry: CacheEntry, body: bytes) -> None:
+        """写入磁盘层(在线程中执行)"""
+        path = self._disk_path(entry.key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, 'wb') as f:
+            f.write(body)
+        os.replace(tmp, path.with_suffix(".body"))
+        self._write_meta(entry)
+
+    def _write_meta(self, entry: CacheEntry) -> None:
+        path = self._disk_path(entry.key).with_suffix(".meta")
+        tmp = path.with_suffix(".metatmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(entry.to_meta(), f)
+        os.replace(tmp, path)
+
+    def _remove_disk(self, key: str) -> None:
+        path = self._disk_path(key)
+        for suffix in (".meta", ".body"):
+            try:
+                os.unlink(path.with_suffix(suffix))
+            except OSError:
+                pass
+
+    def _lookup(self, key: str) -> Optional[CacheEntry]:
+        """查找条目并刷新LRU位置"""
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            return entry
+        entry = self._disk.get(key)
+        if entry is not None:
+            self._disk.move_to_end(key)
+        return entry
+
+    async def _store(self, entry: CacheEntry, body: bytes) -> None:
+        """存储条目,大对象直接写磁盘层"""
+        self.stores += 1
+        await self._discard(entry.key)
+
+        if entry.size <= self.config.memory_object_limit or self.disk_dir is None:
+            entry.body = body
+            self._memory[entry.key] = entry
+            self._memory_bytes += entry.size
+            await self._evict_memory()
+        else:
+            await self._store_disk(entry, body)
+
+    async def _store_disk(self, entry: CacheEntry, body: bytes) -> None:
+        try:
+            await asyncio.to_thread(self._write_disk, entry, body)
+        except OSError as e:
+            logger.warning("http_cache_disk_write_failed", key=entry.key, error=str(e))
+            return
+        entry.body = None
+        entry.on_disk = True
+        self._disk[entry.key] = entry
+        self._disk_bytes += entry.size
+
+        while self._disk_bytes > self.config.disk_size and self._disk:
+            key, victim = self._disk.popitem(last=False)
+            self._disk_bytes -= victim.size
+            self.evictions += 1
+            await asyncio.to_thread(self._remove_disk, key)
+
+    async def _evict_memory(self) -> None:
+        """淘汰内存层,有磁盘层时降级而非丢弃"""
+        while self._memory_bytes > self.config.memory_size and self._memory:
+            key, victim = self._memory.popitem(last=False)
+            self._memory_bytes -= victim.size
+            self.evictions += 1
+            if self.disk_dir is not None and victim.body is not None:
+                body = victim.body
+                await self._store_disk(victim, body)
+
+    async def _discard(self, key: str) -> None:
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= entry.size
+        entry = self._disk.pop(key, None)
+        if entry is not None:
+            self._disk_bytes -= entry.size
+            # 删除旧文件,避免重启后从磁盘恢复过期版本
+            await asyncio.to_thread(self._remove_disk, key)
+
+    # ------------------------------------------------------------------
+    # 新鲜度
+    # ------------------------------------------------------------------
+
+    def _freshness_lifetime(self, header_map: Dict[str, str], now: float) -> Optional[float]:
+        """
+        计算响应的新鲜期
+
+        Returns:
+            Optional[float]: 新鲜期(秒),None表示不可缓存
+        """
+        cc = parse_cache_control(header_map.get("cache-control"))
+        if "no-store" in cc or "private" in cc:
+            return None
+        if "no-cache" in cc:
+            return 0.0
+        for directive in ("s-maxage", "max-age"):
+            if cc.get(directive) is not None:
+                try:
+                    return max(0.0, float(cc[directive]))
+                except ValueError:
+                    return 0.0
+        expires = _parse_http_date(header_map.get("expires"))
+        if "expires" in header_map:
+            if expires is None:
+                return 0.0
+            date = _parse_http_date(header_map.get("date")) or now
+            return max(0.0, expires - date)
+        return float(self.config.default_ttl)
+
+    # ------------------------------------------------------------------
+    # 请求处理
+    # ------------------------------------------------------------------
+
+    async def handle_request(
+        self,
+        url: str,
+        version: str,
+        headers: List[bytes],
+        client_writer: asyncio.StreamWriter,
+        open_origin: OpenOrigin,
+    ) -> Optional[Tuple[int, int]]:
+        """
+        尝试通过缓存处理一个GET请求
+
+        Args:
+            url: 请求的绝对URL
+            version: HTTP版本
+            headers: 原始请求头行
+            client_writer: 客户端写入流
+            open_origin: 建立源站连接的回调
+
+        Returns:
+            Optional[Tuple[int, int]]: (bytes_sent, bytes_received),
+            None表示该请求不走缓存,由调用方按普通代理处理
+        """
+        request_headers = []
+        for line in headers:
+            text = line.decode('latin-1').rstrip('\r\n')
+            if ':' in text:
+                name, value = text.split(':', 1)
+                request_headers.append((name.strip(), value.strip()))
+        request_map = _header_map(request_headers)
+
+        request_cc = parse_cache_control(request_map.get("cache-control"))
+        if (
+            "no-store" in request_cc
+            or "authorization" in request_map
+            or "range" in request_map
+        ):
+            return None
+
+        now = time.time()
+        entry = self._lookup(url)
+        if entry is not None and not self._vary_matches(entry, request_map):
+            entry = None
+
+        if entry is not None and entry.is_fresh(now) and "no-cache" not in request_cc:
+            self.hits += 1
+            sent = await self._serve(entry, client_writer, "HIT", now)
+            return (0, sent)
+
+        # 合并并发未命中
+        inflight = self._inflight.get(url)
+        if inflight is not None:
+            self.coalesced += 1
+            entry = await asyncio.shield(inflight)
+            # 领头请求的响应按其自身请求头协商,Vary 不一致时单独回源
+            if entry is None or not self._vary_matches(entry, request_map):
+                return None
+            sent = await self._serve(entry, client_writer, "HIT", time.time())
+            return (0, sent)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[url] = future
+        result_entry = None
+        try:
+            result_entry, sent, received = await self._fetch(
+                url, version, request_headers, request_map, entry, client_writer, open_origin
+            )
+            return (sent, received)
+        finally:
+            del self._inflight[url]
+            future.set_result(result_entry)
+
+    @staticmethod
+    def _vary_matches(entry: CacheEntry, request_map: Dict[str, str]) -> bool:
+        """请求头是否与条目记录的 Vary 请求头一致"""
+        return all(request_map.get(name, "") == value for name, value in entry.vary.items())
+
+    async def _fetch(
+        self,
+        url: str,
+        version: str,
+        request_headers: List[Tuple[str, str]],
+        request_map: Dict[str, str],
+        stale: Optional[CacheEntry],
+        client_writer: asyncio.StreamWriter,
+        open_origin: OpenOrigin,
+    ) -> Tuple[Optional[CacheEntry], int, int]:
+        """
+        回源获取响应,必要时条件重验证
+
+        Returns:
+            Tuple[Optional[CacheEntry], int, int]: (可供合并请求使用的条目, 发往源站字节数, 发往客户端字节数)
+        """
+        parsed = urlparse(url)
+        path = parsed.path or "/"
+        if parsed.query:
+            path += f"?{parsed.query}"
+
+        # 构建回源请求:去掉代理头、逐跳头和客户端自带的条件头
+        lines = [f"GET {path} {version}"]
+        for name, value in request_headers:
+            lower = name.lower()
+            if (
+                lower.startswith("proxy-")
+                or lower in HOP_BY_HOP_HEADERS
+                or lower in ("if-none-match", "if-modified-since")
+            ):
+                continue
+            lines.append(f"{name}: {value}")
+        if stale is not None and stale.has_validator():
+            if stale.etag:
+                lines.append(f"If-None-Match: {stale.etag}")
+            if stale.last_modified:
+                lines.append(f"If-Modified-Since: {stale.last_modified}")
+        lines.append("Connection: close")
+        request = ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1')
+
+        target_reader, target_writer = await open_origin()
+        try:
+            target_writer.write(request)
+            await target_writer.drain()
+
+            status_line = (await target_reader.readline()).decode('latin-1').rstrip('\r\n')
+            response_headers = []
+            while True:
+                line = await target_reader.readline()
+                if not line or line == b'\r\n':
+                    break
+                text = line.decode('latin-1').rstrip('\r\n')
+                if ':' in text:
+                    name, value = text.split(':', 1)
+                    response_headers.append((name.strip(), value.strip()))
+
+            parts = status_line.split(None, 2)
+            status = int(parts[1]) if len(parts) >= 2 and parts[1].isdigit() else 0
+            header_map = _header_map(response_headers)
+            now = time.time()
+
+            # 304: 用新头刷新旧条目
+            if status == 304 and stale is not None:
+                lifetime = self._freshness_lifetime(header_map, now)
+                stale.expires_at = now + (lifetime or 0.0)
+                stale.stored_at = now
+                if stale.on_disk:
+                    await asyncio.to_thread(self._write_meta, stale)
+                self.revalidated += 1
+                sent = await self._serve(stale, client_writer, "REVALIDATED", now)
+                return (stale, len(request), sent)
+
+            lifetime = self._freshness_lifetime(header_map, now)
+            response_cc = parse_cache_control(header_map.get("cache-control"))
+            cacheable = (
+                status in CACHEABLE_STATUS
+                and lifetime is not None
+                and (lifetime > 0 or "etag" in header_map or "last-modified" in header_map)
+                and header_map.get("vary", "").strip() != "*"
+                # 会话相关的响应不能共享给其他客户端
+                and "set-cookie" not in header_map
+                and (
+                    "cookie" not in request_map
+                    or "public" in response_cc
+                    or "s-maxage" in response_cc
+                )
+            )
+            content_length = header_map.get("content-length")
+            if cacheable and content_length is not None:
+                try:
+                    cacheable = 0 <= int(content_length) <= self.config.max_object_size
+                except ValueError:
+                    cacheable = False
+
+            if not cacheable:
+                sent = await self._passthrough(
+                    status_line, response_headers, b"", target_reader, client_writer
+                )
+                return (None, len(request), sent)
+
+            body, complete = await self._read_body(target_reader, header_map)
+            if not complete:
+                # 超过大小上限,转为流式透传
+                sent = await self._passthrough(
+                    status_line, response_headers, body, target_reader, client_writer
+                )
+                return (None, len(request), sent)
+
+            vary = {}
+            for name in header_map.get("vary", "").split(','):
+                name = name.strip().lower()
+                if name:
+                    vary[name] = request_map.get(name, "")
+
+            stored_headers = [
+                (name, value) for name, value in response_headers
+                if name.lower() not in HOP_BY_HOP_HEADERS and name.lower() != "content-length"
+            ]
+            entry = CacheEntry(
+                key=url,
+                status_line=status_line,
+                headers=stored_headers,
+                body=body,
+                size=len(body),
+                stored_at=now,
+                expires_at=now + lifetime,
+                vary=vary,
+            )
+            sent = await self._serve(entry, client_writer, "MISS", now)
+            await self._store(entry, body)
+            return (entry, len(request), sent)
+        finally:
+            target_writer.close()
+
+    async def _read_body(
+        self,
+        reader: asyncio.StreamReader,
+        header_map: Dict[str, str]
+    ) -> Tuple[bytes, bool]:
+        """
+        读取响应正文(支持chunked),超过上限时提前返回
+
+        Returns:
+            Tuple[bytes, bool]: (已读取的原始数据, 是否完整读取)
+        """
+        limit = self.config.max_object_size
+
+        if "chunked" in header_map.get("transfer-encoding", "").lower():
+            raw = bytearray()
+            body = bytearray()
+            while True:
+                size_line = await reader.readline()
+                raw += size_line
+                try:
+                    size = int(size_line.split(b';', 1)[0].strip(), 16)
+                except ValueError:
+                    return bytes(raw), False
+                if size == 0:
+                    # 跳过trailer
+                    while True:
+                        line = await reader.readline()
+                        if not line or line == b'\r\n':
+                            break
+                    return bytes(body), True
+                if len(body) + size > limit:
+                    return bytes(raw), False
+                chunk = await reader.readexactly(size + 2)
+                raw += chunk
+                body += chunk[:-2]
+
+        if "content-length" in header_map:
+            return await reader.readexactly(int(header_map["content-length"])), True
+
+        data = await reader.read(limit + 1)
+        body = bytearray(data)
+        while data and len(body) <= limit:
+            data = await reader.read(limit + 1 - len(body))
+            body += data
+        return bytes(body), len(body) <= limit
+
+    async def _passthrough(
+        self,
+        status_line: str,
+        headers: List[Tuple[str, str]],
+        prefix: bytes,
+        target_reader: asyncio.StreamReader,
+        client_writer: asyncio.StreamWriter,
+    ) -> int:
+        """不缓存,将响应原样转发给客户端"""
+        head = status_line + "\r\n" + "".join(
+            f"{name}: {value}\r\n" for name, value in headers
+            if name.lower() not in ("connection", "keep-alive")
+        ) + "Connection: close\r\n\r\n"
+        data = head.encode('latin-1') + prefix
+        sent = 0
+        while data:
+            client_writer.write(data)
+            await client_writer.drain()
+            sent += len(data)
+            data = await target_reader.read(self.buffer_size)
+        return sent
+
+    async def _serve(
+        self,
+        entry: CacheEntry,
+        client_writer: asyncio.StreamWriter,
+        cache_status: str,
+        now: float,
+    ) -> int:
+        """将缓存条目发送给客户端"""
+        age = max(0, int(now - entry.stored_at))
+        head = entry.status_line + "\r\n" + "".join(
+            f"{name}: {value}\r\n" for name, value in entry.headers
+            if name.lower() != "age"
+        ) + (
+            f"Content-Length: {entry.size}\r\n"
+            f"Age: {age}\r\n"
+            f"X-Cache: {cache_status}\r\n"
+            "Connection: close\r\n\r\n"
+        )
+        head_bytes = head.encode('latin-1')
+
+        body = entry.body
+        if body is not None:
+            client_writer.write(head_bytes + body)
+            await client_writer.drain()
+            return len(head_bytes) + entry.size
+
+        # 磁盘层: sendfile 零拷贝发送
+        client_writer.write(head_bytes)
+        path = self._disk_path(entry.key).with_suffix(".body")
+        try:
+            with open(path, 'rb') as f:
+                await asyncio.get_running_loop().sendfile(
+                    client_writer.transport, f, 0, entry.size
+                )
+        except OSError as e:
+            logger.warning("http_cache_disk_read_failed", key=entry.key, error=str(e))
+            await self._discard(entry.key)
+            raise
+        return len(head_bytes) + entry.size
+
+    def get_stats_dict(self) -> dict:
+        """获取缓存统计信息"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "coalesced": self.coalesced,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "disk_entries": len(self._disk),
+            "disk_bytes": self._disk_bytes,
+        }
+
+
+def create_http_cache(
+    config: Optional[CacheConfig],
+    buffer_size: int = 8192
+) -> Optional[HTTPCache]:
+    """
+    创建HTTP缓存
+
+    Args:
+        config: 缓存配置
+        buffer_size: 透传响应时的读取块大小
+
+    Returns:
+        Optional[HTTPCache]: 未启用时返回None
+    """
+    if not config or not config.enabled:
+        return None
+    return HTTPCache(config, buffer_size)
@@ -1,14 +1,24 @@
 """命令行接口"""
 
-import asyncio
+import json
 import sys
+import time
+import unicodedata
 from pathlib import Path
 from typing import Optional
 
 import click
 
-from .config import ProxyConfig, load_config, create_default_config
-from .proxy import SimpleHTTPProxy
+# 配置模型(pydantic)、代理模块和YAML只在需要的命令中导入,
+# 使 --help、top、profile 等命令不必承担这些导入耗时
+
+
+config_cache_option = click.option(
+    "--config-cache",
+    type=click.Path(dir_okay=False, path_type=Path),
+    envvar="EASYPROXY_CONFIG_CACHE",
+    help="配置快照路径,配置文件未变化时跳过解析和校验 (也可通过 EASYPROXY_CONFIG_CACHE 设置)"
+)
 
 
 @click.group()
@@ -44,19 +54,25 @@ def cli():
     type=click.Path(path_type=Path),
     help="日志文件路径 (覆盖配置文件)"
 )
+@config_cache_option
 def start(
     config: Optional[Path],
     host: Optional[str],
     port: Optional[int],
     log_level: Optional[str],
-    log_file: Optional[Path]
+    log_file: Optional[Path],
+    config_cache: Optional[Path]
 ):
     """启动代理服务器"""
+    import asyncio
+    
+    from .config import ProxyConfig, load_config
+    from .proxy import SimpleHTTPProxy
     
     # 加载配置
     if config:
         click.echo(f"从配置文件加载: {config}")
-        proxy_config = load_config(config)
+        proxy_config = load_config(config, config_cache)
     else:
         click.echo("使用默认配置")
         proxy_config = ProxyConfig()
@@ -72,8 +88,15 @@ def start(
         proxy_config.log_file = str(log_file)
     
     # 显示配置信息
-    click.echo(f"监听地址: {proxy_config.host}:{proxy_config.port}")
-    click.echo(f"支持协议: {', '.join(proxy_config.protocols).upper()}")
+    if proxy_config.listeners:
+        for listener in proxy_config.listeners:
+            click.echo(
+                f"监听地址: {listener.host or proxy_config.host}:{listener.port} "
+                f"({', '.join(listener.protocols).upper()})"
+            )
+    else:
+        click.echo(f"监听地址: {proxy_config.host}:{proxy_config.port}")
+        click.echo(f"支持协议: {', '.join(proxy_config.protocols).upper()}")
     click.echo(f"日志级别: {proxy_config.log_level}")
     if proxy_config.log_file:
         click.echo(f"日志文件: {proxy_config.log_file}")
@@ -95,6 +118,7 @@ def start(
 @click.argument("output", type=click.Path(path_type=Path))
 def init(output: Path):
     """生成默认配置文件"""
+    from .config import create_default_config
     
     if output.exists():
         if not click.confirm(f"文件 {output} 已存在,是否覆盖?"):
@@ -116,20 +140,29 @@ def init(output: Path):
     type=click.Path(exists=True, path_type=Path),
     help="配置文件路径"
 )
-def validate(config: Optional[Path]):
+@config_cache_option
+def validate(config: Optional[Path], config_cache: Optional[Path]):
     """验证配置文件"""
+    from .config import load_config
     
     if not config:
         click.echo("错误: 请指定配置文件路径", err=True)
         sys.exit(1)
     
     try:
-        proxy_config = load_config(config)
+        proxy_config = load_config(config, config_cache)
         click.echo(f"✓ 配置文件有效: {config}")
         click.echo("")
         click.echo("配置详情:")
-        click.echo(f"  监听地址: {proxy_config.host}:{proxy_config.port}")
-        click.echo(f"  支持协议: {', '.join(proxy_config.protocols)}")
+        if proxy_config.listeners:
+            for listener in proxy_config.listeners:
+                click.echo(
+                    f"  监听地址: {listener.host or proxy_config.host}:{listener.port} "
+                    f"({', '.join(listener.protocols)})"
+                )
+        else:
+            click.echo(f"  监听地址: {proxy_config.host}:{proxy_config.port}")
+            click.echo(f"  支持协议: {', '.join(proxy_config.protocols)}")
         click.echo(f"  最大连接数: {proxy_config.max_connections}")
         click.echo(f"  连接超时: {proxy_config.connection_timeout}秒")
         click.echo(f"  日志级别: {proxy_config.log_level}")
@@ -140,6 +173,587 @@ def validate(config: Optional[Path]):
         sys.exit(1)
 
 
+def admin_request(
+    admin: str,
+    path: str,
+    token: Optional[str] = None,
+    method: str = "GET",
+    timeout: float = 10
+) -> bytes:
+    """
+    请求管理接口
+    
+    Args:
+        admin: 管理接口地址,如 http://127.0.0.1:7901
+        path: 请求路径
+        token: 访问令牌
+        method: 请求方法
+        timeout: 超时(秒)
+    
+    Returns:
+        bytes: 响应体
+    """
+    import urllib.error
+    import urllib.request
+    
+    request = urllib.request.Request(admin.rstrip('/') + path, method=method)
+    if token:
+        request.add_header("Authorization", f"Bearer {token}")
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.read()
+    except urllib.error.HTTPError as e:
+        try:
+            message = json.loads(e.read()).get("error", e.reason)
+        except ValueError:
+            message = e.reason
+        raise click.ClickException(f"管理接口返回 {e.code}: {message}")
+    except urllib.error.URLError as e:
+        raise click.ClickException(f"无法连接管理接口 {admin}: {e.reason}")
+
+
+admin_options = [
+    click.option(
+        "-a", "--admin",
+        default="http://127.0.0.1:7901",
+        show_default=True,
+        help="管理接口地址"
+    ),
+    click.option(
+        "-t", "--token",
+        envvar="EASYPROXY_ADMIN_TOKEN",
+        help="管理接口访问令牌 (也可通过 EASYPROXY_ADMIN_TOKEN 设置)"
+    ),
+]
+
+
+def with_admin_options(func):
+    """为命令添加管理接口地址和令牌选项"""
+    for option in reversed(admin_options):
+        func = option(func)
+    return func
+
+
+@cli.command()
+@with_admin_options
+@click.option("-s", "--seconds", type=float, default=10, show_default=True, help="采样时长(秒)")
+@click.option("-i", "--interval", type=float, default=5, show_default=True, help="采样间隔(毫秒)")
+@click.option("--idle", is_flag=True, help="包含事件循环空闲等待的样本")
+@click.option(
+    "-o", "--output",
+    type=click.Path(path_type=Path),
+    help="输出文件 (默认输出到标准输出)"
+)
+def profile(
+    admin: str,
+    token: Optional[str],
+    seconds: float,
+    interval: float,
+    idle: bool,
+    output: Optional[Path]
+):
+    """对运行中的代理进行采样分析,输出火焰图折叠栈
+    
+    \b
+    生成火焰图:
+      easyproxy profile -s 30 -o proxy.folded
+      flamegraph.pl proxy.folded > proxy.svg
+    """
+    query = f"/profile?seconds={seconds}&interval_ms={interval}&idle={int(idle)}"
+    click.echo(f"采样 {seconds} 秒...", err=True)
+    data = admin_request(admin, query, token, timeout=seconds + 10)
+    
+    if output:
+        output.write_bytes(data)
+        click.echo(f"折叠栈已写入: {output}", err=True)
+    else:
+        click.echo(data.decode('utf-8'), nl=False)
+
+
+def format_bytes(value: float) -> str:
+    """将字节数格式化为便于阅读的字符串"""
+    for unit in ("B", "K", "M", "G"):
+        if abs(value) < 1024:
+            return f"{value:.0f}{unit}" if unit == "B" else f"{value:.1f}{unit}"
+        value /= 1024
+    return f"{value:.1f}T"
+
+
+def _pad(text: str, width: int, right: bool = False) -> str:
+    """按终端显示宽度填充(中文字符占两列),超长时截断"""
+    shown, used = "", 0
+    for char in text:
+        char_width = 2 if unicodedata.east_asian_width(char) in ("W", "F") else 1
+        if used + char_width > width:
+            break
+        shown += char
+        used += char_width
+    padding = " " * (width - used)
+    return padding + shown if right else shown + padding
+
+
+# (标题, 宽度, 是否右对齐)
+TOP_COLUMNS = [
+    ("ID", 8, True),
+    ("客户端", 21, False),
+    ("用户", 10, False),
+    ("协议", 6, False),
+    ("目标", 32, False),
+    ("上行/s", 8, True),
+    ("下行/s", 8, True),
+    ("上行", 8, True),
+    ("下行", 8, True),
+    ("时长", 7, True),
+]
+
+
+def render_top(data: dict) -> str:
+    """渲染活跃连接列表"""
+    lines = [
+        f"活跃连接: {data['active']}",
+        "",
+        "  ".join(_pad(title, width, right) for title, width, right in TOP_COLUMNS),
+    ]
+    for conn in data["connections"]:
+        values = [
+            str(conn["id"]),
+            conn["client"],
+            conn["user"] or "-",
+            conn["protocol"],
+            conn["target"] or "-",
+            format_bytes(conn["rate_sent"]),
+            format_bytes(conn["rate_received"]),
+            format_bytes(conn["bytes_sent"]),
+            format_bytes(conn["bytes_received"]),
+            f"{conn['age']:.0f}s",
+        ]
+        lines.append("  ".join(
+            _pad(value, width, right) for value, (_, width, right) in zip(values, TOP_COLUMNS)
+        ))
+    return "\n".join(lines)
+
+
+@cli.command()
+@with_admin_options
+@click.option("-n", "--count", type=int, default=20, show_default=True, help="显示的连接数量")
+@click.option(
+    "-s", "--sort",
+    type=click.Choice(["rate", "bytes", "age"]),
+    default="rate",
+    show_default=True,
+    help="排序方式: 当前吞吐 / 累计流量 / 连接时长"
+)
+@click.option("-w", "--watch", type=float, default=0, help="每隔N秒刷新,0表示只显示一次")
+@click.option("-k", "--kill", "kill_id", type=int, help="中止指定ID的连接")
+def top(
+    admin: str,
+    token: Optional[str],
+    count: int,
+    sort: str,
+    watch: float,
+    kill_id: Optional[int]
+):
+    """查看占用带宽最多的活跃连接"""
+    if kill_id is not None:
+        admin_request(admin, f"/connections/{kill_id}", token, method="DELETE")
+        click.echo(f"已中止连接: {kill_id}")
+        return
+    
+    query = f"/connections?top={count}&sort={sort}"
+    # 首次查询建立速率基线
+    data = json.loads(admin_request(admin, query, token))
+    if watch <= 0:
+        click.echo(render_top(data))
+        return
+    
+    try:
+        while True:
+            time.sleep(watch)
+            data = json.loads(admin_request(admin, query, token))
+            click.clear()
+            click.echo(render_top(data))
+    except KeyboardInterrupt:
+        pass
+
+
+# (标题, 宽度, 是否右对齐)
+STATS_COLUMNS = [
+    ("时间", 14, False),
+    ("新连接/s", 9, True),
+    ("活跃", 7, True),
+    ("上行/s", 8, True),
+    ("下行/s", 8, True),
+    ("错误/s", 7, True),
+    ("HTTP", 7, True),
+    ("HTTPS", 7, True),
+    ("SOCKS5", 7, True),
+]
+
+
+def render_stats(data: dict) -> str:
+    """渲染时间序列(按采样周期的每秒速率)"""
+    from .timeseries import rates
+
+    time_format = "%H:%M:%S" if data["interval"] < 60 else "%m-%d %H:%M"
+    lines = [
+        f"分辨率: {data['resolution']} ({data['interval']}秒), 协议列为新连接/s",
+        "",
+        "  ".join(_pad(title, width, right) for title, width, right in STATS_COLUMNS),
+    ]
+    for row in rates(data):
+        values = [
+            time.strftime(time_format, time.localtime(row["time"])),
+            f"{row['connections']:.1f}",
+            str(row["active"]),
+            format_bytes(row["bytes_sent"]),
+            format_bytes(row["bytes_received"]),
+            f"{row['errors']:.1f}",
+            f"{row['connections.http']:.1f}",
+            f"{row['connections.https']:.1f}",
+            f"{row['connections.socks5']:.1f}",
+        ]
+        lines.append("  ".join(
+            _pad(value, width, right) for value, (_, width, right) in zip(values, STATS_COLUMNS)
+        ))
+    return "\n".join(lines)
+
+
+@cli.command()
+@with_admin_options
+@click.option(
+    "-r", "--resolution",
+    type=click.Choice(["second", "minute", "hour"]),
+    default="second",
+    show_default=True,
+    help="采样周期"
+)
+@click.option("-n", "--count", type=int, default=20, show_default=True, help="显示的采样数量")
+@click.option("-w", "--watch", type=float, default=0, help="每隔N秒刷新,0表示只显示一次")
+@click.option("--json", "as_json", is_flag=True, help="输出原始JSON")
+def stats(
+    admin: str,
+    token: Optional[str],
+    resolution: str,
+    count: int,
+    watch: float,
+    as_json: bool
+):
+    """查看最近的连接数和吞吐历史"""
+    query = f"/history?resolution={resolution}&last={count}"
+
+    def show() -> None:
+        data = admin_request(admin, query, token)
+        if as_json:
+            click.echo(data.decode('utf-8'))
+        else:
+            click.echo(render_stats(json.loads(data)))
+
+    if watch <= 0:
+        show()
+        return
+
+    try:
+        while True:
+            click.clear()
+            show()
+            time.sleep(watch)
+    except KeyboardInterrupt:
+        pass
+
+
+def render_startup(data: dict, count: int = 10) -> str:
+    """将启动耗时测量结果渲染为文本"""
+    from .startup import PHASES, import_time_by_package
+    
+    phases = data["phases"]
+    total = data["exec_to_listen_ms"]
+    lines = [f"从创建进程到开始监听: {total:.1f} ms", ""]
+    width = 20
+    lines.append(f"  {_pad('解释器启动及其他', width)} {max(total - sum(phases.values()), 0):8.1f} ms")
+    for phase, label in PHASES:
+        lines.append(f"  {_pad(label, width)} {phases.get(phase, 0):8.1f} ms")
+    
+    packages = sorted(import_time_by_package(data["imports"]).items(), key=lambda item: -item[1])
+    lines += ["", f"导入耗时 (按顶层包汇总, 共 {sum(us for _, us in packages) / 1000:.1f} ms):"]
+    for name, us in packages[:count]:
+        lines.append(f"  {_pad(name, width)} {us / 1000:8.1f} ms")
+    return "\n".join(lines)
+
+
+@cli.command()
+@click.option(
+    "-c", "--config",
+    type=click.Path(exists=True, path_type=Path),
+    help="配置文件路径"
+)
+@config_cache_option
+@click.option("-r", "--runs", type=int, default=3, show_default=True, help="测量次数,显示总耗时最短的一次")
+@click.option("-n", "--count", type=int, default=10, show_default=True, help="显示导入耗时最多的包数量")
+def startup(config: Optional[Path], config_cache: Optional[Path], runs: int, count: int):
+    """测量导入耗时和从启动到开始监听的耗时"""
+    from .startup import measure_startup
+    
+    try:
+        results = [measure_startup(config, config_cache) for _ in range(max(runs, 1))]
+    except RuntimeError as e:
+        raise click.ClickException(f"启动失败: {e}")
+    click.echo(render_startup(min(results, key=lambda r: r["exec_to_listen_ms"]), count))
+
+
+# (标题, 宽度, 是否右对齐)
+SOAK_COLUMNS = [
+    ("协议", 8, False),
+    ("轮次", 4, True),
+    ("连接", 7, True),
+    ("空闲/连接", 10, True),
+    ("活跃/连接", 10, True),
+    ("RSS趋势/分钟", 12, True),
+    ("关闭后保留", 10, True),
+    ("错误", 6, True),
+]
+
+
+def render_soak(data: dict) -> str:
+    """将并发压测结果渲染为文本"""
+    lines = [
+        f"每协议 {data['connections']} 条连接, 活跃阶段 {data['duration']:g} 秒, "
+        f"每 {data['interval']:g} 秒收发 {data['payload_size']} 字节, 共 {data['cycles']} 轮",
+        "",
+        "  ".join(_pad(title, width, right) for title, width, right in SOAK_COLUMNS),
+    ]
+    for protocol, result in data["protocols"].items():
+        for cycle, r in enumerate(result["rounds"], 1):
+            trend = r["rss_trend_per_minute"]
+            row = [
+                protocol,
+                str(cycle),
+                str(r["connections"]),
+                format_bytes(r["idle_rss_per_connection"]),
+                format_bytes(r["active_rss_per_connection"]),
+                ("+" if trend >= 0 else "") + format_bytes(trend),
+                format_bytes(r["retained_rss"]),
+                str(r["open_failures"] + r["exchange_errors"]),
+            ]
+            lines.append("  ".join(
+                _pad(text, width, right) for text, (_, width, right) in zip(row, SOAK_COLUMNS)
+            ))
+
+    for protocol, result in data["protocols"].items():
+        traced = result["rounds"][0]["idle_traced_per_connection"]
+        if traced is None:
+            continue
+        lines += ["", f"{protocol}: Python对象 {format_bytes(traced)}/连接 (tracemalloc), 增长最多的分配位置:"]
+        for item in result["top_allocations"]:
+            lines.append(f"  {format_bytes(item['size_diff']):>8}  {item['count_diff']:>8}  {item['where']}")
+    return "\n".join(lines)
+
+
+@cli.command()
+@click.option(
+    "-n", "--connections",
+    type=click.IntRange(1),
+    default=1000,
+    show_default=True,
+    help="每个协议的并发连接数"
+)
+@click.option(
+    "-p", "--protocol", "protocols",
+    type=click.Choice(["http", "https", "socks5"]),
+    multiple=True,
+    help="测试的协议,可重复指定,默认全部"
+)
+@click.option("-d", "--duration", type=float, default=30, show_default=True, help="活跃阶段时长(秒)")
+@click.option("-i", "--interval", type=float, default=1.0, show_default=True, help="活跃连接的收发间隔(秒)")
+@click.option("--payload", type=click.IntRange(1), default=512, show_default=True, help="每次发送的字节数")
+@click.option("--sample-interval", type=float, default=5, show_default=True, help="活跃阶段的采样间隔(秒)")
+@click.option("--cycles", type=click.IntRange(1), default=1, show_default=True, help="每个协议重复的轮数")
+@click.option(
+    "--tracemalloc", "trace_frames",
+    type=click.IntRange(0),
+    default=0,
+    help="启用tracemalloc并记录的栈深度(会增加代理进程的内存占用)"
+)
+@click.option(
+    "-c", "--config",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    help="被测代理使用的配置文件(只使用转发和调优参数)"
+)
+@click.option("-o", "--output", type=click.Path(path_type=Path), help="将全部采样以JSON写入文件")
+def soak(
+    connections: int,
+    protocols: tuple,
+    duration: float,
+    interval: float,
+    payload: int,
+    sample_interval: float,
+    cycles: int,
+    trace_frames: int,
+    config: Optional[Path],
+    output: Optional[Path]
+):
+    """并发压测: 测量每连接内存占用和长时间运行的内存增长"""
+    import asyncio
+    from .soak import PROTOCOLS, run_soak
+
+    data = asyncio.run(run_soak(
+        connections=connections,
+        protocols=protocols or PROTOCOLS,
+        duration=duration,
+        interval=interval,
+        payload_size=payload,
+        sample_interval=sample_interval,
+        cycles=cycles,
+        trace_frames=trace_frames,
+        config_path=str(config) if config else None,
+        report=lambda message: click.echo(message, err=True)
+    ))
+    if output:
+        output.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    click.echo(render_soak(data))
+
+
+# (标题, 宽度, 是否右对齐)
+REPLAY_COLUMNS = [
+    ("协议", 8, False),
+    ("连接", 7, True),
+    ("错误", 6, True),
+    ("建连p50", 9, True),
+    ("建连p99", 9, True),
+    ("首字节p50", 10, True),
+    ("首字节p99", 10, True),
+    ("超时长p99", 10, True),
+    ("吞吐/s", 9, True),
+    ("传输速率/s", 11, True),
+]
+
+
+def _format_delta(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value * 100:+.1f}%"
+
+
+def render_replay(data: dict, deltas: Optional[dict] = None) -> str:
+    """将回放结果渲染为文本,提供 deltas 时附加相对基线的变化"""
+    lines = [
+        f"回放速度 x{data['speed']:g}, 字节缩放 {data['byte_scale']:g}, 耗时 {data['wall_seconds']:.1f} 秒",
+        "",
+        "  ".join(_pad(title, width, right) for title, width, right in REPLAY_COLUMNS),
+    ]
+    for name, summary in data["summary"].items():
+        row = [
+            name,
+            str(summary["connections"]),
+            str(summary["errors"]),
+            f"{summary['setup']['p50_ms']:.2f}ms",
+            f"{summary['setup']['p99_ms']:.2f}ms",
+            f"{summary['ttfb']['p50_ms']:.2f}ms",
+            f"{summary['ttfb']['p99_ms']:.2f}ms",
+            f"{summary['overrun']['p99_ms']:.1f}ms",
+            format_bytes(summary["throughput"]),
+            format_bytes(summary["transfer_rate"]),
+        ]
+        lines.append("  ".join(
+            _pad(text, width, right) for text, (_, width, right) in zip(row, REPLAY_COLUMNS)
+        ))
+
+    if deltas:
+        lines += ["", "相对基线的变化 (延迟为负、吞吐为正表示改善):"]
+        for name, row in deltas.items():
+            values = [
+                name,
+                "",
+                "",
+                _format_delta(row["setup_p50_ms"]),
+                _format_delta(row["setup_p99_ms"]),
+                _format_delta(row["ttfb_p50_ms"]),
+                _format_delta(row["ttfb_p99_ms"]),
+                "",
+                _format_delta(row["throughput"]),
+                _format_delta(row["transfer_rate"]),
+            ]
+            lines.append("  ".join(
+                _pad(text, width, right) for text, (_, width, right) in zip(values, REPLAY_COLUMNS)
+            ))
+    return "\n".join(lines)
+
+
+def _parse_address(value: Optional[str]):
+    if value is None:
+        return None
+    host, sep, port = value.rpartition(":")
+    if not sep or not port.isdigit():
+        raise click.BadParameter("格式应为 HOST:PORT", param_hint="--proxy")
+    return host or "127.0.0.1", int(port)
+
+
+@cli.command()
+@click.argument("logs", nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.option("-s", "--speed", type=click.FloatRange(min=0, min_open=True), default=1.0, show_default=True,
+              help="加速倍数,连接间隔和时长按此比例缩短")
+@click.option("--byte-scale", type=click.FloatRange(min=0), default=1.0, show_default=True,
+              help="每条连接传输字节数的缩放比例")
+@click.option(
+    "-p", "--protocol", "protocols",
+    type=click.Choice(["http", "https", "socks5"]),
+    multiple=True,
+    help="回放的协议,可重复指定,默认全部"
+)
+@click.option("-n", "--limit", type=click.IntRange(1), help="最多回放的连接数(按开始时间取最早的)")
+@click.option("--proxy", help="回放到已运行的代理 HOST:PORT,默认启动独立的代理进程")
+@click.option(
+    "-c", "--config",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    help="独立代理进程使用的配置文件(只使用转发和调优参数)"
+)
+@click.option(
+    "-b", "--baseline",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    help="作为基线的上一次回放结果(--output 写入的JSON),输出相对变化"
+)
+@click.option("-o", "--output", type=click.Path(path_type=Path), help="将回放结果以JSON写入文件")
+def replay(
+    logs: tuple,
+    speed: float,
+    byte_scale: float,
+    protocols: tuple,
+    limit: Optional[int],
+    proxy: Optional[str],
+    config: Optional[Path],
+    baseline: Optional[Path],
+    output: Optional[Path]
+):
+    """按访问日志回放连接模式,测量代理的延迟和吞吐"""
+    import asyncio
+    import itertools
+    from .replay import PROTOCOLS, compare, load_access_log, run_replay
+
+    proxy_address = _parse_address(proxy)
+    files = [open(path, encoding="utf-8", errors="replace") for path in logs]
+    try:
+        entries, skipped = load_access_log(itertools.chain(*files), protocols or PROTOCOLS)
+    finally:
+        for f in files:
+            f.close()
+    if limit:
+        entries = entries[:limit]
+    if not entries:
+        click.echo("访问日志中没有可回放的连接", err=True)
+        sys.exit(1)
+    click.echo(f"读取 {len(entries)} 条连接, 跳过 {skipped} 条", err=True)
+
+    data = asyncio.run(run_replay(
+        entries,
+        speed=speed,
+        byte_scale=byte_scale,
+        proxy_address=proxy_address,
+        config_path=str(config) if config else None,
+        report=lambda message: click.echo(message, err=True)
+    ))
+    if output:
+        output.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    deltas = compare(data, json.loads(baseline.read_text(encoding="utf-8"))) if baseline else None
+    click.echo(render_replay(data, deltas))
+
+
 def main():
     """主入口函数"""
     cli()
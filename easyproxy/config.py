@@ -1,14 +1,29 @@
 """配置管理模块"""
 
-from typing import Optional, List, Dict
+from typing import Any, Optional, List, Dict
 from pathlib import Path
-import yaml
 import base64
 import hashlib
-from pydantic import BaseModel, Field, field_validator
+import ipaddress
+import os
+import pickle
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
 
+# 配置快照格式版本,快照结构变化时递增
+SNAPSHOT_FORMAT_VERSION = 1
 
-class AuthConfig(BaseModel):
+
+class ConfigModel(BaseModel):
+    """
+    配置模型基类
+
+    校验器延迟到第一次校验时才构建,从快照加载配置时不需要构建校验器。
+    """
+
+    model_config = ConfigDict(defer_build=True)
+
+
+class AuthConfig(ConfigModel):
     """认证配置"""
     enabled: bool = Field(default=False, description="是否启用认证")
     type: str = Field(
@@ -16,10 +31,28 @@ class AuthConfig(BaseModel):
         pattern="^(basic|none)$",
         description="认证类型: basic(基本认证), none(无认证)"
     )
+    backend: str = Field(
+        default="inline",
+        pattern="^(inline|htpasswd|sqlite)$",
+        description="用户来源: inline(users配置), htpasswd(用户文件), sqlite(用户数据库)"
+    )
     users: Dict[str, str] = Field(
         default_factory=dict,
         description="用户名密码映射 (明文密码,启动时会自动加密)"
     )
+    disabled_users: List[str] = Field(
+        default_factory=list,
+        description="已禁用的用户(仅 inline)"
+    )
+    users_file: Optional[str] = Field(
+        default=None,
+        description="htpasswd 文件或 SQLite 数据库路径"
+    )
+    reload_interval: float = Field(
+        default=5,
+        ge=0,
+        description="检查用户文件变化的间隔(秒),0表示不自动重新加载"
+    )
     realm: str = Field(
         default="EasyProxy",
         description="认证域名(用于Basic Auth)"
@@ -41,6 +74,13 @@ class AuthConfig(BaseModel):
         
         return v
     
+    @model_validator(mode="after")
+    def validate_backend(self) -> "AuthConfig":
+        """文件类用户来源必须指定 users_file"""
+        if self.enabled and self.backend != "inline" and not self.users_file:
+            raise ValueError(f"auth.backend 为 {self.backend} 时必须设置 users_file")
+        return self
+    
     def verify_credentials(self, username: str, password: str) -> bool:
         """
         验证用户凭据
@@ -99,7 +139,329 @@ class AuthConfig(BaseModel):
         return f'Basic realm="{self.realm}"'
 
 
-class ProxyConfig(BaseModel):
+class UpstreamConfig(ConfigModel):
+    """上游代理节点配置"""
+    name: Optional[str] = Field(default=None, description="节点名称,默认为 host:port")
+    type: str = Field(
+        default="http",
+        pattern="^(http|socks5|mux)$",
+        description="上游代理类型: http(CONNECT隧道), socks5, mux(到另一个easyproxy节点的多路复用隧道)"
+    )
+    host: str = Field(description="上游代理地址")
+    port: int = Field(ge=1, le=65535, description="上游代理端口")
+    username: Optional[str] = Field(default=None, description="上游代理用户名")
+    password: Optional[str] = Field(default=None, description="上游代理密码")
+    weight: int = Field(default=1, ge=1, le=100, description="权重")
+    fastopen: bool = Field(default=False, description="使用TCP Fast Open连接该节点,握手请求随SYN发送")
+    mux_connections: int = Field(default=2, ge=1, le=64, description="mux: 到该节点保持的持久连接数")
+    mux_window: int = Field(
+        default=256 * 1024,
+        ge=16 * 1024,
+        le=16 * 1024 * 1024,
+        description="mux: 每个流的流控窗口(字节)"
+    )
+    mux_keepalive: float = Field(default=30, ge=0, description="mux: 会话空闲心跳间隔(秒),0表示不检测")
+
+
+class UpstreamGroupConfig(ConfigModel):
+    """上游代理组配置"""
+    name: str = Field(description="代理组名称")
+    strategy: str = Field(
+        default="round_robin",
+        pattern="^(round_robin|least_connections|ewma_latency|consistent_hash)$",
+        description="选择策略: round_robin, least_connections, ewma_latency, consistent_hash"
+    )
+    upstreams: List[UpstreamConfig] = Field(min_length=1, description="上游代理节点列表")
+    max_failures: int = Field(default=3, ge=1, description="连续失败多少次后摘除节点")
+    eject_duration: float = Field(default=30, gt=0, description="首次摘除时长(秒),重复摘除时指数退避")
+    max_eject_duration: float = Field(default=300, gt=0, description="最长摘除时长(秒)")
+    max_attempts: int = Field(default=2, ge=1, description="单次连接最多尝试的节点数")
+    ewma_alpha: float = Field(default=0.3, gt=0, le=1, description="EWMA延迟平滑系数")
+    virtual_nodes: int = Field(default=100, ge=1, description="一致性哈希每个权重的虚拟节点数")
+
+
+class CacheConfig(ConfigModel):
+    """HTTP缓存配置(仅作用于明文HTTP的GET请求)"""
+    enabled: bool = Field(default=False, description="是否启用HTTP缓存")
+    memory_size: int = Field(default=64 * 1024 * 1024, ge=0, description="内存层容量(字节)")
+    memory_object_limit: int = Field(
+        default=1024 * 1024,
+        ge=0,
+        description="超过此大小的对象直接存入磁盘层(字节)"
+    )
+    max_object_size: int = Field(default=16 * 1024 * 1024, ge=1, description="可缓存的最大对象(字节)")
+    disk_dir: Optional[str] = Field(default=None, description="磁盘层目录,None表示仅使用内存层")
+    disk_size: int = Field(default=1024 * 1024 * 1024, ge=0, description="磁盘层容量(字节)")
+    default_ttl: int = Field(
+        default=0,
+        ge=0,
+        description="响应未声明新鲜期时的默认缓存时间(秒),0表示每次重验证"
+    )
+
+
+class SocketOptionsConfig(ConfigModel):
+    """socket选项(None表示保持系统默认值)"""
+    tcp_nodelay: Optional[bool] = Field(default=None, description="TCP_NODELAY,关闭Nagle算法")
+    send_buffer: Optional[int] = Field(default=None, ge=1024, description="SO_SNDBUF(字节)")
+    recv_buffer: Optional[int] = Field(default=None, ge=1024, description="SO_RCVBUF(字节)")
+    notsent_lowat: Optional[int] = Field(
+        default=None,
+        ge=0,
+        description="TCP_NOTSENT_LOWAT,内核未发送数据的低水位(字节)"
+    )
+    keepalive: Optional[bool] = Field(default=None, description="SO_KEEPALIVE")
+    keepalive_idle: Optional[int] = Field(default=None, ge=1, description="空闲多久后开始探测(秒)")
+    keepalive_interval: Optional[int] = Field(default=None, ge=1, description="探测间隔(秒)")
+    keepalive_count: Optional[int] = Field(default=None, ge=1, description="探测失败次数上限")
+
+
+class SocketTuningConfig(ConfigModel):
+    """按协议的socket调优配置"""
+    client: SocketOptionsConfig = Field(
+        default_factory=SocketOptionsConfig,
+        description="客户端侧socket选项"
+    )
+    target: SocketOptionsConfig = Field(
+        default_factory=SocketOptionsConfig,
+        description="目标侧socket选项"
+    )
+    buffer_size: Optional[int] = Field(default=None, ge=512, description="初始中继缓冲区大小(字节)")
+    adaptive_buffer: Optional[bool] = Field(default=None, description="是否自适应调整缓冲区大小")
+
+
+class ACLConfig(ConfigModel):
+    """
+    访问控制配置
+    
+    每个维度取最具体的规则,同样具体时拒绝优先;
+    无规则匹配时,若该维度配置了允许列表则拒绝,否则允许。
+    """
+    enabled: bool = Field(default=False, description="是否启用访问控制")
+    client_allow: List[str] = Field(default_factory=list, description="允许的客户端CIDR")
+    client_deny: List[str] = Field(default_factory=list, description="拒绝的客户端CIDR")
+    target_allow: List[str] = Field(
+        default_factory=list,
+        description="允许的目标(CIDR或域名: example.com / .example.com / *.example.com)"
+    )
+    target_deny: List[str] = Field(default_factory=list, description="拒绝的目标(CIDR或域名)")
+    target_allow_files: List[str] = Field(
+        default_factory=list,
+        description="允许的目标规则文件(每行一条)"
+    )
+    target_deny_files: List[str] = Field(
+        default_factory=list,
+        description="拒绝的目标规则文件(每行一条)"
+    )
+    port_allow: List[int | str] = Field(
+        default_factory=list,
+        description="允许的目标端口或范围(如 443, \"8000-9000\")"
+    )
+    port_deny: List[int | str] = Field(default_factory=list, description="拒绝的目标端口或范围")
+    
+    @field_validator("client_allow", "client_deny")
+    @classmethod
+    def validate_cidrs(cls, v: List[str]) -> List[str]:
+        """验证CIDR格式"""
+        for network in v:
+            try:
+                ipaddress.ip_network(network, strict=False)
+            except ValueError:
+                raise ValueError(f"无效的CIDR: {network}")
+        return v
+    
+    @field_validator("port_allow", "port_deny")
+    @classmethod
+    def validate_ports(cls, v: List[int | str]) -> List[int | str]:
+        """验证端口和端口范围"""
+        for item in v:
+            bounds = str(item).split('-', 1)
+            try:
+                low, high = int(bounds[0]), int(bounds[-1])
+            except ValueError:
+                raise ValueError(f"无效的端口: {item}")
+            if not 0 <= low <= high <= 65535:
+                raise ValueError(f"无效的端口范围: {item}")
+        return v
+
+
+class RoutingConfig(ConfigModel):
+    """分流路由配置"""
+    enabled: bool = Field(default=False, description="是否启用分流路由")
+    rules: List[str] = Field(
+        default_factory=list,
+        description="内联规则,格式同规则文件,如 DOMAIN-SUFFIX,example.com,direct"
+    )
+    rule_files: List[str] = Field(default_factory=list, description="规则文件路径列表")
+    compiled_cache: Optional[str] = Field(
+        default=None,
+        description="编译结果缓存文件路径,规则内容不变时直接加载(pickle格式,只能由运行代理的用户写入)"
+    )
+    decision_cache_size: int = Field(default=10000, ge=0, description="路由决策LRU缓存大小")
+
+
+class CircuitBreakerConfig(ConfigModel):
+    """目标熔断配置"""
+    enabled: bool = Field(default=False, description="是否启用目标熔断")
+    failure_threshold: int = Field(default=5, ge=1, description="连续失败多少次后熔断")
+    cooldown: float = Field(default=10.0, gt=0, description="熔断冷却时间(秒)")
+    max_cooldown: float = Field(default=300.0, gt=0, description="探测连续失败时冷却时间的上限(秒)")
+    half_open_max: int = Field(default=1, ge=1, description="冷却结束后同时放行的探测连接数")
+    max_entries: int = Field(default=10000, ge=1, description="最多跟踪的目标数量")
+
+
+class UserQuotaConfig(ConfigModel):
+    """单个用户的流量配额(None表示使用默认配额)"""
+    daily: Optional[int] = Field(default=None, ge=0, description="每日流量上限(字节),0表示不限制")
+    monthly: Optional[int] = Field(default=None, ge=0, description="每月流量上限(字节),0表示不限制")
+
+
+class QuotaConfig(ConfigModel):
+    """
+    按用户的流量配额配置
+
+    流量为上下行字节之和,按本地时间的自然日/自然月统计,只作用于认证用户。
+    """
+    enabled: bool = Field(default=False, description="是否启用流量配额")
+    daily: int = Field(default=0, ge=0, description="默认每日流量上限(字节),0表示不限制")
+    monthly: int = Field(default=0, ge=0, description="默认每月流量上限(字节),0表示不限制")
+    users: Dict[str, UserQuotaConfig] = Field(
+        default_factory=dict,
+        description="按用户名覆盖默认配额"
+    )
+    close_exceeded: bool = Field(default=False, description="超出配额时是否同时关闭该用户的活跃连接")
+    store: Optional[str] = Field(
+        default=None,
+        description="用量持久化的SQLite数据库路径,None表示只在内存中统计(重启后清零)"
+    )
+    check_interval: float = Field(default=1.0, gt=0, description="采集活跃连接流量的间隔(秒)")
+    flush_interval: float = Field(default=10.0, gt=0, description="批量写入存储的间隔(秒)")
+
+
+class HookConfig(ConfigModel):
+    """连接钩子配置"""
+    path: str = Field(
+        pattern=r"^[A-Za-z_][\w.]*:[A-Za-z_][\w.]*$",
+        description="钩子类的导入路径,格式为 模块路径:类名"
+    )
+    options: Dict[str, Any] = Field(default_factory=dict, description="传给钩子构造函数的关键字参数")
+    enabled: bool = Field(default=True, description="是否启用该钩子")
+
+
+class LoadSheddingConfig(ConfigModel):
+    """
+    负载削减配置
+    
+    事件循环延迟持续超过阈值时按比例拒绝新连接(HTTP返回503,SOCKS5拒绝握手),
+    避免已建立的隧道整体卡顿。
+    """
+    enabled: bool = Field(default=False, description="是否启用负载削减")
+    lag_threshold: float = Field(default=0.05, gt=0, description="事件循环延迟阈值(秒)")
+    interval: float = Field(
+        default=0.05,
+        gt=0,
+        description="延迟测量间隔(秒),启用管理接口的事件循环监控时共用其心跳和 loop_monitor_interval"
+    )
+    smoothing: float = Field(default=0.3, gt=0, le=1, description="延迟指数平滑系数,越大响应越快")
+    step: float = Field(default=0.05, gt=0, le=1, description="每个测量周期拒绝比例的调整幅度")
+    max_shed_ratio: float = Field(default=0.5, gt=0, le=1, description="新连接的最大拒绝比例")
+    retry_after: int = Field(default=1, ge=0, description="HTTP 503响应的 Retry-After(秒)")
+
+
+class TLSConfig(ConfigModel):
+    """
+    TLS监听配置
+    
+    在独立端口上以TLS接受连接(HTTPS代理 / SOCKS5 over TLS),
+    握手完成后的协议检测与明文端口相同。
+    """
+    enabled: bool = Field(default=False, description="是否启用TLS监听")
+    host: Optional[str] = Field(default=None, description="监听地址,默认与明文端口相同")
+    port: int = Field(default=7900, ge=1, le=65535, description="TLS监听端口")
+    certfile: Optional[str] = Field(default=None, description="证书文件路径(PEM,可包含证书链)")
+    keyfile: Optional[str] = Field(default=None, description="私钥文件路径,证书文件已包含私钥时可省略")
+    alpn_protocols: List[str] = Field(
+        default=["http/1.1"],
+        description="ALPN协议列表,客户端未协商ALPN时同样接受"
+    )
+    min_version: str = Field(
+        default="TLSv1.2",
+        pattern="^(TLSv1.2|TLSv1.3)$",
+        description="最低TLS版本"
+    )
+    handshake_timeout: float = Field(default=10.0, gt=0, description="TLS握手超时(秒)")
+    session_tickets: bool = Field(default=True, description="是否签发会话票据以支持会话恢复")
+    num_tickets: int = Field(default=2, ge=0, description="TLS 1.3每次完整握手签发的会话票据数量")
+    
+    @model_validator(mode="after")
+    def validate_certificate(self) -> "TLSConfig":
+        """启用时必须配置证书"""
+        if self.enabled and not self.certfile:
+            raise ValueError("启用TLS监听时必须配置 certfile")
+        return self
+
+
+class AdminConfig(ConfigModel):
+    """
+    管理接口配置
+    
+    管理接口提供统计信息、采样分析和事件循环监控,默认只监听本机地址。
+    """
+    enabled: bool = Field(default=False, description="是否启用管理接口")
+    host: str = Field(default="127.0.0.1", description="监听地址")
+    port: int = Field(default=7901, ge=1, le=65535, description="监听端口")
+    token: Optional[str] = Field(
+        default=None,
+        description="访问令牌,设置后请求需携带 Authorization: Bearer <token>"
+    )
+    max_profile_seconds: int = Field(default=60, ge=1, description="单次采样分析的最长时间(秒)")
+    loop_monitor: bool = Field(default=True, description="是否监控事件循环延迟")
+    loop_monitor_interval: float = Field(default=0.1, gt=0, description="事件循环延迟采样间隔(秒)")
+    slow_callback_threshold: float = Field(
+        default=0.1,
+        gt=0,
+        description="事件循环阻塞超过该时间(秒)时记录当前协程和调用栈"
+    )
+    history: bool = Field(default=True, description="是否记录连接数和吞吐的时间序列")
+    history_seconds: int = Field(default=3600, ge=1, description="保留的秒级采样数量")
+    history_minutes: int = Field(default=1440, ge=1, description="保留的分钟级采样数量")
+    history_hours: int = Field(default=168, ge=1, description="保留的小时级采样数量")
+
+
+def _validate_protocols(v: List[str]) -> List[str]:
+    """验证协议列表"""
+    valid_protocols = {"http", "https", "socks5", "mux"}
+    for protocol in v:
+        if protocol.lower() not in valid_protocols:
+            raise ValueError(
+                f"不支持的协议: {protocol}. "
+                f"支持的协议: {', '.join(valid_protocols)}"
+            )
+    return [p.lower() for p in v]
+
+
+class ListenerConfig(ConfigModel):
+    """
+    代理监听配置
+    
+    每个监听器只接受 protocols 中的协议,未启用的协议在识别后立即拒绝;
+    只启用 socks5 的监听器不做协议探测,直接进入SOCKS5握手。
+    """
+    host: Optional[str] = Field(default=None, description="监听地址,None表示与代理监听地址相同")
+    port: int = Field(ge=1, le=65535, description="监听端口")
+    protocols: List[str] = Field(
+        default=["http", "https", "socks5"],
+        min_length=1,
+        description="该监听器启用的协议列表"
+    )
+    
+    @field_validator("protocols")
+    @classmethod
+    def validate_protocols(cls, v: List[str]) -> List[str]:
+        """验证协议列表"""
+        return _validate_protocols(v)
+
+
+class ProxyConfig(ConfigModel):
     """代理服务器配置"""
     
     # 服务器配置
@@ -109,14 +471,59 @@ class ProxyConfig(BaseModel):
     # 协议配置
     protocols: List[str] = Field(
         default=["http", "https", "socks5"],
+        min_length=1,
         description="启用的协议列表"
     )
     
+    # 多监听配置,非空时替代 host/port/protocols 定义的单一监听
+    listeners: List[ListenerConfig] = Field(
+        default_factory=list,
+        description="代理监听列表,每个监听器有独立的地址、端口和协议"
+    )
+    
     # 连接配置
     max_connections: int = Field(default=1000, ge=1, description="最大并发连接数")
     connection_timeout: int = Field(default=30, ge=1, description="连接超时(秒)")
     idle_timeout: int = Field(default=300, ge=1, description="空闲超时(秒)")
     buffer_size: int = Field(default=8192, ge=512, description="缓冲区大小(字节)")
+    buffer_pool_size: int = Field(default=256, ge=0, description="预分配并保留的中继缓冲区数量")
+    min_buffer_size: int = Field(default=2048, ge=512, description="自适应缓冲区下限(字节)")
+    max_buffer_size: int = Field(default=256 * 1024, ge=512, description="自适应缓冲区上限(字节)")
+    adaptive_buffer: bool = Field(default=True, description="是否根据流量自适应调整中继缓冲区")
+    max_connection_memory: int = Field(
+        default=256 * 1024,
+        ge=4096,
+        description="单个连接中继数据的内存上限(字节),含读缓冲和两侧写缓冲"
+    )
+    write_buffer_limit: Optional[int] = Field(
+        default=None,
+        ge=1024,
+        description="中继每侧写缓冲高水位(字节),None表示按 max_connection_memory 推算"
+    )
+    max_total_buffered: int = Field(
+        default=0,
+        ge=0,
+        description="所有连接写缓冲积压的总上限(字节),超出后暂停读取新数据,0表示不限制"
+    )
+    stall_timeout: float = Field(
+        default=60,
+        ge=0,
+        description="写缓冲有积压且持续无发送进展超过该时间(秒)的连接被关闭,0表示不检测"
+    )
+    tcp_fastopen: int = Field(
+        default=0,
+        ge=0,
+        description="监听socket的TCP Fast Open队列长度,0表示不启用"
+    )
+    tcp_fastopen_connect: bool = Field(
+        default=False,
+        description="直连目标时使用TCP Fast Open,客户端的首个数据随SYN发送"
+    )
+    defer_accept: int = Field(
+        default=0,
+        ge=0,
+        description="TCP_DEFER_ACCEPT: 客户端发送数据后才接受连接,值为最长等待秒数,0表示不启用"
+    )
     
     # 日志配置
     log_level: str = Field(
@@ -126,38 +533,201 @@ class ProxyConfig(BaseModel):
     )
     access_log: bool = Field(default=True, description="是否记录访问日志")
     log_file: Optional[str] = Field(default=None, description="日志文件路径")
+    log_sampling: Dict[str, float] = Field(
+        default_factory=dict,
+        description="按事件名的日志采样率(0-1),未列出的事件全部记录"
+    )
+    collapse_connection_logs: bool = Field(
+        default=False,
+        description="连接过程中的INFO/DEBUG事件不单独记录,合并到访问日志"
+    )
+    stats_interval: float = Field(
+        default=1.0,
+        ge=0,
+        description="活跃连接的流量计入统计的间隔(秒),0表示只在连接结束时计入"
+    )
     
     # 认证配置(可选)
     auth: Optional[AuthConfig] = None
     
+    # socket调优配置,键为 default/http/https/socks5,协议配置覆盖 default 中的同名项
+    socket_tuning: Dict[str, SocketTuningConfig] = Field(
+        default_factory=dict,
+        description="按协议的socket调优配置"
+    )
+    
+    # 访问控制配置(可选)
+    acl: Optional[ACLConfig] = None
+    
+    # 分流路由配置(可选)
+    routing: Optional[RoutingConfig] = None
+    
+    # 目标熔断配置(可选)
+    circuit_breaker: Optional[CircuitBreakerConfig] = None
+    
+    # 负载削减配置(可选)
+    load_shedding: Optional[LoadSheddingConfig] = None
+    
+    # 流量配额配置(可选)
+    quota: Optional[QuotaConfig] = None
+    
+    # 连接钩子(按顺序调用)
+    hooks: List[HookConfig] = Field(default_factory=list, description="连接钩子列表")
+    
+    # TLS监听配置(可选)
+    tls: Optional[TLSConfig] = None
+    
+    # 管理接口配置(可选)
+    admin: Optional[AdminConfig] = None
+    
+    # HTTP缓存配置(可选)
+    cache: Optional[CacheConfig] = None
+    
+    # 上游代理配置(可选)
+    upstream_groups: List[UpstreamGroupConfig] = Field(
+        default_factory=list,
+        description="上游代理组列表"
+    )
+    upstream: Optional[str] = Field(
+        default=None,
+        description="默认出站使用的上游代理组名称,None表示直连"
+    )
+    
     @field_validator("protocols")
     @classmethod
     def validate_protocols(cls, v: List[str]) -> List[str]:
         """验证协议列表"""
-        valid_protocols = {"http", "https", "socks5"}
-        for protocol in v:
-            if protocol.lower() not in valid_protocols:
+        return _validate_protocols(v)
+    
+    @field_validator("log_sampling")
+    @classmethod
+    def validate_log_sampling(cls, v: Dict[str, float]) -> Dict[str, float]:
+        """验证日志采样率"""
+        for event, rate in v.items():
+            if not 0 <= rate <= 1:
+                raise ValueError(f"日志采样率必须在0到1之间: {event}={rate}")
+        return v
+    
+    @field_validator("socket_tuning")
+    @classmethod
+    def validate_socket_tuning(
+        cls, v: Dict[str, SocketTuningConfig]
+    ) -> Dict[str, SocketTuningConfig]:
+        """验证socket调优配置的键"""
+        valid_keys = {"default", "http", "https", "socks5", "mux"}
+        for key in v:
+            if key not in valid_keys:
                 raise ValueError(
-                    f"不支持的协议: {protocol}. "
-                    f"支持的协议: {', '.join(valid_protocols)}"
+                    f"不支持的socket调优配置: {key}. "
+                    f"支持的配置: {', '.join(sorted(valid_keys))}"
                 )
-        return [p.lower() for p in v]
+        return v
+    
+    @model_validator(mode="after")
+    def validate_buffer_sizes(self) -> "ProxyConfig":
+        """验证缓冲区大小范围"""
+        if self.min_buffer_size > self.max_buffer_size:
+            raise ValueError("min_buffer_size 不能大于 max_buffer_size")
+        return self
+    
+    @model_validator(mode="after")
+    def validate_upstream(self) -> "ProxyConfig":
+        """验证上游代理组引用"""
+        names = [group.name for group in self.upstream_groups]
+        if len(names) != len(set(names)):
+            raise ValueError("上游代理组名称不能重复")
+        reserved = {"direct", "reject"} & {name.lower() for name in names}
+        if reserved:
+            raise ValueError(f"上游代理组名称不能使用保留字: {', '.join(sorted(reserved))}")
+        if self.upstream is not None and self.upstream not in names:
+            raise ValueError(f"未定义的上游代理组: {self.upstream}")
+        return self
+    
+    @model_validator(mode="after")
+    def validate_listeners(self) -> "ProxyConfig":
+        """各监听器不能使用同一地址和端口"""
+        if self.listeners:
+            listeners = [
+                ("代理", listener.host or self.host, listener.port) for listener in self.listeners
+            ]
+        else:
+            listeners = [("代理", self.host, self.port)]
+        if self.tls is not None and self.tls.enabled:
+            listeners.append(("TLS", self.tls.host or self.host, self.tls.port))
+        if self.admin is not None and self.admin.enabled:
+            listeners.append(("管理接口", self.admin.host, self.admin.port))
+        
+        seen = {}
+        for name, host, port in listeners:
+            for other_host, other_port in seen:
+                if port == other_port and (
+                    host == other_host or "0.0.0.0" in (host, other_host)
+                ):
+                    raise ValueError(
+                        f"{name}监听端口与{seen[(other_host, other_port)]}监听端口冲突: {port}"
+                    )
+            seen[(host, port)] = name
+        return self
     
     @classmethod
-    def from_yaml(cls, config_path: str | Path) -> "ProxyConfig":
-        """从YAML文件加载配置"""
+    def from_yaml(
+        cls,
+        config_path: str | Path,
+        snapshot_path: Optional[str | Path] = None
+    ) -> "ProxyConfig":
+        """
+        从YAML文件加载配置
+        
+        Args:
+            config_path: 配置文件路径
+            snapshot_path: 校验后配置的快照路径;配置文件内容未变化时直接加载快照,
+                跳过YAML解析和校验。快照以 pickle 保存,加载时会执行其中的对象构造,
+                文件及所在目录只能由运行代理的用户写入
+        """
         config_path = Path(config_path)
         
         if not config_path.exists():
             raise FileNotFoundError(f"配置文件不存在: {config_path}")
         
-        with open(config_path, 'r', encoding='utf-8') as f:
-            data = yaml.safe_load(f)
+        content = config_path.read_bytes()
+        digest = None
+        if snapshot_path is not None:
+            snapshot_path = Path(snapshot_path)
+            digest = _config_digest(content)
+            try:
+                with open(snapshot_path, 'rb') as f:
+                    # 首行是摘要,与当前配置一致时才反序列化
+                    if f.readline().rstrip(b"\n") == digest.encode('ascii'):
+                        config = pickle.load(f)
+                        if isinstance(config, cls):
+                            return config
+            except Exception:
+                # 快照损坏或不兼容时回退到解析配置文件
+                pass
+        
+        import yaml
+        
+        data = yaml.safe_load(content.decode('utf-8'))
         
         if data is None:
             data = {}
         
-        return cls(**data)
+        config = cls(**data)
+        
+        if snapshot_path is not None:
+            try:
+                snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = snapshot_path.with_name(snapshot_path.name + ".tmp")
+                fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(digest.encode('ascii') + b"\n")
+                    pickle.dump(config, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, snapshot_path)
+            except OSError:
+                # 快照只是加速手段,写入失败不影响启动
+                pass
+        
+        return config
     
     @classmethod
     def from_dict(cls, data: dict) -> "ProxyConfig":
@@ -166,6 +736,8 @@ class ProxyConfig(BaseModel):
     
     def to_yaml(self, config_path: str | Path) -> None:
         """保存配置到YAML文件"""
+        import yaml
+        
         config_path = Path(config_path)
         config_path.parent.mkdir(parents=True, exist_ok=True)
         
@@ -182,12 +754,27 @@ class ProxyConfig(BaseModel):
         return self.model_dump(exclude_none=True)
 
 
-def load_config(config_path: Optional[str | Path] = None) -> ProxyConfig:
+def _config_digest(content: bytes) -> str:
+    """计算配置快照的键: 配置文件内容 + 配置模型定义 + pydantic版本"""
+    import pydantic
+    
+    digest = hashlib.sha256(f"v{SNAPSHOT_FORMAT_VERSION}\n{pydantic.VERSION}\n".encode())
+    digest.update(Path(__file__).read_bytes())
+    digest.update(b"\0")
+    digest.update(content)
+    return digest.hexdigest()
+
+
+def load_config(
+    config_path: Optional[str | Path] = None,
+    snapshot_path: Optional[str | Path] = None
+) -> ProxyConfig:
     """
     加载配置
     
     Args:
         config_path: 配置文件路径,如果为None则使用默认配置
+        snapshot_path: 配置快照路径,为None时不使用快照
     
     Returns:
         ProxyConfig: 配置对象
@@ -196,7 +783,7 @@ def load_config(config_path: Optional[str | Path] = None) -> ProxyConfig:
         # 返回默认配置
         return ProxyConfig()
     
-    return ProxyConfig.from_yaml(config_path)
+    return ProxyConfig.from_yaml(config_path, snapshot_path)
 
 
 def create_default_config(config_path: str | Path) -> None:
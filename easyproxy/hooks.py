@@ -0,0 +1,193 @@
+"""连接钩子模块"""
+
+import asyncio
+import importlib
+import inspect
+from typing import TYPE_CHECKING, Any, Callable, Iterable, List, Optional, Tuple
+
+from .acl import AccessDeniedError
+from .config import HookConfig
+from .logger import get_logger
+
+if TYPE_CHECKING:
+    from .registry import ConnectionRecord
+
+logger = get_logger(__name__)
+
+# 钩子阶段(按连接生命周期顺序)
+STAGES = ("accept", "authenticated", "before_connect", "connected", "closed")
+
+# (回调, 是否为协程函数)
+Callback = Tuple[Callable[..., Any], bool]
+
+
+class HookRejected(AccessDeniedError):
+    """钩子拒绝连接"""
+
+
+class Hook:
+    """
+    连接钩子基类
+
+    子类覆盖需要的阶段方法即可,未覆盖的阶段不会被调用。方法可以是普通函数或协程函数。
+    除 closed 外,各阶段抛出 HookRejected 即拒绝该连接。
+
+    阶段:
+        on_accept(conn)                          客户端访问控制通过后,协议识别之前
+        on_authenticated(conn)                   认证成功后(仅启用认证时),conn.user 已设置
+        on_before_connect(conn)                  连接目标之前,可修改 conn.target_host / target_port 改写目标
+        on_connected(conn, writer)               目标连接建立后,writer 为目标连接的写入流
+        on_closed(conn, bytes_sent, bytes_received, error)
+                                                 连接结束时,异常只记录日志
+    """
+
+    def __init__(self, **options: Any):
+        """
+        Args:
+            options: 配置中 hooks[].options 的内容
+        """
+        self.options = options
+
+    def start(self) -> None:
+        """代理开始监听时在事件循环中调用"""
+
+    def stop(self) -> None:
+        """代理停止时调用"""
+
+    def on_accept(self, conn: "ConnectionRecord") -> None:
+        pass
+
+    def on_authenticated(self, conn: "ConnectionRecord") -> None:
+        pass
+
+    def on_before_connect(self, conn: "ConnectionRecord") -> None:
+        pass
+
+    def on_connected(self, conn: "ConnectionRecord", writer: asyncio.StreamWriter) -> None:
+        pass
+
+    def on_closed(
+        self,
+        conn: "ConnectionRecord",
+        bytes_sent: int,
+        bytes_received: int,
+        error: Optional[str]
+    ) -> None:
+        pass
+
+
+class HookPipeline:
+    """
+    编译后的钩子调用表
+
+    启动时为每个阶段解析出实际覆盖了该阶段方法的钩子,生成扁平的回调元组;
+    没有钩子的阶段是空元组,连接路径上只需一次真值判断。
+    """
+
+    def __init__(self, hooks: Iterable[Hook] = ()):
+        """
+        初始化调用表
+
+        Args:
+            hooks: 钩子实例,按调用顺序排列
+        """
+        self.hooks: List[Hook] = list(hooks)
+        self.accept: Tuple[Callback, ...] = self._compile("accept")
+        self.authenticated: Tuple[Callback, ...] = self._compile("authenticated")
+        self.before_connect: Tuple[Callback, ...] = self._compile("before_connect")
+        self.connected: Tuple[Callback, ...] = self._compile("connected")
+        self.closed: Tuple[Callback, ...] = self._compile("closed")
+
+    def _compile(self, stage: str) -> Tuple[Callback, ...]:
+        name = f"on_{stage}"
+        default = getattr(Hook, name)
+        callbacks = []
+        for hook in self.hooks:
+            if getattr(type(hook), name, default) is default:
+                continue
+            callback = getattr(hook, name)
+            callbacks.append((callback, inspect.iscoroutinefunction(callback)))
+        return tuple(callbacks)
+
+    def __bool__(self) -> bool:
+        return bool(self.hooks)
+
+    @staticmethod
+    async def run(callbacks: Tuple[Callback, ...], *args: Any) -> None:
+        """
+        依次调用一个阶段的回调
+
+        Raises:
+            HookRejected: 钩子拒绝该连接
+        """
+        for callback, is_async in callbacks:
+            if is_async:
+                await callback(*args)
+            else:
+                callback(*args)
+
+    async def run_closed(self, *args: Any) -> None:
+        """调用 closed 阶段的回调,单个钩子的异常不影响其他钩子"""
+        for callback, is_async in self.closed:
+            try:
+                if is_async:
+                    await callback(*args)
+                else:
+                    callback(*args)
+            except Exception as e:
+                logger.error("hook_error", stage="closed", hook=type(callback.__self__).__name__,
+                             error=str(e), exc_info=True)
+
+    def start(self) -> None:
+        for hook in self.hooks:
+            hook.start()
+
+    def stop(self) -> None:
+        for hook in self.hooks:
+            hook.stop()
+
+    def get_stats_dict(self) -> dict:
+        """各阶段的钩子"""
+        return {
+            stage: [type(callback.__self__).__name__ for callback, _ in getattr(self, stage)]
+            for stage in STAGES
+        }
+
+
+def load_hook(config: HookConfig) -> Hook:
+    """
+    按 "模块路径:类名" 导入钩子类并实例化
+
+    Raises:
+        ImportError / AttributeError: 无法导入
+        TypeError: 目标不是 Hook 的子类
+    """
+    module_name, _, attr = config.path.partition(":")
+    target: Any = importlib.import_module(module_name)
+    for part in attr.split("."):
+        target = getattr(target, part)
+    if not (isinstance(target, type) and issubclass(target, Hook)):
+        raise TypeError(f"钩子必须是 easyproxy.hooks.Hook 的子类: {config.path}")
+    return target(**config.options)
+
+
+def create_hook_pipeline(
+    configs: List[HookConfig],
+    hooks: Optional[Iterable[Hook]] = None
+) -> HookPipeline:
+    """
+    创建钩子调用表
+
+    Args:
+        configs: 配置中的钩子列表,未启用的被跳过
+        hooks: 以代码方式传入的钩子实例,排在配置的钩子之后
+
+    Returns:
+        HookPipeline: 调用表,没有钩子时各阶段为空
+    """
+    loaded = [load_hook(config) for config in configs if config.enabled]
+    loaded.extend(hooks or ())
+    pipeline = HookPipeline(loaded)
+    for hook in loaded:
+        logger.info(f"已加载连接钩子: {type(hook).__module__}.{type(hook).__name__}")
+    return pipeline
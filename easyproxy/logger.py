@@ -1,12 +1,16 @@
 """结构化日志系统"""
 
+import asyncio
 import logging
 import sys
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Optional, Tuple
 import structlog
 from structlog.types import EventDict, WrappedLogger
 
+if TYPE_CHECKING:
+    from .registry import ConnectionRecord, ConnectionRegistry
+
 
 def add_log_level(
     logger: WrappedLogger, method_name: str, event_dict: EventDict
@@ -71,9 +75,10 @@ def setup_logging(
             structlog.dev.ConsoleRenderer(colors=True)
         ])
     
+    # 按级别过滤的包装类: 低于日志级别的调用直接返回,不进入处理器链
     structlog.configure(
         processors=processors,
-        wrapper_class=structlog.stdlib.BoundLogger,
+        wrapper_class=structlog.make_filtering_bound_logger(getattr(logging, log_level.upper())),
         context_class=dict,
         logger_factory=structlog.stdlib.LoggerFactory(),
         cache_logger_on_first_use=True,
@@ -93,11 +98,72 @@ def get_logger(name: str) -> structlog.stdlib.BoundLogger:
     return structlog.get_logger(name)
 
 
+class LogSampler:
+    """
+    热路径日志门控
+    
+    调用方在构建事件参数之前先调用 enabled(),被级别过滤、采样丢弃
+    或合并到访问日志的事件不会产生任何格式化开销。
+    采样按事件计数确定性地进行,例如采样率0.1即每10条记录1条。
+    """
+    
+    def __init__(
+        self,
+        log_level: str = "INFO",
+        sampling: Optional[Dict[str, float]] = None,
+        collapse: bool = False
+    ):
+        """
+        初始化日志门控
+        
+        Args:
+            log_level: 日志级别
+            sampling: 按事件名的采样率(0-1),未列出的事件全部记录
+            collapse: 是否将连接过程中的INFO/DEBUG事件合并到访问日志
+        """
+        self.level = getattr(logging, log_level.upper())
+        self.sampling = dict(sampling or {})
+        self.collapse = collapse
+        self._credit: Dict[str, float] = {}
+    
+    def enabled(self, event: str, level: int = logging.INFO) -> bool:
+        """
+        判断事件是否需要记录
+        
+        Args:
+            event: 事件名
+            level: 事件级别
+        
+        Returns:
+            bool: 是否记录
+        """
+        if level < self.level:
+            return False
+        if self.collapse and level < logging.WARNING:
+            return False
+        return self.sampled(event)
+    
+    def sampled(self, event: str) -> bool:
+        """按采样率判断事件是否记录(首条总是记录)"""
+        rate = self.sampling.get(event)
+        if rate is None or rate >= 1:
+            return True
+        if rate <= 0:
+            return False
+        credit = self._credit.get(event, 1.0 - rate) + rate
+        if credit >= 1:
+            self._credit[event] = credit - 1
+            return True
+        self._credit[event] = credit
+        return False
+
+
 class AccessLogger:
     """访问日志记录器"""
     
-    def __init__(self, enabled: bool = True):
+    def __init__(self, enabled: bool = True, sampler: Optional[LogSampler] = None):
         self.enabled = enabled
+        self.sampler = sampler
         self.logger = get_logger("easyproxy.access")
     
     def log_request(
@@ -111,7 +177,8 @@ class AccessLogger:
         bytes_sent: int = 0,
         bytes_received: int = 0,
         duration_ms: float = 0,
-        error: Optional[str] = None
+        error: Optional[str] = None,
+        **details: Any
     ) -> None:
         """
         记录访问日志
@@ -127,10 +194,15 @@ class AccessLogger:
             bytes_received: 接收字节数
             duration_ms: 连接持续时间(毫秒)
             error: 错误信息
+            **details: 合并到访问日志中的连接过程信息(如认证用户名、建连耗时)
         """
         if not self.enabled:
             return
         
+        # 成功的请求可按采样率记录,失败的请求总是记录
+        if not error and self.sampler is not None and not self.sampler.sampled("proxy_request"):
+            return
+        
         log_data = {
             "client": f"{client_ip}:{client_port}",
             "protocol": protocol,
@@ -140,6 +212,8 @@ class AccessLogger:
             "bytes_received": bytes_received,
             "duration_ms": round(duration_ms, 2),
         }
+        if details:
+            log_data.update(details)
         
         if error:
             log_data["error"] = error
@@ -149,7 +223,12 @@ class AccessLogger:
 
 
 class ConnectionStats:
-    """连接统计"""
+    """
+    连接统计
+    
+    中继的每个方向只在本地累加字节数,活跃连接的流量由定时任务按增量计入总计,
+    连接结束时再计入剩余部分;转发路径上不更新共享的统计数据。
+    """
     
     def __init__(self):
         self.total_connections = 0
@@ -159,9 +238,20 @@ class ConnectionStats:
         self.connections_by_protocol = {
             "http": 0,
             "https": 0,
-            "socks5": 0
+            "socks5": 0,
+            "mux": 0
+        }
+        # 按协议的 [上行字节, 下行字节]
+        self.traffic_by_protocol = {
+            "http": [0, 0],
+            "https": [0, 0],
+            "socks5": [0, 0],
+            "mux": [0, 0]
         }
         self.error_count = 0
+        # 活跃连接已计入的流量: 连接ID -> (上行字节, 下行字节)
+        self._published: Dict[int, Tuple[int, int]] = {}
+        self._task: Optional[asyncio.Task] = None
         self.logger = get_logger("easyproxy.stats")
     
     def increment_connection(self, protocol: str) -> None:
@@ -175,10 +265,70 @@ class ConnectionStats:
         """减少活跃连接计数"""
         self.active_connections = max(0, self.active_connections - 1)
     
-    def add_traffic(self, bytes_sent: int, bytes_received: int) -> None:
+    def add_traffic(self, bytes_sent: int, bytes_received: int, protocol: Optional[str] = None) -> None:
         """添加流量统计"""
         self.total_bytes_sent += bytes_sent
         self.total_bytes_received += bytes_received
+        traffic = self.traffic_by_protocol.get(protocol)
+        if traffic is not None:
+            traffic[0] += bytes_sent
+            traffic[1] += bytes_received
+    
+    def collect(self, records: Iterable["ConnectionRecord"]) -> None:
+        """
+        计入活跃连接自上次采集以来的流量增量
+        
+        Args:
+            records: 活跃连接登记信息
+        """
+        published = self._published
+        for record in records:
+            if record.relay is None:
+                continue
+            sent, received = record.bytes_sent, record.bytes_received
+            last_sent, last_received = published.get(record.id, (0, 0))
+            if sent == last_sent and received == last_received:
+                continue
+            published[record.id] = (sent, received)
+            self.add_traffic(sent - last_sent, received - last_received, record.protocol)
+    
+    def finish(self, conn: "ConnectionRecord", bytes_sent: int, bytes_received: int) -> None:
+        """
+        连接结束时计入尚未计入的流量
+        
+        Args:
+            conn: 连接登记信息
+            bytes_sent: 连接的上行总字节数
+            bytes_received: 连接的下行总字节数
+        """
+        published_sent, published_received = self._published.pop(conn.id, (0, 0))
+        sent = max(bytes_sent - published_sent, 0)
+        received = max(bytes_received - published_received, 0)
+        if sent > 0 or received > 0:
+            self.add_traffic(sent, received, conn.protocol)
+    
+    def start(self, registry: "ConnectionRegistry", interval: float) -> None:
+        """
+        在当前事件循环中启动定时采集
+        
+        Args:
+            registry: 活跃连接登记表
+            interval: 采集间隔(秒)
+        """
+        self._task = asyncio.get_running_loop().create_task(
+            self._run(registry, interval), name="easyproxy-stats"
+        )
+    
+    def stop(self) -> None:
+        """停止定时采集"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+    
+    async def _run(self, registry: "ConnectionRegistry", interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            self.collect(registry)
     
     def increment_error(self) -> None:
         """增加错误计数"""
@@ -195,6 +345,7 @@ class ConnectionStats:
             http_connections=self.connections_by_protocol["http"],
             https_connections=self.connections_by_protocol["https"],
             socks5_connections=self.connections_by_protocol["socks5"],
+            mux_connections=self.connections_by_protocol["mux"],
             error_count=self.error_count
         )
     
@@ -206,5 +357,9 @@ class ConnectionStats:
             "total_bytes_sent": self.total_bytes_sent,
             "total_bytes_received": self.total_bytes_received,
             "connections_by_protocol": self.connections_by_protocol.copy(),
+            "traffic_by_protocol": {
+                protocol: {"bytes_sent": sent, "bytes_received": received}
+                for protocol, (sent, received) in self.traffic_by_protocol.items()
+            },
             "error_count": self.error_count
         }
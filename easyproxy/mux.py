@@ -0,0 +1,859 @@
+"""节点间多路复用隧道模块"""
+
+import asyncio
+import struct
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from .config import UpstreamConfig
+from .logger import get_logger
+from .relay import _take_buffered
+from .tuning import open_fastopen_connection
+
+logger = get_logger(__name__)
+
+OpenCallback = Callable[
+    ["MuxStream", asyncio.StreamReader, asyncio.StreamWriter, str, int], None
+]
+
+# 会话前导: 首字节 0xEB 既不是HTTP方法的首字母也不是SOCKS版本号,代理据此识别多路复用会话
+PREFACE = b"\xebEPMUX1\n"
+
+# 帧头: 类型(1) + 流ID(4) + 负载长度(4)
+_HEADER = struct.Struct("!BII")
+_WINDOW = struct.Struct("!I")
+_PORT = struct.Struct("!H")
+
+# 帧类型
+HELLO = 0       # 会话握手: 客户端发送窗口大小和凭据,服务端应答状态
+OPEN = 1        # 打开流: 目标端口 + 目标主机
+OPEN_OK = 2
+OPEN_FAIL = 3   # 打开失败: 原因 + 说明
+DATA = 4
+WINDOW = 5      # 归还发送窗口
+FIN = 6         # 半关闭: 发送方不再发送数据
+CLOSE = 7       # 关闭: 发送方不再收发数据,对端交付完已收到的数据后关闭
+RST = 8         # 重置: 丢弃全部数据立即关闭
+PING = 9
+PONG = 10
+
+# 单个帧的最大负载,也是发送调度的粒度
+MAX_FRAME = 16384
+
+# 建立会话(TCP连接和握手)的超时(秒)
+HANDSHAKE_TIMEOUT = 10
+
+# 流窗口的取值范围
+MIN_WINDOW = 16 * 1024
+MAX_WINDOW = 16 * 1024 * 1024
+
+# 发送优先级级数: 已发送不足64KB的流在最高级,此后每翻一倍降一级,
+# 使交互式的小流量连接不会排在大文件传输之后
+PRIORITY_LEVELS = 8
+_PRIORITY_SHIFT = 16
+
+# HELLO 应答状态
+HELLO_ACCEPTED = 0
+HELLO_REJECTED = 1      # 认证失败或被钩子拒绝
+HELLO_OVERLOADED = 2    # 节点负载过高,客户端应换用其他节点
+
+# OPEN_FAIL 原因(与SOCKS5 REP取值一致)
+FAIL_GENERAL = 0x01
+FAIL_DENIED = 0x02
+FAIL_UNREACHABLE = 0x04
+FAIL_REFUSED = 0x05
+FAIL_TIMEOUT = 0x06
+
+
+class MuxError(ConnectionError):
+    """多路复用会话错误"""
+
+
+class MuxOverloadedError(MuxError):
+    """对端节点负载过高,拒绝建立会话"""
+
+
+class MuxOpenError(ConnectionError):
+    """对端节点拒绝打开流"""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+def _frame(frame_type: int, stream_id: int, payload: bytes = b"") -> bytes:
+    return _HEADER.pack(frame_type, stream_id, len(payload)) + payload
+
+
+def _pack_str(value: str) -> bytes:
+    data = value.encode('utf-8')[:255]
+    return bytes([len(data)]) + data
+
+
+class MuxStream(asyncio.Transport):
+    """
+    会话中的一个流,对上层表现为普通的 asyncio Transport
+
+    可以挂载 StreamReaderProtocol 或中继的 BufferedProtocol。发送受对端通告的窗口限制,
+    超出窗口的数据在本地排队,由会话按优先级调度;收到的数据在协议暂停读取时缓存,
+    交付给协议后才向对端归还窗口,因此单个流的积压不会阻塞同一会话中的其他流。
+    """
+
+    def __init__(self, session: "MuxSession", stream_id: int):
+        super().__init__({
+            "peername": session.peername,
+            "sockname": session.sockname,
+            "mux_stream": stream_id,
+        })
+        self.session = session
+        self.id = stream_id
+        self._protocol: Optional[asyncio.BaseProtocol] = None
+        self._buffered = False
+
+        # 发送: 对端剩余窗口、已发送字节数和等待窗口或会话写缓冲的数据
+        self.send_window = session.window
+        self.sent = 0
+        self._send = bytearray()
+        self._queued = False
+        self._high = 65536
+        self._low = 16384
+        self._write_paused = False
+        self._fin_pending = False
+        self._fin_sent = False
+
+        # 接收: 协议暂停读取时缓存的数据,以及已交付、尚未归还给对端的窗口
+        self.received = 0
+        self._recv = bytearray()
+        self._unacked = 0
+        self._reading = True
+        self._delivering = False
+        self._eof_received = False
+        self._eof_delivered = False
+
+        self._remote_closed = False
+        self._closing = False
+        self._closed = False
+
+    # asyncio.Transport 接口
+
+    def set_protocol(self, protocol: asyncio.BaseProtocol) -> None:
+        self._protocol = protocol
+        self._buffered = isinstance(protocol, asyncio.BufferedProtocol)
+
+    def get_protocol(self) -> asyncio.BaseProtocol:
+        return self._protocol
+
+    def is_closing(self) -> bool:
+        return self._closing or self._closed
+
+    def is_reading(self) -> bool:
+        return self._reading and not self._closed
+
+    def pause_reading(self) -> None:
+        self._reading = False
+
+    def resume_reading(self) -> None:
+        if self._reading or self._closed:
+            return
+        self._reading = True
+        if not self._delivering:
+            self._deliver_pending()
+
+    def get_write_buffer_size(self) -> int:
+        return len(self._send)
+
+    def get_write_buffer_limits(self) -> Tuple[int, int]:
+        return self._low, self._high
+
+    def set_write_buffer_limits(self, high: Optional[int] = None, low: Optional[int] = None) -> None:
+        if high is None:
+            high = 65536 if low is None else 4 * low
+        if low is None:
+            low = high // 4
+        self._high, self._low = high, low
+        self._check_write_pressure()
+
+    def can_write_eof(self) -> bool:
+        return True
+
+    def write(self, data) -> None:
+        if self._closing or self._closed or self._remote_closed or self._fin_pending or self._fin_sent:
+            return
+        if not data:
+            return
+        if not self._send:
+            sent = self.session._send_direct(self, data)
+            if sent == len(data):
+                return
+            data = memoryview(data)[sent:]
+        self._send += data
+        self.session._schedule(self)
+        self._check_write_pressure()
+
+    def write_eof(self) -> None:
+        if self._closing or self._closed or self._fin_pending or self._fin_sent:
+            return
+        if self._send:
+            self._fin_pending = True
+        else:
+            self._send_fin()
+
+    def close(self) -> None:
+        if self._closing or self._closed:
+            return
+        self._closing = True
+        self._recv.clear()
+        if not self._send or self._remote_closed:
+            self._finish_close()
+
+    def abort(self) -> None:
+        if self._closed:
+            return
+        if not self._remote_closed:
+            self.session._write_frame(RST, self.id)
+        self._lost(None)
+
+    # 发送
+
+    def _send_fin(self) -> None:
+        self._fin_sent = True
+        if not self._remote_closed:
+            self.session._write_frame(FIN, self.id)
+
+    def _finish_close(self) -> None:
+        if not self._remote_closed:
+            self.session._write_frame(CLOSE, self.id)
+        self._lost(None)
+
+    def _drained(self) -> None:
+        """排队数据已全部发出"""
+        if self._fin_pending:
+            self._fin_pending = False
+            self._send_fin()
+        if self._closing:
+            self._finish_close()
+
+    def _check_write_pressure(self) -> None:
+        size = len(self._send)
+        protocol = self._protocol
+        if not self._write_paused and size > self._high:
+            self._write_paused = True
+            protocol.pause_writing()
+        elif self._write_paused and size <= self._low:
+            self._write_paused = False
+            protocol.resume_writing()
+
+    def _on_window(self, increment: int) -> None:
+        self.send_window += increment
+        if self._send:
+            self.session._schedule(self)
+
+    # 接收
+
+    def _on_data(self, payload: bytes) -> None:
+        if self._closing:
+            # 本端已不再读取: 丢弃数据但归还窗口,避免对端等待窗口而无法完成关闭
+            self.session._write_frame(WINDOW, self.id, _WINDOW.pack(len(payload)))
+            return
+        if len(self._recv) + self._unacked + len(payload) > self.session.window:
+            # 对端超出窗口发送
+            logger.warning("mux_window_violation", stream=self.id)
+            self.abort()
+            return
+        self.received += len(payload)
+        if self._reading and not self._recv and not self._delivering:
+            delivered = self._deliver(payload)
+            if delivered < len(payload):
+                self._recv += payload[delivered:]
+        else:
+            self._recv += payload
+
+    def _deliver(self, data: bytes) -> int:
+        """交付数据给协议,协议暂停读取时停止,返回已交付的字节数"""
+        protocol = self._protocol
+        self._delivering = True
+        try:
+            if self._buffered:
+                view = memoryview(data)
+                total = len(view)
+                pos = 0
+                while pos < total and self._reading and not self._closed:
+                    buffer = protocol.get_buffer(total - pos)
+                    size = min(len(buffer), total - pos)
+                    buffer[:size] = view[pos:pos + size]
+                    pos += size
+                    protocol.buffer_updated(size)
+            else:
+                protocol.data_received(data)
+                pos = len(data)
+        except Exception as e:
+            logger.error("mux_protocol_error", stream=self.id, error=str(e), exc_info=True)
+            self.abort()
+            return len(data)
+        finally:
+            self._delivering = False
+
+        self._unacked += pos
+        if self._unacked >= self.session.window // 4 and not self._closing and not self._closed:
+            self.session._write_frame(WINDOW, self.id, _WINDOW.pack(self._unacked))
+            self._unacked = 0
+        return pos
+
+    def _deliver_pending(self) -> None:
+        while self._recv and self._reading and not self._closed:
+            data = bytes(self._recv)
+            self._recv.clear()
+            delivered = self._deliver(data)
+            if delivered < len(data):
+                self._recv[:0] = data[delivered:]
+                break
+        if not self._recv and self._reading:
+            self._maybe_deliver_eof()
+
+    def _on_fin(self) -> None:
+        self._eof_received = True
+        if not self._recv and self._reading and not self._delivering:
+            self._maybe_deliver_eof()
+
+    def _maybe_deliver_eof(self) -> None:
+        if not self._eof_received or self._eof_delivered or self._closed:
+            return
+        self._eof_delivered = True
+        try:
+            keep_open = self._protocol.eof_received()
+        except Exception as e:
+            logger.error("mux_protocol_error", stream=self.id, error=str(e), exc_info=True)
+            self.abort()
+            return
+        if self._remote_closed:
+            self._lost(None)
+        elif not keep_open:
+            self.close()
+
+    def _on_close(self) -> None:
+        self._remote_closed = True
+        self._eof_received = True
+        # 对端不再读取,丢弃尚未发出的数据
+        self._send.clear()
+        self._fin_pending = False
+        if self._write_paused:
+            self._check_write_pressure()
+        if self._closing or self._eof_delivered:
+            self._lost(None)
+        elif not self._recv and self._reading and not self._delivering:
+            self._maybe_deliver_eof()
+
+    def _lost(self, exc: Optional[Exception]) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._send.clear()
+        self._recv.clear()
+        self.session._forget(self)
+        if self._protocol is not None:
+            self.session.loop.call_soon(self._protocol.connection_lost, exc)
+
+
+class MuxSession(asyncio.Protocol):
+    """
+    一条承载多个流的TCP连接
+
+    接收方向按帧分发到各个流;发送方向在TCP写缓冲未满时直接写出,
+    否则按流的优先级排队,TCP恢复可写后按级别从高到低、同级轮转地发送。
+    """
+
+    def __init__(
+        self,
+        window: int,
+        on_open: Optional[OpenCallback] = None,
+        keepalive: float = 0
+    ):
+        """
+        初始化会话
+
+        Args:
+            window: 每个流的接收窗口(字节),两个方向使用相同的值
+            on_open: 服务端收到 OPEN 时的回调 (stream, reader, writer, host, port),客户端为None
+            keepalive: 客户端无数据时发送心跳的间隔(秒),连续3个间隔无应答则断开,0表示不检测
+        """
+        self.window = window
+        self.on_open = on_open
+        self.keepalive = keepalive
+        self.loop = asyncio.get_running_loop()
+        self.transport: Optional[asyncio.Transport] = None
+        # 握手阶段的 StreamWriter 及其协议: 保持引用避免 StreamWriter 被回收时关闭连接
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._original: Optional[asyncio.BaseProtocol] = None
+        self.peername = None
+        self.sockname = None
+        self.streams: Dict[int, MuxStream] = {}
+        self._next_id = 1
+        self._opening: Dict[int, asyncio.Future] = {}
+        self._buffer = bytearray()
+        self._queues: List[Deque[MuxStream]] = [deque() for _ in range(PRIORITY_LEVELS)]
+        self._write_paused = False
+        self._flushing = False
+        self._closed = self.loop.create_future()
+        self._keepalive_task: Optional[asyncio.Task] = None
+        self.last_received = time.monotonic()
+        # 服务端处理流的任务
+        self.tasks: Set[asyncio.Task] = set()
+
+        # 统计
+        self.streams_opened = 0
+
+    @classmethod
+    def attach(
+        cls,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        window: int,
+        on_open: Optional[OpenCallback] = None,
+        keepalive: float = 0
+    ) -> "MuxSession":
+        """握手完成后接管连接的 transport"""
+        pending, _ = _take_buffered(reader)
+        session = cls(window, on_open, keepalive)
+        transport = writer.transport
+        session._writer = writer
+        session._original = transport.get_protocol()
+        transport.set_protocol(session)
+        session.connection_made(transport)
+        if transport.is_closing():
+            session.connection_lost(None)
+            return session
+        if pending:
+            session.data_received(pending)
+        # StreamReader 缓冲满时可能暂停了读取
+        transport.resume_reading()
+        return session
+
+    def is_closing(self) -> bool:
+        return self._closed.done() or self.transport is None or self.transport.is_closing()
+
+    async def wait_closed(self) -> None:
+        # 等待方被取消时不能取消会话自身的关闭状态
+        await asyncio.shield(self._closed)
+
+    def close(self) -> None:
+        if self.transport is not None:
+            self.transport.close()
+
+    # asyncio.Protocol 接口
+
+    def connection_made(self, transport: asyncio.Transport) -> None:
+        self.transport = transport
+        self.peername = transport.get_extra_info('peername')
+        self.sockname = transport.get_extra_info('sockname')
+        if self.keepalive > 0:
+            self._keepalive_task = self.loop.create_task(self._keepalive_loop())
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        if self._closed.done():
+            return
+        self._closed.set_result(None)
+        if self._original is not None:
+            # 让原 StreamWriter.wait_closed() 能够正常返回
+            self._original.connection_lost(exc)
+        if self._keepalive_task is not None:
+            self._keepalive_task.cancel()
+        error = MuxError("多路复用会话已断开")
+        for future in self._opening.values():
+            if not future.done():
+                future.set_exception(error)
+        self._opening.clear()
+        for stream in list(self.streams.values()):
+            stream._lost(ConnectionResetError("多路复用会话已断开"))
+
+    def pause_writing(self) -> None:
+        self._write_paused = True
+
+    def resume_writing(self) -> None:
+        self._write_paused = False
+        self._flush()
+
+    def data_received(self, data: bytes) -> None:
+        self.last_received = time.monotonic()
+        buffer = self._buffer
+        buffer += data
+        size = len(buffer)
+        pos = 0
+        while size - pos >= _HEADER.size:
+            frame_type, stream_id, length = _HEADER.unpack_from(buffer, pos)
+            if length > MAX_FRAME:
+                logger.warning("mux_protocol_error", peer=str(self.peername), error="帧过大")
+                self.transport.abort()
+                return
+            end = pos + _HEADER.size + length
+            if end > size:
+                break
+            payload = bytes(buffer[pos + _HEADER.size:end])
+            pos = end
+            self._dispatch(frame_type, stream_id, payload)
+            if self._closed.done():
+                return
+        if pos:
+            del buffer[:pos]
+
+    def eof_received(self) -> bool:
+        return False
+
+    # 帧处理
+
+    def _dispatch(self, frame_type: int, stream_id: int, payload: bytes) -> None:
+        if frame_type == DATA:
+            stream = self.streams.get(stream_id)
+            if stream is not None:
+                stream._on_data(payload)
+        elif frame_type == WINDOW:
+            stream = self.streams.get(stream_id)
+            if stream is not None and len(payload) == _WINDOW.size:
+                stream._on_window(_WINDOW.unpack(payload)[0])
+        elif frame_type == FIN:
+            stream = self.streams.get(stream_id)
+            if stream is not None:
+                stream._on_fin()
+        elif frame_type == CLOSE:
+            stream = self.streams.get(stream_id)
+            if stream is not None:
+                stream._on_close()
+        elif frame_type == RST:
+            stream = self.streams.get(stream_id)
+            if stream is not None:
+                stream._lost(ConnectionResetError("流被对端重置"))
+        elif frame_type == OPEN:
+            self._on_open(stream_id, payload)
+        elif frame_type in (OPEN_OK, OPEN_FAIL):
+            future = self._opening.pop(stream_id, None)
+            if future is None or future.done():
+                return
+            if frame_type == OPEN_OK:
+                future.set_result(None)
+            else:
+                code = payload[0] if payload else FAIL_GENERAL
+                future.set_exception(MuxOpenError(code, payload[1:].decode('utf-8', errors='replace')))
+        elif frame_type == PING:
+            self._write_frame(PONG, stream_id, payload)
+
+    def _on_open(self, stream_id: int, payload: bytes) -> None:
+        if self.on_open is None or stream_id in self.streams or len(payload) < _PORT.size + 1:
+            self._write_frame(OPEN_FAIL, stream_id, bytes([FAIL_GENERAL]))
+            return
+        port = _PORT.unpack_from(payload)[0]
+        host = payload[_PORT.size:].decode('utf-8', errors='replace')
+        stream = MuxStream(self, stream_id)
+        self.streams[stream_id] = stream
+        self.streams_opened += 1
+        reader, writer = stream_pair(stream)
+        self.on_open(stream, reader, writer, host, port)
+
+    def _forget(self, stream: MuxStream) -> None:
+        if self.streams.get(stream.id) is stream:
+            del self.streams[stream.id]
+
+    # 发送
+
+    def _write_frame(self, frame_type: int, stream_id: int, payload=b"") -> None:
+        if self.transport is None or self._closed.done():
+            return
+        self.transport.write(_HEADER.pack(frame_type, stream_id, len(payload)) + payload)
+
+    def _send_direct(self, stream: MuxStream, data) -> int:
+        """TCP写缓冲未满时直接发送窗口内的数据,返回发送的字节数"""
+        if self._write_paused or stream.send_window <= 0 or self._closed.done():
+            return 0
+        view = memoryview(data)
+        count = min(len(view), stream.send_window)
+        pos = 0
+        while pos < count:
+            end = min(pos + MAX_FRAME, count)
+            self._write_frame(DATA, stream.id, view[pos:end])
+            pos = end
+        stream.send_window -= count
+        stream.sent += count
+        return count
+
+    def _enqueue(self, stream: MuxStream) -> None:
+        if stream._queued or stream.send_window <= 0 or stream._closed:
+            return
+        level = min((stream.sent >> _PRIORITY_SHIFT).bit_length(), PRIORITY_LEVELS - 1)
+        self._queues[level].append(stream)
+        stream._queued = True
+
+    def _schedule(self, stream: MuxStream) -> None:
+        self._enqueue(stream)
+        self._flush()
+
+    def _flush(self) -> None:
+        """按优先级发送排队的数据,直到TCP写缓冲满或没有可发送的数据"""
+        if self._flushing:
+            return
+        self._flushing = True
+        try:
+            while not self._write_paused and not self._closed.done():
+                for queue in self._queues:
+                    if queue:
+                        break
+                else:
+                    return
+                stream = queue.popleft()
+                stream._queued = False
+                if stream._closed:
+                    continue
+                count = min(len(stream._send), stream.send_window, MAX_FRAME)
+                if count <= 0:
+                    continue
+                chunk = bytes(stream._send[:count])
+                del stream._send[:count]
+                stream.send_window -= count
+                stream.sent += count
+                self._write_frame(DATA, stream.id, chunk)
+                if stream._send:
+                    # 重新排队,已发送字节数增加后可能降到更低的优先级
+                    self._enqueue(stream)
+                else:
+                    stream._drained()
+                if stream._write_paused:
+                    stream._check_write_pressure()
+        finally:
+            self._flushing = False
+
+    async def _keepalive_loop(self) -> None:
+        interval = self.keepalive
+        while True:
+            await asyncio.sleep(interval)
+            idle = time.monotonic() - self.last_received
+            if idle > 3 * interval:
+                logger.warning("mux_session_timeout", peer=str(self.peername), idle=round(idle, 1))
+                self.transport.abort()
+                return
+            if idle >= interval:
+                self._write_frame(PING, 0, b"\0" * 8)
+
+    # 客户端
+
+    async def open_stream(self, host: str, port: int) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        """
+        打开一个到目标的流
+
+        Returns:
+            Tuple[StreamReader, StreamWriter]: 流的读写对象
+
+        Raises:
+            MuxOpenError: 对端节点拒绝或无法连接目标
+            MuxError: 会话已断开
+        """
+        if self.is_closing():
+            raise MuxError("多路复用会话已断开")
+        stream_id = self._next_id
+        self._next_id += 1
+        stream = MuxStream(self, stream_id)
+        self.streams[stream_id] = stream
+        self.streams_opened += 1
+        reader, writer = stream_pair(stream)
+        future = self.loop.create_future()
+        self._opening[stream_id] = future
+        self._write_frame(OPEN, stream_id, _PORT.pack(port) + host.encode('utf-8'))
+        try:
+            await future
+        except MuxOpenError:
+            stream._remote_closed = True
+            stream._lost(None)
+            raise
+        except BaseException:
+            self._opening.pop(stream_id, None)
+            stream.abort()
+            raise
+        return reader, writer
+
+    # 服务端
+
+    def accept(self, stream: MuxStream) -> None:
+        """通知客户端流已连接到目标"""
+        if not stream._closed:
+            self._write_frame(OPEN_OK, stream.id)
+
+    def reject(self, stream: MuxStream, code: int, message: str = "") -> None:
+        """通知客户端打开失败并释放流"""
+        if stream._closed:
+            return
+        self._write_frame(OPEN_FAIL, stream.id, bytes([code]) + message.encode('utf-8')[:512])
+        stream._remote_closed = True
+        stream._lost(None)
+
+    def get_stats_dict(self) -> dict:
+        return {
+            "peer": str(self.peername),
+            "streams": len(self.streams),
+            "streams_opened": self.streams_opened,
+        }
+
+
+def stream_pair(stream: MuxStream) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    """为流创建 StreamReader / StreamWriter"""
+    loop = stream.session.loop
+    reader = asyncio.StreamReader(loop=loop)
+    protocol = asyncio.StreamReaderProtocol(reader, loop=loop)
+    stream.set_protocol(protocol)
+    protocol.connection_made(stream)
+    return reader, asyncio.StreamWriter(stream, protocol, reader, loop)
+
+
+# =============================================================================
+# 握手
+# =============================================================================
+
+async def _read_frame(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+    frame_type, _, length = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    if length > MAX_FRAME:
+        raise MuxError("帧过大")
+    return frame_type, await reader.readexactly(length)
+
+
+async def read_hello(reader: asyncio.StreamReader) -> Tuple[int, str, str]:
+    """
+    服务端读取会话前导(首字节已被协议探测读取)和 HELLO
+
+    Returns:
+        Tuple[int, str, str]: (流窗口, 用户名, 密码)
+    """
+    if await reader.readexactly(len(PREFACE) - 1) != PREFACE[1:]:
+        raise MuxError("无效的多路复用会话前导")
+    frame_type, payload = await _read_frame(reader)
+    if frame_type != HELLO or len(payload) < _WINDOW.size + 2:
+        raise MuxError("无效的多路复用会话握手")
+    window = min(max(_WINDOW.unpack_from(payload)[0], MIN_WINDOW), MAX_WINDOW)
+    pos = _WINDOW.size
+    fields = []
+    for _ in range(2):
+        if pos >= len(payload) or pos + 1 + payload[pos] > len(payload):
+            raise MuxError("无效的多路复用会话握手")
+        length = payload[pos]
+        fields.append(payload[pos + 1:pos + 1 + length].decode('utf-8', errors='replace'))
+        pos += 1 + length
+    return window, fields[0], fields[1]
+
+
+def hello_reply(status: int) -> bytes:
+    """服务端的 HELLO 应答(HELLO_ACCEPTED / HELLO_REJECTED / HELLO_OVERLOADED)"""
+    return _frame(HELLO, 0, bytes([status]))
+
+
+async def client_handshake(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    window: int,
+    username: Optional[str],
+    password: Optional[str]
+) -> None:
+    """
+    客户端发送会话前导和 HELLO 并等待应答
+
+    Raises:
+        MuxOverloadedError: 对端负载过高
+        MuxError: 对端拒绝(认证失败或未启用多路复用)
+    """
+    writer.write(PREFACE + _frame(
+        HELLO, 0, _WINDOW.pack(window) + _pack_str(username or "") + _pack_str(password or "")
+    ))
+    await writer.drain()
+    try:
+        frame_type, payload = await _read_frame(reader)
+    except asyncio.IncompleteReadError:
+        raise MuxError("对端节点关闭了连接,可能未启用 mux 协议") from None
+    status = payload[0] if frame_type == HELLO and payload else None
+    if status == HELLO_OVERLOADED:
+        raise MuxOverloadedError("对端节点负载过高,拒绝多路复用会话")
+    if status != HELLO_ACCEPTED:
+        raise MuxError("对端节点拒绝多路复用会话(认证失败)")
+
+
+# =============================================================================
+# 客户端会话池
+# =============================================================================
+
+class MuxClient:
+    """
+    到一个上游 easyproxy 节点的多路复用会话池
+
+    最多保持 mux_connections 条持久连接,新流分配到活跃流最少的会话;
+    会话按需建立,断开后在下一次打开流时重新建立。
+    """
+
+    def __init__(self, config: UpstreamConfig):
+        self.config = config
+        self.sessions: List[MuxSession] = []
+        self._connecting: Optional[asyncio.Task] = None
+
+        # 统计
+        self.sessions_opened = 0
+        self.session_failures = 0
+
+    async def open_stream(self, host: str, port: int) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        """经会话打开到目标的流"""
+        session = await self._select()
+        return await session.open_stream(host, port)
+
+    async def _select(self) -> MuxSession:
+        self.sessions = [session for session in self.sessions if not session.is_closing()]
+        if len(self.sessions) < self.config.mux_connections and self._connecting is None:
+            self._connecting = asyncio.get_running_loop().create_task(self._connect())
+            self._connecting.add_done_callback(self._connected)
+        if self.sessions:
+            return min(self.sessions, key=lambda session: len(session.streams))
+        return await asyncio.shield(self._connecting)
+
+    async def _connect(self) -> MuxSession:
+        config = self.config
+        async with asyncio.timeout(HANDSHAKE_TIMEOUT):
+            if config.fastopen:
+                reader, writer = await open_fastopen_connection(config.host, config.port)
+            else:
+                reader, writer = await asyncio.open_connection(config.host, config.port)
+            try:
+                await client_handshake(
+                    reader, writer, config.mux_window, config.username, config.password
+                )
+            except BaseException:
+                writer.close()
+                raise
+        return MuxSession.attach(reader, writer, config.mux_window, keepalive=config.mux_keepalive)
+
+    def _connected(self, task: asyncio.Task) -> None:
+        self._connecting = None
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            self.session_failures += 1
+            logger.warning(
+                "mux_session_failed",
+                upstream=f"{self.config.host}:{self.config.port}",
+                error=str(error) or type(error).__name__
+            )
+            return
+        self.sessions.append(task.result())
+        self.sessions_opened += 1
+        logger.info(
+            "mux_session_opened",
+            upstream=f"{self.config.host}:{self.config.port}",
+            sessions=len(self.sessions)
+        )
+
+    def close(self) -> None:
+        """关闭全部会话"""
+        if self._connecting is not None:
+            self._connecting.cancel()
+        for session in self.sessions:
+            session.close()
+        self.sessions = []
+
+    def get_stats_dict(self) -> dict:
+        """获取会话池统计信息"""
+        return {
+            "sessions": len([s for s in self.sessions if not s.is_closing()]),
+            "streams": sum(len(s.streams) for s in self.sessions),
+            "sessions_opened": self.sessions_opened,
+            "session_failures": self.session_failures,
+        }
@@ -0,0 +1,232 @@
+"""采样分析与事件循环监控模块"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from types import FrameType
+from typing import Callable, Deque, List, Optional
+
+from .logger import get_logger
+from .timing import Histogram
+
+logger = get_logger(__name__)
+
+# 采样栈的最大深度
+MAX_STACK_DEPTH = 128
+
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_qualname}"
+
+
+def collapse_stack(frame: Optional[FrameType], limit: int = MAX_STACK_DEPTH) -> List[str]:
+    """将调用栈转换为从外到内的帧标签列表"""
+    labels = []
+    while frame is not None and len(labels) < limit:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def _is_idle(frame: FrameType) -> bool:
+    """事件循环线程是否正阻塞在 selector 上等待事件"""
+    return os.path.basename(frame.f_code.co_filename) == "selectors.py"
+
+
+class SamplingProfiler:
+    """
+    基于线程的栈采样分析器
+
+    在独立线程中按固定间隔读取事件循环线程的当前栈,不需要信号处理,
+    也不影响被采样线程的执行;输出为 flamegraph.pl / speedscope 可用的折叠栈格式。
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.005, include_idle: bool = False):
+        """
+        初始化采样分析器
+
+        Args:
+            thread_id: 被采样线程的ID
+            interval: 采样间隔(秒)
+            include_idle: 是否包含事件循环空闲等待的样本
+        """
+        self.thread_id = thread_id
+        self.interval = interval
+        self.include_idle = include_idle
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.idle_samples = 0
+
+    def run(self, duration: float) -> "SamplingProfiler":
+        """
+        采样指定时长(阻塞,应在工作线程中调用)
+
+        Args:
+            duration: 采样时长(秒)
+
+        Returns:
+            SamplingProfiler: 自身,便于链式取结果
+        """
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.samples += 1
+                if _is_idle(frame):
+                    self.idle_samples += 1
+                    if self.include_idle:
+                        self.stacks[";".join(collapse_stack(frame))] += 1
+                else:
+                    self.stacks[";".join(collapse_stack(frame))] += 1
+            del frame
+            time.sleep(self.interval)
+        return self
+
+    def format_collapsed(self) -> str:
+        """折叠栈文本,每行 `帧;帧;帧 次数`"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class LoopMonitor:
+    """
+    事件循环延迟监控
+
+    心跳协程按固定间隔休眠并测量实际唤醒延迟,每次测量结果同时通知已注册的监听者
+    (如负载削减),避免多个组件各自运行心跳;看门狗线程发现心跳停滞超过阈值时,
+    记录事件循环线程当前正在执行的任务、协程名和调用栈。
+    """
+
+    def __init__(
+        self,
+        interval: float = 0.1,
+        threshold: float = 0.1,
+        history: int = 50,
+        watchdog: bool = True
+    ):
+        """
+        初始化事件循环监控
+
+        Args:
+            interval: 心跳间隔(秒)
+            threshold: 阻塞报告阈值(秒)
+            history: 保留的阻塞记录数量
+            watchdog: 是否启动看门狗线程记录阻塞位置
+        """
+        self.interval = interval
+        self.threshold = threshold
+        self.watchdog = watchdog
+        self.lag = Histogram()
+        self.blocked: Deque[dict] = deque(maxlen=history)
+        self.blocked_count = 0
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._last_tick = 0.0
+        self._tick = 0
+        # 看门狗在当前心跳周期内记录的阻塞,心跳恢复后补全实际阻塞时长
+        self._pending: Optional[dict] = None
+        # 每次心跳以延迟(秒)调用的监听者
+        self._listeners: List[Callable[[float], None]] = []
+
+    def add_listener(self, listener: Callable[[float], None]) -> None:
+        """注册延迟监听者"""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[float], None]) -> None:
+        """取消注册延迟监听者"""
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def start(self) -> None:
+        """在当前事件循环中启动监控"""
+        self._loop = asyncio.get_running_loop()
+        self._thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._stopped.clear()
+        self._task = self._loop.create_task(self._heartbeat(), name="easyproxy-loop-monitor")
+        if self.watchdog:
+            self._watchdog = threading.Thread(
+                target=self._watch, name="easyproxy-loop-watchdog", daemon=True
+            )
+            self._watchdog.start()
+
+    def stop(self) -> None:
+        """停止监控"""
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _heartbeat(self) -> None:
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - start - self.interval)
+            self.lag.observe(lag * 1000)
+            pending, self._pending = self._pending, None
+            if pending is not None:
+                pending["blocked_ms"] = round(lag * 1000, 1)
+            self._last_tick = now
+            self._tick += 1
+            for listener in self._listeners:
+                listener(lag)
+
+    def _watch(self) -> None:
+        reported_tick = -1
+        while not self._stopped.wait(self.threshold / 2):
+            tick = self._tick
+            stalled = time.monotonic() - self._last_tick - self.interval
+            if stalled < self.threshold or tick == reported_tick:
+                continue
+            reported_tick = tick
+            self._report_blocked(stalled)
+
+    def _report_blocked(self, stalled: float) -> None:
+        """记录事件循环线程当前的执行位置(在看门狗线程中调用)"""
+        frame = sys._current_frames().get(self._thread_id)
+        stack = collapse_stack(frame)
+        del frame
+
+        task = asyncio.current_task(self._loop)
+        coroutine = None
+        task_name = None
+        if task is not None:
+            task_name = task.get_name()
+            coro = task.get_coro()
+            coroutine = getattr(coro, "__qualname__", repr(coro))
+
+        # blocked_ms 先记录为检测时已阻塞的时长,恢复后由心跳更新为实际值
+        record = {
+            "time": time.time(),
+            "blocked_ms": round(stalled * 1000, 1),
+            "task": task_name,
+            "coroutine": coroutine,
+            "stack": stack[-16:],
+        }
+        self.blocked.append(record)
+        self.blocked_count += 1
+        self._pending = record
+        logger.warning(
+            "event_loop_blocked",
+            blocked_ms=record["blocked_ms"],
+            task=task_name,
+            coroutine=coroutine,
+            where=stack[-1] if stack else None
+        )
+
+    def get_stats_dict(self) -> dict:
+        """获取事件循环延迟统计和最近的阻塞记录"""
+        return {
+            "lag": self.lag.get_stats_dict(),
+            "blocked_count": self.blocked_count,
+            "recent_blocked": list(self.blocked),
+        }
@@ -1,14 +1,53 @@
 """简单的HTTP/HTTPS/SOCKS5代理服务器实现"""
 
 import asyncio
+import functools
+import logging
+import socket
 import struct
-import time
-from typing import Tuple, Optional
+from typing import FrozenSet, Iterable, Tuple, Optional
 from urllib.parse import urlparse
 
 from .config import ProxyConfig
-from .logger import get_logger, AccessLogger, ConnectionStats
+from .logger import get_logger, AccessLogger, ConnectionStats, LogSampler
 from .auth import create_authenticator, Authenticator
+from .breaker import CircuitOpenError, create_circuit_breaker
+from .admin import create_admin_server
+from .upstream import create_upstream_groups
+from .cache import create_http_cache
+from .relay import Relay, create_relay_monitor
+from .acl import AccessDeniedError, create_access_control, parse_address
+from .hooks import Hook, HookRejected, create_hook_pipeline
+from .mux import (
+    FAIL_DENIED,
+    FAIL_GENERAL,
+    FAIL_REFUSED,
+    FAIL_TIMEOUT,
+    FAIL_UNREACHABLE,
+    HELLO_ACCEPTED,
+    HELLO_OVERLOADED,
+    HELLO_REJECTED,
+    PREFACE,
+    MuxError,
+    MuxSession,
+    MuxStream,
+    hello_reply,
+    read_hello,
+)
+from .registry import ConnectionRecord, ConnectionRegistry
+from .routing import DIRECT, REJECT, RouteRejectedError, create_router
+from .quota import create_quota_manager
+from .shedding import create_load_shedder
+from .timing import PhaseHistograms, PhaseTimer
+from .tls import create_tls_acceptor
+from .tuning import (
+    apply_socket_options,
+    build_tuning_profiles,
+    configure_listener,
+    create_buffer_pool,
+    max_buffer_size,
+    open_fastopen_connection,
+)
 
 logger = get_logger(__name__)
 
@@ -16,25 +55,135 @@ logger = get_logger(__name__)
 class SimpleHTTPProxy:
     """简单的HTTP/HTTPS/SOCKS5代理服务器"""
     
-    def __init__(self, config: Optional[ProxyConfig] = None):
+    def __init__(
+        self,
+        config: Optional[ProxyConfig] = None,
+        hooks: Optional[Iterable[Hook]] = None
+    ):
         """
         初始化代理服务器
         
         Args:
             config: 配置对象,如果为None则使用默认配置
+            hooks: 以代码方式注册的连接钩子,在配置的 hooks 之后调用
         """
         self.config = config or ProxyConfig()
         self.server = None
+        self.servers = []
+        self.tls_server = None
+        
+        # 代理监听: (地址, 端口, 启用的协议)
+        self.protocols = frozenset(self.config.protocols)
+        self.listeners = [
+            (listener.host or self.config.host, listener.port, frozenset(listener.protocols))
+            for listener in self.config.listeners
+        ] or [(self.config.host, self.config.port, self.protocols)]
         
         # 配置日志
         self._setup_logging()
         
+        # 热路径日志门控
+        self.log_sampler = LogSampler(
+            self.config.log_level,
+            self.config.log_sampling,
+            self.config.collapse_connection_logs
+        )
+        
         # 访问日志和统计
-        self.access_logger = AccessLogger(enabled=self.config.access_log)
+        self.access_logger = AccessLogger(enabled=self.config.access_log, sampler=self.log_sampler)
         self.stats = ConnectionStats()
+        self.phase_stats = PhaseHistograms()
+        self.registry = ConnectionRegistry()
         
         # 认证器
         self.authenticator = create_authenticator(self.config.auth)
+        
+        # 访问控制
+        self.acl = create_access_control(self.config.acl)
+        
+        # 上游代理组
+        self.upstream_groups = create_upstream_groups(self.config.upstream_groups)
+        
+        # 分流路由
+        self.router = create_router(
+            self.config.routing,
+            self.config.upstream or DIRECT,
+            list(self.upstream_groups)
+        )
+        
+        # 目标熔断
+        self.breaker = create_circuit_breaker(self.config.circuit_breaker)
+        
+        self.quota = create_quota_manager(self.config.quota, self.registry)
+        
+        # 连接钩子: 启动时编译为各阶段的调用表
+        self.hooks = create_hook_pipeline(self.config.hooks, hooks)
+        
+        # TLS监听
+        self.tls = create_tls_acceptor(self.config.tls)
+        
+        # HTTP缓存
+        self.http_cache = create_http_cache(self.config.cache, self.config.buffer_size)
+        
+        # 中继缓冲区池: 每个连接占用两个缓冲区,其余内存预算分给两侧写缓冲
+        self.buffer_pool = create_buffer_pool(self.config)
+        self.write_buffer_limit = self.config.write_buffer_limit or max(
+            self.config.min_buffer_size,
+            (self.config.max_connection_memory - 2 * max_buffer_size(self.config)) // 2
+        )
+        
+        # 全局写缓冲预算与慢消费者检测
+        self.relay_monitor = create_relay_monitor(
+            self.config.max_total_buffered,
+            self.config.stall_timeout
+        )
+        
+        # 按协议的socket调优参数
+        self.tuning = build_tuning_profiles(self.config, self.buffer_pool)
+        
+        # 管理接口
+        self.admin = create_admin_server(self, self.config.admin)
+        
+        # 负载削减: 启用管理接口的事件循环监控时共用其心跳
+        self.shedder = create_load_shedder(
+            self.config.load_shedding,
+            self.admin.loop_monitor if self.admin is not None else None
+        )
+    
+    def get_stats_dict(self) -> dict:
+        """获取代理服务器的完整统计信息"""
+        self.stats.collect(self.registry)
+        stats = self.stats.get_stats_dict()
+        stats["buffer_pool"] = self.buffer_pool.get_stats_dict()
+        if self.relay_monitor is not None:
+            stats["relay"] = self.relay_monitor.get_stats_dict()
+        stats["phases"] = self.phase_stats.get_stats_dict()
+        if self.quota is not None:
+            stats["quota"] = self.quota.get_stats_dict()
+        if self.hooks:
+            stats["hooks"] = self.hooks.get_stats_dict()
+        auth_stats = self.authenticator.get_stats_dict()
+        if auth_stats is not None:
+            stats["auth"] = auth_stats
+        if self.acl is not None:
+            stats["acl"] = self.acl.get_stats_dict()
+        if self.http_cache is not None:
+            stats["http_cache"] = self.http_cache.get_stats_dict()
+        if self.router is not None:
+            stats["routing"] = self.router.get_stats_dict()
+        if self.breaker is not None:
+            stats["circuit_breaker"] = self.breaker.get_stats_dict()
+        if self.shedder is not None:
+            stats["load_shedding"] = self.shedder.get_stats_dict()
+        if self.tls is not None:
+            stats["tls"] = self.tls.get_stats_dict()
+        if self.admin is not None and self.admin.loop_monitor is not None:
+            stats["event_loop"] = self.admin.loop_monitor.get_stats_dict()
+        if self.upstream_groups:
+            stats["upstream_groups"] = {
+                name: group.get_stats_dict() for name, group in self.upstream_groups.items()
+            }
+        return stats
     
     def _setup_logging(self) -> None:
         """配置日志系统"""
@@ -46,15 +195,44 @@ class SimpleHTTPProxy:
             json_format=False  # 可以根据配置决定
         )
         
+    async def handle_tls_client(
+        self,
+        client_reader: asyncio.StreamReader,
+        client_writer: asyncio.StreamWriter
+    ) -> None:
+        """处理TLS监听端口上的客户端连接: 完成TLS握手后按明文连接处理"""
+        timer = PhaseTimer()
+        if not await self.tls.handshake(client_writer):
+            client_writer.close()
+            return
+        timer.mark("tls_handshake")
+        
+        details = {"tls": True}
+        ssl_object = client_writer.get_extra_info('ssl_object')
+        if ssl_object is not None and ssl_object.session_reused:
+            details["tls_resumed"] = True
+        await self.handle_client(client_reader, client_writer, details, timer)
+    
     async def handle_client(
         self, 
         client_reader: asyncio.StreamReader, 
-        client_writer: asyncio.StreamWriter
+        client_writer: asyncio.StreamWriter,
+        details: Optional[dict] = None,
+        timer: Optional[PhaseTimer] = None,
+        protocols: Optional[FrozenSet[str]] = None
     ) -> None:
-        """处理客户端连接"""
+        """
+        处理客户端连接
+        
+        Args:
+            details: 已知的连接信息(如TLS握手结果),随访问日志一起记录
+            timer: 已开始的分阶段计时器(如TLS监听在握手前创建)
+            protocols: 所在监听器启用的协议,None表示使用 protocols 配置
+        """
         client_addr = client_writer.get_extra_info('peername')
         client_ip, client_port = client_addr if client_addr else ("unknown", 0)
-        start_time = time.time()
+        timer = timer if timer is not None else PhaseTimer()
+        protocols = protocols if protocols is not None else self.protocols
         
         protocol = "unknown"
         target_host = "unknown"
@@ -62,24 +240,80 @@ class SimpleHTTPProxy:
         bytes_sent = 0
         bytes_received = 0
         error_msg = None
+        # 连接过程信息,随访问日志一起记录
+        details = details if details is not None else {}
+        log_sampler = self.log_sampler
         
-        logger.info("new_connection", client=f"{client_ip}:{client_port}")
+        conn = self.registry.register(client_ip, client_port, client_writer)
+        # 是否已计入活跃连接: 确定协议之前就被拒绝的连接不计数
+        counted = False
+        
+        if log_sampler.enabled("new_connection"):
+            logger.info("new_connection", client=f"{client_ip}:{client_port}")
         
         try:
-            # 读取第一个字节来检测协议
-            first_byte = await client_reader.read(1)
-            if not first_byte:
+            # 客户端访问控制
+            if self.acl is not None and not self.acl.check_client(client_ip):
+                error_msg = "客户端被访问控制拒绝"
+                logger.warning("acl_client_denied", client=f"{client_ip}:{client_port}")
+                return
+            
+            hooks = self.hooks
+            if hooks.accept:
+                try:
+                    await hooks.run(hooks.accept, conn)
+                except HookRejected as e:
+                    error_msg = str(e) or "连接被钩子拒绝"
+                    logger.warning("hook_rejected", stage="accept", client=f"{client_ip}:{client_port}")
+                    return
+            
+            # 只启用SOCKS5的监听器不做协议探测,直接进入SOCKS5握手
+            if len(protocols) == 1 and "socks5" in protocols:
+                first_byte = None
+            else:
+                # 读取第一个字节来检测协议
+                first_byte = await client_reader.read(1)
+                if not first_byte:
+                    return
+                timer.mark("sniff")
+            
+            # 检测多路复用会话 (另一个easyproxy节点发送的会话前导)
+            if first_byte is not None and first_byte[0] == PREFACE[0] and "mux" in protocols:
+                if self.shedder is not None and not self.shedder.admit():
+                    error_msg = "负载过高,拒绝新连接"
+                    await self._reject_mux_session(client_reader, client_writer)
+                    return
+                protocol = conn.protocol = "mux"
+                self.stats.increment_connection(protocol)
+                counted = True
+                apply_socket_options(client_writer, self.tuning[protocol].client_options)
+                if log_sampler.enabled("protocol_detected"):
+                    logger.info("protocol_detected", protocol=protocol, client=f"{client_ip}:{client_port}")
+                
+                error_msg = await self._handle_mux(
+                    client_reader, client_writer, client_ip, client_port, details, timer, conn
+                )
                 return
             
             # 检测SOCKS5协议 (第一个字节是0x05)
-            if first_byte[0] == 0x05:
-                protocol = "socks5"
+            if first_byte is None or first_byte[0] == 0x05:
+                if "socks5" not in protocols:
+                    error_msg = "协议未启用: socks5"
+                    return
+                if self.shedder is not None and not self.shedder.admit():
+                    error_msg = "负载过高,拒绝新连接"
+                    await self._reject_socks5_greeting(first_byte, client_reader, client_writer)
+                    return
+                protocol = conn.protocol = "socks5"
                 self.stats.increment_connection(protocol)
-                logger.info("protocol_detected", protocol=protocol, client=f"{client_ip}:{client_port}")
+                counted = True
+                apply_socket_options(client_writer, self.tuning[protocol].client_options)
+                if log_sampler.enabled("protocol_detected"):
+                    logger.info("protocol_detected", protocol=protocol, client=f"{client_ip}:{client_port}")
                 
                 result = await self._handle_socks5(
                     first_byte, client_reader, client_writer,
-                    client_ip, client_port
+                    client_ip, client_port, details, timer, conn
                 )
                 if result:
                     target_host, target_port, bytes_sent, bytes_received = result
@@ -89,7 +323,8 @@ class SimpleHTTPProxy:
             # 读取完整的请求行
             rest_of_line = await client_reader.readline()
             request_line = (first_byte + rest_of_line).decode('utf-8', errors='ignore')
-            logger.debug("http_request_line", request=request_line.strip())
+            if log_sampler.enabled("http_request_line", logging.DEBUG):
+                logger.debug("http_request_line", request=request_line.strip())
             
             # 解析请求
             parts = request_line.split()
@@ -112,6 +347,13 @@ class SimpleHTTPProxy:
                 header_str = line.decode('utf-8', errors='ignore')
                 if header_str.lower().startswith('proxy-authorization:'):
                     auth_header = header_str.split(':', 1)[1].strip()
+            timer.mark("headers")
+            
+            if self.shedder is not None and not self.shedder.admit():
+                error_msg = "负载过高,拒绝新连接"
+                client_writer.write(self._http_503_response(self.config.load_shedding.retry_after))
+                await client_writer.drain()
+                return
             
             # HTTP/HTTPS认证检查
             if self.authenticator.is_enabled():
@@ -123,46 +365,125 @@ class SimpleHTTPProxy:
                     client_writer.write(response)
                     await client_writer.drain()
                     return
-                logger.info("http_auth_success", username=username, client=f"{client_ip}:{client_port}")
+                details["username"] = conn.user = username
+                timer.mark("auth")
+                if log_sampler.enabled("http_auth_success"):
+                    logger.info("http_auth_success", username=username, client=f"{client_ip}:{client_port}")
+                if self.quota is not None and not self.quota.admit(username):
+                    error_msg = "流量配额已用尽"
+                    client_writer.write(self._http_quota_exceeded_response())
+                    await client_writer.drain()
+                    return
+                if hooks.authenticated:
+                    try:
+                        await hooks.run(hooks.authenticated, conn)
+                    except HookRejected as e:
+                        error_msg = str(e) or "连接被钩子拒绝"
+                        logger.warning("hook_rejected", stage="authenticated", username=username)
+                        client_writer.write(self._http_403_response())
+                        await client_writer.drain()
+                        return
             
             # 检查是否是CONNECT方法(HTTPS隧道)
             if method.upper() == "CONNECT":
-                protocol = "https"
+                if "https" not in protocols:
+                    error_msg = "协议未启用: https"
+                    client_writer.write(self._http_405_response())
+                    await client_writer.drain()
+                    return
+                protocol = conn.protocol = "https"
                 self.stats.increment_connection(protocol)
+                counted = True
+                apply_socket_options(client_writer, self.tuning[protocol].client_options)
                 
                 result = await self._handle_connect(
                     url, client_reader, client_writer,
-                    client_ip, client_port
+                    client_ip, client_port, details, timer, conn
                 )
                 if result:
                     target_host, target_port, bytes_sent, bytes_received = result
                 return
             
             # 处理普通HTTP请求
-            protocol = "http"
+            if "http" not in protocols:
+                error_msg = "协议未启用: http"
+                client_writer.write(self._http_405_response())
+                await client_writer.drain()
+                return
+            protocol = conn.protocol = "http"
             self.stats.increment_connection(protocol)
+            counted = True
+            apply_socket_options(client_writer, self.tuning[protocol].client_options)
             
             # 解析目标地址
             target_host, target_port = self._parse_target(url)
+            conn.target_host, conn.target_port = target_host, target_port
             if not target_host:
                 error_msg = f"无法解析目标地址: {url}"
                 logger.error("parse_target_failed", url=url)
                 return
             
-            logger.info("connecting_to_target", target=f"{target_host}:{target_port}")
+            # 目标访问控制
+            if self.acl is not None and not self.acl.check_target(target_host, target_port):
+                error_msg = "目标被访问控制拒绝"
+                logger.warning("acl_target_denied", target=f"{target_host}:{target_port}")
+                client_writer.write(self._http_403_response())
+                await client_writer.drain()
+                return
+            
+            # 可缓存的GET请求交给HTTP缓存处理
+            if self.http_cache is not None and method.upper() == "GET":
+                try:
+                    result = await self.http_cache.handle_request(
+                        url, version, headers, client_writer,
+                        lambda: self._open_target(target_host, target_port, protocol, timer, conn)
+                    )
+                except asyncio.TimeoutError:
+                    logger.error(f"连接超时: {target_host}:{target_port}")
+                    return
+                except CircuitOpenError as e:
+                    error_msg = str(e)
+                    client_writer.write(self._http_502_response())
+                    await client_writer.drain()
+                    return
+                except AccessDeniedError:
+                    error_msg = "目标被访问控制拒绝"
+                    client_writer.write(self._http_403_response())
+                    await client_writer.drain()
+                    return
+                except OSError as e:
+                    logger.error(f"连接失败: {target_host}:{target_port} - {e}")
+                    return
+                if result is not None:
+                    bytes_sent, bytes_received = result
+                    timer.mark("cache")
+                    return
+            
+            if log_sampler.enabled("connecting_to_target"):
+                logger.info("connecting_to_target", target=f"{target_host}:{target_port}")
             
             # 连接到目标服务器
             try:
-                target_reader, target_writer = await asyncio.wait_for(
-                    asyncio.open_connection(target_host, target_port),
-                    timeout=self.config.connection_timeout
+                target_reader, target_writer = await self._open_target(
+                    target_host, target_port, protocol, timer, conn
                 )
             except asyncio.TimeoutError:
                 logger.error(f"连接超时: {target_host}:{target_port}")
                 return
+            except CircuitOpenError as e:
+                error_msg = str(e)
+                client_writer.write(self._http_502_response())
+                await client_writer.drain()
+                return
+            except AccessDeniedError:
+                error_msg = "目标被访问控制拒绝"
+                client_writer.write(self._http_403_response())
+                await client_writer.drain()
+                return
             except Exception as e:
                 logger.error(f"连接失败: {target_host}:{target_port} - {e}")
                 return
+            target_host, target_port = conn.target_host, conn.target_port
             
             # 构建并发送请求到目标服务器
             # 对于HTTP代理,需要修改请求行为相对路径
@@ -185,21 +506,32 @@ class SimpleHTTPProxy:
             await target_writer.drain()
             
             # 双向转发数据
-            await self._forward_data(client_reader, client_writer, 
-                                    target_reader, target_writer)
+            bytes_sent, bytes_received = await self._forward_data(
+                client_reader, client_writer,
+                target_reader, target_writer,
+                protocol, timer, conn
+            )
             
         except Exception as e:
             error_msg = str(e)
             self.stats.increment_error()
             logger.error("connection_error", error=error_msg, exc_info=True)
         finally:
-            # 计算连接时长
-            duration_ms = (time.time() - start_time) * 1000
+            # 计算连接时长(单调时钟)
+            duration_ms = timer.elapsed() * 1000
+            self.phase_stats.observe(timer, duration_ms)
             
             # 更新统计
-            self.stats.decrement_connection()
-            if bytes_sent > 0 or bytes_received > 0:
-                self.stats.add_traffic(bytes_sent, bytes_received)
+            if counted:
+                self.stats.decrement_connection()
+            if conn.killed and not error_msg:
+                error_msg = conn.killed
+            if self.hooks.closed:
+                await self.hooks.run_closed(conn, bytes_sent, bytes_received, error_msg)
+            self.registry.unregister(conn)
+            self.stats.finish(conn, bytes_sent, bytes_received)
+            if self.quota is not None:
+                self.quota.finish(conn, bytes_sent, bytes_received)
             
             # 记录访问日志
             self.access_logger.log_request(
@@ -212,7 +544,9 @@ class SimpleHTTPProxy:
                 bytes_sent=bytes_sent,
                 bytes_received=bytes_received,
                 duration_ms=duration_ms,
-                error=error_msg
+                error=error_msg,
+                phases=timer.as_dict(),
+                **details
             )
             
             # 关闭连接
@@ -222,9 +556,10 @@ class SimpleHTTPProxy:
             except:
                 pass
             
-            logger.debug("connection_closed", 
-                        client=f"{client_ip}:{client_port}",
-                        duration_ms=round(duration_ms, 2))
+            if log_sampler.enabled("connection_closed", logging.DEBUG):
+                logger.debug("connection_closed", 
+                            client=f"{client_ip}:{client_port}",
+                            duration_ms=round(duration_ms, 2))
     
     async def _handle_connect(
         self,
@@ -232,11 +567,19 @@ class SimpleHTTPProxy:
         client_reader: asyncio.StreamReader,
         client_writer: asyncio.StreamWriter,
         client_ip: str,
-        client_port: int
+        client_port: int,
+        details: dict,
+        timer: PhaseTimer,
+        conn: ConnectionRecord
     ) -> Optional[Tuple[str, int, int, int]]:
         """
         处理HTTPS CONNECT隧道
         
+        Args:
+            details: 连接过程信息,随访问日志一起记录
+            timer: 连接的分阶段计时器
+            conn: 活跃连接登记信息
+        
         Returns:
             Optional[Tuple[str, int, int, int]]: (target_host, target_port, bytes_sent, bytes_received) 或 None
         """
@@ -249,35 +592,56 @@ class SimpleHTTPProxy:
                 host = target
                 port = 443
             
-            logger.info("connect_tunnel", target=f"{host}:{port}", client=f"{client_ip}:{client_port}")
+            conn.target_host, conn.target_port = host, port
+            
+            if self.log_sampler.enabled("connect_tunnel"):
+                logger.info("connect_tunnel", target=f"{host}:{port}", client=f"{client_ip}:{client_port}")
+            
+            # 目标访问控制
+            if self.acl is not None and not self.acl.check_target(host, port):
+                logger.warning("acl_target_denied", target=f"{host}:{port}")
+                client_writer.write(b"HTTP/1.1 403 Forbidden\r\n\r\n")
+                await client_writer.drain()
+                return
             
             # 连接到目标服务器
             try:
-                target_reader, target_writer = await asyncio.wait_for(
-                    asyncio.open_connection(host, port),
-                    timeout=self.config.connection_timeout
-                )
+                target_reader, target_writer = await self._open_target(host, port, "https", timer, conn)
             except asyncio.TimeoutError:
                 logger.error(f"CONNECT连接超时: {host}:{port}")
                 client_writer.write(b"HTTP/1.1 504 Gateway Timeout\r\n\r\n")
                 await client_writer.drain()
                 return
+            except CircuitOpenError as e:
+                if self.log_sampler.enabled("circuit_open_rejected", logging.DEBUG):
+                    logger.debug("circuit_open_rejected", error=str(e))
+                client_writer.write(b"HTTP/1.1 502 Bad Gateway\r\n\r\n")
+                await client_writer.drain()
+                return
+            except AccessDeniedError:
+                logger.warning("acl_target_denied", target=f"{host}:{port}")
+                client_writer.write(b"HTTP/1.1 403 Forbidden\r\n\r\n")
+                await client_writer.drain()
+                return
             except Exception as e:
                 logger.error(f"CONNECT连接失败: {host}:{port} - {e}")
                 client_writer.write(b"HTTP/1.1 502 Bad Gateway\r\n\r\n")
                 await client_writer.drain()
                 return
+            host, port = conn.target_host, conn.target_port
             
             # 返回连接成功响应
             client_writer.write(b"HTTP/1.1 200 Connection Established\r\n\r\n")
             await client_writer.drain()
             
-            logger.info("connect_tunnel_established", target=f"{host}:{port}")
+            if self.log_sampler.enabled("connect_tunnel_established"):
+                logger.info("connect_tunnel_established", target=f"{host}:{port}")
             
             # 进入透明转发模式(不解密TLS)
-            bytes_sent, bytes_received = await self._forward_data_with_stats(
+            bytes_sent, bytes_received = await self._forward_data(
                 client_reader, client_writer,
-                target_reader, target_writer
+                target_reader, target_writer,
+                "https", timer, conn
             )
             
             return (host, port, bytes_sent, bytes_received)
@@ -286,6 +650,399 @@ class SimpleHTTPProxy:
             logger.error("connect_error", error=str(e), exc_info=True)
             return None
     
+    async def _handle_mux(
+        self,
+        client_reader: asyncio.StreamReader,
+        client_writer: asyncio.StreamWriter,
+        client_ip: str,
+        client_port: int,
+        details: dict,
+        timer: PhaseTimer,
+        conn: ConnectionRecord
+    ) -> Optional[str]:
+        """
+        处理来自另一个easyproxy节点的多路复用会话
+        
+        会话本身计为一个 mux 连接;会话中的每个流单独登记、检查目标访问控制和配额,
+        并各自记录访问日志。
+        
+        Args:
+            details: 连接过程信息,随访问日志一起记录
+            timer: 连接的分阶段计时器
+            conn: 会话的活跃连接登记信息
+        
+        Returns:
+            Optional[str]: 会话失败的原因
+        """
+        try:
+            async with asyncio.timeout(self.config.connection_timeout):
+                window, username, password = await read_hello(client_reader)
+        except (MuxError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+            return f"多路复用握手失败: {e or type(e).__name__}"
+        timer.mark("headers")
+        
+        if self.authenticator.is_enabled():
+            if not self.authenticator.authenticate_socks5(username, password):
+                logger.warning("mux_auth_failed", username=username, client=f"{client_ip}:{client_port}")
+                client_writer.write(hello_reply(HELLO_REJECTED))
+                await client_writer.drain()
+                return "认证失败"
+            details["username"] = conn.user = username
+            timer.mark("auth")
+            if self.hooks.authenticated:
+                try:
+                    await self.hooks.run(self.hooks.authenticated, conn)
+                except HookRejected as e:
+                    logger.warning("hook_rejected", stage="authenticated", username=username)
+                    client_writer.write(hello_reply(HELLO_REJECTED))
+                    await client_writer.drain()
+                    return str(e) or "连接被钩子拒绝"
+        
+        client_writer.write(hello_reply(HELLO_ACCEPTED))
+        await client_writer.drain()
+        
+        session = MuxSession.attach(
+            client_reader, client_writer, window,
+            on_open=functools.partial(self._open_mux_stream, conn)
+        )
+        if self.log_sampler.enabled("mux_session_opened"):
+            logger.info("mux_session_opened", client=f"{client_ip}:{client_port}", window=window)
+        try:
+            await session.wait_closed()
+        except asyncio.CancelledError:
+            for task in list(session.tasks):
+                task.cancel()
+            raise
+        details["mux_streams"] = session.streams_opened
+        return None
+    
+    def _open_mux_stream(
+        self,
+        session_conn: ConnectionRecord,
+        stream: MuxStream,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        host: str,
+        port: int
+    ) -> None:
+        """为会话中新打开的流启动处理任务"""
+        task = asyncio.get_running_loop().create_task(
+            self._handle_mux_stream(session_conn, stream, reader, writer, host, port)
+        )
+        tasks = stream.session.tasks
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    
+    async def _handle_mux_stream(
+        self,
+        session_conn: ConnectionRecord,
+        stream: MuxStream,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        host: str,
+        port: int
+    ) -> None:
+        """
+        处理多路复用会话中的一个流: 连接目标后双向转发
+        
+        连接数计在所属会话上,流量按 mux 协议计入统计。
+        
+        Args:
+            session_conn: 所属会话的活跃连接登记信息
+            stream: 会话中的流
+            reader: 流的读取对象
+            writer: 流的写入对象
+            host: 目标主机
+            port: 目标端口
+        """
+        session = stream.session
+        client_ip, client_port = session_conn.client_ip, session_conn.client_port
+        timer = PhaseTimer()
+        target_host, target_port = host, port
+        bytes_sent = 0
+        bytes_received = 0
+        error_msg = None
+        details = {"mux_stream": stream.id}
+        
+        conn = self.registry.register(client_ip, client_port, writer)
+        conn.protocol = "mux"
+        conn.target_host, conn.target_port = host, port
+        if session_conn.user is not None:
+            details["username"] = conn.user = session_conn.user
+        
+        try:
+            # 目标访问控制
+            if self.acl is not None and not self.acl.check_target(host, port):
+                error_msg = "目标被访问控制拒绝"
+                logger.warning("acl_target_denied", target=f"{host}:{port}")
+                session.reject(stream, FAIL_DENIED, error_msg)
+                return
+            
+            if self.quota is not None and not self.quota.admit(conn.user):
+                error_msg = "流量配额已用尽"
+                if self.log_sampler.enabled("quota_rejected"):
+                    logger.warning("quota_rejected", username=conn.user, client=f"{client_ip}:{client_port}")
+                session.reject(stream, FAIL_DENIED, error_msg)
+                return
+            
+            try:
+                target_reader, target_writer = await self._open_target(host, port, "mux", timer, conn)
+            except Exception as e:
+                error_msg = str(e) or type(e).__name__
+                if self.log_sampler.enabled("mux_open_failed"):
+                    logger.warning("mux_open_failed", target=f"{host}:{port}", error=error_msg)
+                session.reject(stream, self._mux_fail_code(e), error_msg)
+                return
+            target_host, target_port = conn.target_host, conn.target_port
+            session.accept(stream)
+            
+            bytes_sent, bytes_received = await self._forward_data(
+                reader, writer,
+                target_reader, target_writer,
+                "mux", timer, conn
+            )
+            
+        except Exception as e:
+            error_msg = str(e)
+            self.stats.increment_error()
+            logger.error("connection_error", error=error_msg, exc_info=True)
+        finally:
+            duration_ms = timer.elapsed() * 1000
+            self.phase_stats.observe(timer, duration_ms)
+            
+            if conn.killed and not error_msg:
+                error_msg = conn.killed
+            if self.hooks.closed:
+                await self.hooks.run_closed(conn, bytes_sent, bytes_received, error_msg)
+            self.registry.unregister(conn)
+            self.stats.finish(conn, bytes_sent, bytes_received)
+            if self.quota is not None:
+                self.quota.finish(conn, bytes_sent, bytes_received)
+            
+            self.access_logger.log_request(
+                client_ip=client_ip,
+                client_port=client_port,
+                protocol="mux",
+                target_host=target_host,
+                target_port=target_port,
+                status="error" if error_msg else "success",
+                bytes_sent=bytes_sent,
+                bytes_received=bytes_received,
+                duration_ms=duration_ms,
+                error=error_msg,
+                phases=timer.as_dict(),
+                **details
+            )
+            writer.close()
+    
+    @staticmethod
+    def _mux_fail_code(error: Exception) -> int:
+        """打开目标失败的原因对应的 OPEN_FAIL 代码"""
+        if isinstance(error, asyncio.TimeoutError):
+            return FAIL_TIMEOUT
+        if isinstance(error, AccessDeniedError):
+            return FAIL_DENIED
+        if isinstance(error, ConnectionRefusedError):
+            return FAIL_REFUSED
+        if isinstance(error, OSError):
+            return FAIL_UNREACHABLE
+        return FAIL_GENERAL
+    
+    async def _open_target(
+        self,
+        host: str,
+        port: int,
+        protocol: str,
+        timer: Optional[PhaseTimer] = None,
+        conn: Optional[ConnectionRecord] = None
+    ) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        """
+        建立到目标的出站连接(直连或经上游代理组)
+        
+        Args:
+            host: 目标主机
+            port: 目标端口
+            protocol: 客户端协议,用于选择socket调优参数
+            timer: 连接的分阶段计时器,记录 dns 和 connect 阶段
+            conn: 活跃连接登记信息,提供时调用 before_connect / connected 钩子,
+                钩子改写的目标记录在 conn.target_host / target_port
+        
+        Returns:
+            Tuple[StreamReader, StreamWriter]: 目标连接
+        
+        Raises:
+            RouteRejectedError: 路由规则拒绝该目标
+            AccessDeniedError: 解析后的地址被访问控制拒绝,或被钩子拒绝(HookRejected)
+            CircuitOpenError: 目标处于熔断状态
+            asyncio.TimeoutError: 超过 connection_timeout 仍未建立连接
+        """
+        hooks = self.hooks
+        if conn is not None and hooks.before_connect:
+            conn.target_host, conn.target_port = host, port
+            await hooks.run(hooks.before_connect, conn)
+            host, port = conn.target_host, conn.target_port
+        
+        if self.router is not None:
+            decision = self.router.route(host, port)
+        else:
+            decision = self.config.upstream or DIRECT
+        
+        if decision == REJECT:
+            raise RouteRejectedError(f"目标被路由规则拒绝: {host}:{port}")
+        
+        # 熔断中的目标直接失败,不再占用连接超时
+        breaker = self.breaker
+        if breaker is not None:
+            breaker.check(host, port)
+        
+        # 熔断半开时 check() 占用了探测名额: 成功或计入失败之外的退出(访问控制拒绝、取消等)都要归还
+        settled = False
+        try:
+            if decision != DIRECT:
+                # 代理组自行计时,以区分连接超时和客户端断开导致的取消
+                reader, writer = await self.upstream_groups[decision].open_connection(
+                    host, port, self.config.connection_timeout
+                )
+            else:
+                async with asyncio.timeout(self.config.connection_timeout):
+                    reader, writer = await self._connect_direct(host, port, timer)
+            settled = True
+        except AccessDeniedError:
+            raise
+        except OSError:
+            # 超时、拒绝连接、DNS解析失败等都计入熔断
+            if breaker is not None:
+                breaker.record_failure(host, port)
+            settled = True
+            raise
+        finally:
+            if breaker is not None and not settled:
+                breaker.release(host, port)
+        if breaker is not None:
+            breaker.record_success(host, port)
+        
+        if timer is not None:
+            timer.mark("connect")
+        apply_socket_options(writer, self.tuning[protocol].target_options)
+        
+        if conn is not None and hooks.connected:
+            try:
+                await hooks.run(hooks.connected, conn, writer)
+            except BaseException:
+                writer.close()
+                raise
+        return reader, writer
+    
+    async def _connect_direct(
+        self,
+        host: str,
+        port: int,
+        timer: Optional[PhaseTimer]
+    ) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        """
+        直连目标: 先解析域名再依次尝试各个地址,使DNS耗时可以单独统计
+        
+        连接前检查实际地址,防止域名指向内网地址绕过访问控制
+        (TCP Fast Open 连接在发出SYN前无法获取对端地址,不能在连接后检查)。
+        
+        Returns:
+            Tuple[StreamReader, StreamWriter]: 目标连接
+        
+        Raises:
+            AccessDeniedError: 解析后的地址被访问控制拒绝
+        """
+        dial = open_fastopen_connection if self.config.tcp_fastopen_connect else asyncio.open_connection
+        
+        if parse_address(host) is not None:
+            self._check_resolved(host)
+            return await dial(host, port)
+        
+        infos = await asyncio.get_running_loop().getaddrinfo(
+            host, port, type=socket.SOCK_STREAM
+        )
+        if timer is not None:
+            timer.mark("dns")
+        
+        last_error: Optional[OSError] = None
+        for _, _, _, _, sockaddr in infos:
+            self._check_resolved(sockaddr[0])
+            try:
+                return await dial(sockaddr[0], sockaddr[1])
+            except OSError as e:
+                last_error = e
+        raise last_error or OSError(f"无法解析目标地址: {host}")
+    
+    def _check_resolved(self, address: str) -> None:
+        """检查即将连接的实际地址"""
+        if self.acl is not None and not self.acl.check_resolved(address):
+            raise AccessDeniedError(f"目标地址被访问控制拒绝: {address}")
+    
+    @staticmethod
+    def _http_403_response() -> bytes:
+        """生成HTTP 403响应"""
+        body = "Forbidden by proxy access control\r\n"
+        return (
+            "HTTP/1.1 403 Forbidden\r\n"
+            "Content-Type: text/plain\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n"
+            "\r\n"
+            f"{body}"
+        ).encode('utf-8')
+    
+    @staticmethod
+    def _http_quota_exceeded_response() -> bytes:
+        """生成HTTP 403响应(用户流量配额已用尽)"""
+        body = "Traffic quota exceeded\r\n"
+        return (
+            "HTTP/1.1 403 Forbidden\r\n"
+            "Content-Type: text/plain\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n"
+            "\r\n"
+            f"{body}"
+        ).encode('utf-8')
+    
+    @staticmethod
+    def _http_405_response() -> bytes:
+        """生成HTTP 405响应(协议未在该监听器启用)"""
+        body = "Protocol not enabled on this listener\r\n"
+        return (
+            "HTTP/1.1 405 Method Not Allowed\r\n"
+            "Content-Type: text/plain\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n"
+            "\r\n"
+            f"{body}"
+        ).encode('utf-8')
+    
+    @staticmethod
+    def _http_503_response(retry_after: int) -> bytes:
+        """生成HTTP 503响应(负载过高)"""
+        body = "Proxy overloaded, retry later\r\n"
+        return (
+            "HTTP/1.1 503 Service Unavailable\r\n"
+            "Content-Type: text/plain\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Retry-After: {retry_after}\r\n"
+            "Connection: close\r\n"
+            "\r\n"
+            f"{body}"
+        ).encode('utf-8')
+    
+    @staticmethod
+    def _http_502_response() -> bytes:
+        """生成HTTP 502响应"""
+        body = "Bad Gateway\r\n"
+        return (
+            "HTTP/1.1 502 Bad Gateway\r\n"
+            "Content-Type: text/plain\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n"
+            "\r\n"
+            f"{body}"
+        ).encode('utf-8')
+    
     def _parse_target(self, url: str) -> Tuple[str, int]:
         """解析目标地址和端口"""
         try:
@@ -307,107 +1064,110 @@ class SimpleHTTPProxy:
         client_reader: asyncio.StreamReader,
         client_writer: asyncio.StreamWriter,
         target_reader: asyncio.StreamReader,
-        target_writer: asyncio.StreamWriter
-    ) -> None:
-        """双向转发数据(无统计)"""
-        async def forward(reader, writer, direction):
-            try:
-                while True:
-                    data = await reader.read(self.config.buffer_size)
-                    if not data:
-                        break
-                    writer.write(data)
-                    await writer.drain()
-            except Exception as e:
-                logger.debug("forward_error", direction=direction, error=str(e))
-            finally:
-                try:
-                    writer.close()
-                    await writer.wait_closed()
-                except:
-                    pass
-        
-        # 并发执行双向转发
-        await asyncio.gather(
-            forward(target_reader, client_writer, "target->client"),
-            forward(client_reader, target_writer, "client->target"),
-            return_exceptions=True
-        )
-    
-    async def _forward_data_with_stats(
-        self,
-        client_reader: asyncio.StreamReader,
-        client_writer: asyncio.StreamWriter,
-        target_reader: asyncio.StreamReader,
-        target_writer: asyncio.StreamWriter
+        target_writer: asyncio.StreamWriter,
+        protocol: str,
+        timer: Optional[PhaseTimer] = None,
+        conn: Optional[ConnectionRecord] = None
     ) -> Tuple[int, int]:
         """
         双向转发数据并统计流量
         
+        Args:
+            timer: 连接的分阶段计时器,记录 first_byte 和 transfer 阶段
+            conn: 活跃连接登记信息,关联中继以便实时读取流量
+        
         Returns:
             Tuple[int, int]: (bytes_sent, bytes_received)
         """
-        bytes_to_client = 0
-        bytes_to_target = 0
-        
-        async def forward(reader, writer, direction):
-            nonlocal bytes_to_client, bytes_to_target
-            try:
-                while True:
-                    data = await reader.read(self.config.buffer_size)
-                    if not data:
-                        break
-                    writer.write(data)
-                    await writer.drain()
-                    
-                    # 统计流量
-                    if direction == "target->client":
-                        bytes_to_client += len(data)
-                    else:
-                        bytes_to_target += len(data)
-            except Exception as e:
-                logger.debug("forward_error", direction=direction, error=str(e))
-            finally:
-                try:
-                    writer.close()
-                    await writer.wait_closed()
-                except:
-                    pass
-        
-        # 并发执行双向转发
-        await asyncio.gather(
-            forward(target_reader, client_writer, "target->client"),
-            forward(client_reader, target_writer, "client->target"),
-            return_exceptions=True
+        profile = self.tuning[protocol]
+        relay = Relay(
+            self.buffer_pool,
+            self.write_buffer_limit,
+            tier=profile.buffer_tier,
+            adaptive=profile.adaptive,
+            monitor=self.relay_monitor
         )
-        
-        return (bytes_to_target, bytes_to_client)
+        if conn is not None:
+            conn.relay = relay
+        result = await relay.run(client_reader, client_writer, target_reader, target_writer)
+        if timer is not None:
+            if relay.target is not None and relay.target.first_data_at is not None:
+                timer.mark_at("first_byte", relay.target.first_data_at)
+            timer.mark("transfer")
+        return result
+    
+    async def _reject_mux_session(
+        self,
+        client_reader: asyncio.StreamReader,
+        client_writer: asyncio.StreamWriter
+    ) -> None:
+        """读取会话握手后回复节点过载,对端据此换用其他节点,不计为节点故障"""
+        try:
+            async with asyncio.timeout(self.config.connection_timeout):
+                await read_hello(client_reader)
+        except (MuxError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            return
+        client_writer.write(hello_reply(HELLO_OVERLOADED))
+        await client_writer.drain()
+    
+    @staticmethod
+    async def _reject_socks5_greeting(
+        first_byte: Optional[bytes],
+        client_reader: asyncio.StreamReader,
+        client_writer: asyncio.StreamWriter
+    ) -> None:
+        """读取SOCKS5握手请求后回复无可接受的认证方法,客户端据此放弃本次连接"""
+        header = await client_reader.read(1 if first_byte is not None else 2)
+        if header:
+            await client_reader.read(header[-1])
+        client_writer.write(b'\x05\xFF')
+        await client_writer.drain()
     
     async def _handle_socks5(
         self,
-        first_byte: bytes,
+        first_byte: Optional[bytes],
         client_reader: asyncio.StreamReader,
         client_writer: asyncio.StreamWriter,
         client_ip: str,
-        client_port: int
+        client_port: int,
+        details: dict,
+        timer: PhaseTimer,
+        conn: ConnectionRecord
     ) -> Optional[Tuple[str, int, int, int]]:
         """
         处理SOCKS5协议
         
+        Args:
+            first_byte: 协议探测时已读取的版本字节,专用SOCKS5监听未探测时为None
+            details: 连接过程信息,随访问日志一起记录
+            timer: 连接的分阶段计时器
+            conn: 活跃连接登记信息
+        
         Returns:
             Optional[Tuple[str, int, int, int]]: (target_host, target_port, bytes_sent, bytes_received) 或 None
         """
         try:
             # SOCKS5握手阶段
             # 格式: [VER(0x05), NMETHODS, METHODS...]
-            nmethods = await client_reader.read(1)
+            if first_byte is None:
+                header = await client_reader.read(2)
+                if len(header) < 2:
+                    return
+                if header[0] != 0x05:
+                    logger.warning("socks5_invalid_version", version=header[0], client=f"{client_ip}:{client_port}")
+                    return
+                nmethods = header[1:]
+            else:
+                nmethods = await client_reader.read(1)
             if not nmethods:
                 return
             
             nmethods = nmethods[0]
             methods = await client_reader.read(nmethods)
+            timer.mark("headers")
             
-            logger.debug("socks5_handshake", methods_count=nmethods, client=f"{client_ip}:{client_port}")
+            if self.log_sampler.enabled("socks5_handshake", logging.DEBUG):
+                logger.debug("socks5_handshake", methods_count=nmethods, client=f"{client_ip}:{client_port}")
             
             # 检查是否需要认证
             # SOCKS5认证方法: 0x00=无认证, 0x02=用户名/密码认证
@@ -457,7 +1217,18 @@ class SimpleHTTPProxy:
                     return
                 
                 # 返回认证成功
-                logger.info("socks5_auth_success", username=username, client=f"{client_ip}:{client_port}")
+                details["username"] = conn.user = username
+                timer.mark("auth")
+                if self.log_sampler.enabled("socks5_auth_success"):
+                    logger.info("socks5_auth_success", username=username, client=f"{client_ip}:{client_port}")
+                if self.hooks.authenticated:
+                    try:
+                        await self.hooks.run(self.hooks.authenticated, conn)
+                    except HookRejected:
+                        logger.warning("hook_rejected", stage="authenticated", username=username)
+                        client_writer.write(b'\x01\x01')
+                        await client_writer.drain()
+                        return
                 client_writer.write(b'\x01\x00')  # VER=1, STATUS=0(成功)
                 await client_writer.drain()
             else:
@@ -489,6 +1260,7 @@ class SimpleHTTPProxy:
             target_host, target_port = await self._parse_socks5_address(
                 atyp, client_reader
             )
+            timer.mark("headers")
             
             if not target_host:
                 logger.error("无法解析SOCKS5目标地址")
@@ -497,13 +1269,30 @@ class SimpleHTTPProxy:
                 await client_writer.drain()
                 return
             
-            logger.info("socks5_connecting", target=f"{target_host}:{target_port}", client=f"{client_ip}:{client_port}")
+            # 目标访问控制
+            if self.acl is not None and not self.acl.check_target(target_host, target_port):
+                logger.warning("acl_target_denied", target=f"{target_host}:{target_port}")
+                # 返回规则不允许连接错误
+                client_writer.write(b'\x05\x02\x00\x01\x00\x00\x00\x00\x00\x00')
+                await client_writer.drain()
+                return
+            
+            if self.quota is not None and not self.quota.admit(conn.user):
+                if self.log_sampler.enabled("quota_rejected"):
+                    logger.warning("quota_rejected", username=conn.user, client=f"{client_ip}:{client_port}")
+                client_writer.write(b'\x05\x02\x00\x01\x00\x00\x00\x00\x00\x00')
+                await client_writer.drain()
+                return
+            
+            conn.target_host, conn.target_port = target_host, target_port
+            
+            if self.log_sampler.enabled("socks5_connecting"):
+                logger.info("socks5_connecting", target=f"{target_host}:{target_port}", client=f"{client_ip}:{client_port}")
             
             # 连接到目标服务器
             try:
-                target_reader, target_writer = await asyncio.wait_for(
-                    asyncio.open_connection(target_host, target_port),
-                    timeout=self.config.connection_timeout
+                target_reader, target_writer = await self._open_target(
+                    target_host, target_port, "socks5", timer, conn
                 )
             except asyncio.TimeoutError:
                 logger.error(f"SOCKS5连接超时: {target_host}:{target_port}")
@@ -511,12 +1300,25 @@ class SimpleHTTPProxy:
                 client_writer.write(b'\x05\x06\x00\x01\x00\x00\x00\x00\x00\x00')
                 await client_writer.drain()
                 return
+            except CircuitOpenError as e:
+                if self.log_sampler.enabled("circuit_open_rejected", logging.DEBUG):
+                    logger.debug("circuit_open_rejected", error=str(e))
+                # 返回连接被拒绝错误
+                client_writer.write(b'\x05\x05\x00\x01\x00\x00\x00\x00\x00\x00')
+                await client_writer.drain()
+                return
+            except AccessDeniedError:
+                logger.warning("acl_target_denied", target=f"{target_host}:{target_port}")
+                client_writer.write(b'\x05\x02\x00\x01\x00\x00\x00\x00\x00\x00')
+                await client_writer.drain()
+                return
             except Exception as e:
                 logger.error(f"SOCKS5连接失败: {target_host}:{target_port} - {e}")
                 # 返回连接被拒绝错误
                 client_writer.write(b'\x05\x05\x00\x01\x00\x00\x00\x00\x00\x00')
                 await client_writer.drain()
                 return
+            target_host, target_port = conn.target_host, conn.target_port
             
             # 返回成功响应
             # 格式: [VER(0x05), REP(0x00=成功), RSV(0x00), ATYP(0x01=IPv4), 
@@ -524,12 +1326,14 @@ class SimpleHTTPProxy:
             client_writer.write(b'\x05\x00\x00\x01\x00\x00\x00\x00\x00\x00')
             await client_writer.drain()
             
-            logger.info("socks5_tunnel_established", target=f"{target_host}:{target_port}")
+            if self.log_sampler.enabled("socks5_tunnel_established"):
+                logger.info("socks5_tunnel_established", target=f"{target_host}:{target_port}")
             
             # 进入数据转发阶段
-            bytes_sent, bytes_received = await self._forward_data_with_stats(
+            bytes_sent, bytes_received = await self._forward_data(
                 client_reader, client_writer,
-                target_reader, target_writer
+                target_reader, target_writer,
+                "socks5", timer, conn
             )
             
             return (target_host, target_port, bytes_sent, bytes_received)
@@ -585,30 +1389,93 @@ class SimpleHTTPProxy:
             logger.error(f"解析SOCKS5地址失败: {e}")
             return None, None
     
-    async def start(self) -> None:
-        """启动代理服务器"""
-        self.server = await asyncio.start_server(
-            self.handle_client,
-            self.config.host,
-            self.config.port
-        )
+    async def listen(self) -> None:
+        """绑定代理、TLS和管理接口的监听端口,此后即可接受连接"""
+        for host, port, protocols in self.listeners:
+            server = await asyncio.start_server(
+                functools.partial(self.handle_client, protocols=protocols),
+                host,
+                port,
+                start_serving=False
+            )
+            configure_listener(server, self.config.tcp_fastopen, self.config.defer_accept)
+            await server.start_serving()
+            self.servers.append(server)
+            addr = server.sockets[0].getsockname()
+            logger.info(f"代理服务器启动在 {addr[0]}:{addr[1]} ({', '.join(sorted(protocols)).upper()})")
+        self.server = self.servers[0]
         
-        addr = self.server.sockets[0].getsockname()
-        logger.info(f"代理服务器启动在 {addr[0]}:{addr[1]}")
-        logger.info(f"支持协议: {', '.join(self.config.protocols).upper()}")
+        if self.tls is not None:
+            self.tls_server = await asyncio.start_server(
+                self.handle_tls_client,
+                self.config.tls.host or self.config.host,
+                self.config.tls.port,
+                start_serving=False
+            )
+            configure_listener(self.tls_server, self.config.tcp_fastopen, self.config.defer_accept)
+            await self.tls_server.start_serving()
+            tls_addr = self.tls_server.sockets[0].getsockname()
+            logger.info(f"TLS监听在 {tls_addr[0]}:{tls_addr[1]}")
+        
+        if self.admin is not None:
+            await self.admin.start()
+        self.authenticator.start()
+        self.hooks.start()
+        if self.config.stats_interval > 0:
+            self.stats.start(self.registry, self.config.stats_interval)
+        if self.quota is not None:
+            self.quota.start()
+        if self.shedder is not None:
+            self.shedder.start()
+        if self.relay_monitor is not None:
+            self.relay_monitor.start()
         logger.info(f"最大连接数: {self.config.max_connections}")
         logger.info(f"连接超时: {self.config.connection_timeout}秒")
-        logger.info(f"HTTP/HTTPS: curl -x http://127.0.0.1:{self.config.port} http://www.baidu.com")
-        logger.info(f"SOCKS5: curl --socks5 127.0.0.1:{self.config.port} http://www.baidu.com")
-        
-        async with self.server:
-            await self.server.serve_forever()
+        logger.info(f"单连接内存上限: {self.config.max_connection_memory}字节")
+        if self.config.upstream:
+            logger.info(f"上游代理组: {self.config.upstream}")
+        for _, port, protocols in self.listeners:
+            if protocols & {"http", "https"}:
+                logger.info(f"HTTP/HTTPS: curl -x http://127.0.0.1:{port} http://www.baidu.com")
+                break
+        for _, port, protocols in self.listeners:
+            if "socks5" in protocols:
+                logger.info(f"SOCKS5: curl --socks5 127.0.0.1:{port} http://www.baidu.com")
+                break
+    
+    async def start(self) -> None:
+        """启动代理服务器"""
+        await self.listen()
+        try:
+            async with self.server:
+                await self.server.serve_forever()
+        finally:
+            # 中断退出时同样写入配额增量并停止各后台任务
+            await self.stop()
     
     async def stop(self) -> None:
         """停止代理服务器"""
-        if self.server:
-            self.server.close()
-            await self.server.wait_closed()
+        if self.admin is not None:
+            await self.admin.stop()
+        self.authenticator.stop()
+        self.hooks.stop()
+        self.stats.stop()
+        if self.quota is not None:
+            await self.quota.stop()
+        if self.shedder is not None:
+            self.shedder.stop()
+        if self.relay_monitor is not None:
+            self.relay_monitor.stop()
+        for group in self.upstream_groups.values():
+            group.close()
+        if self.tls_server:
+            self.tls_server.close()
+            await self.tls_server.wait_closed()
+        if self.servers:
+            for server in self.servers:
+                server.close()
+            for server in self.servers:
+                await server.wait_closed()
             logger.info("代理服务器已停止")
 
 
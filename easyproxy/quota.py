@@ -0,0 +1,352 @@
+"""按用户的流量配额模块"""
+
+import asyncio
+import sqlite3
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from .config import QuotaConfig
+from .logger import get_logger
+from .registry import ConnectionRecord, ConnectionRegistry
+
+logger = get_logger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    username TEXT NOT NULL,
+    period TEXT NOT NULL,
+    bytes_sent INTEGER NOT NULL DEFAULT 0,
+    bytes_received INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (username, period)
+)
+"""
+
+_UPSERT = """
+INSERT INTO usage (username, period, bytes_sent, bytes_received) VALUES (?, ?, ?, ?)
+ON CONFLICT (username, period) DO UPDATE SET
+    bytes_sent = bytes_sent + excluded.bytes_sent,
+    bytes_received = bytes_received + excluded.bytes_received
+"""
+
+
+def _periods(now: Optional[float] = None) -> Tuple[str, str]:
+    """当前的日、月统计周期(本地时间)"""
+    local = time.localtime(now)
+    return time.strftime("%Y-%m-%d", local), time.strftime("%Y-%m", local)
+
+
+class _Usage:
+    """单个用户在当前周期内的用量"""
+
+    __slots__ = ("day", "month", "pending_sent", "pending_received", "exceeded")
+
+    def __init__(self, day: int = 0, month: int = 0):
+        self.day = day
+        self.month = month
+        # 尚未写入存储的增量
+        self.pending_sent = 0
+        self.pending_received = 0
+        self.exceeded = False
+
+
+class QuotaManager:
+    """
+    按用户的流量统计与配额
+
+    流量不在中继数据路径上统计: 定时任务读取活跃连接中继的字节计数,把上次以来的增量
+    累加到用户,连接结束时补上剩余部分;增量按批写入 SQLite(每个周期一次事务),
+    不会每个连接写一次磁盘。用量超过日/月配额后,该用户的新连接被拒绝,
+    可选同时关闭其活跃连接;进入新的周期后自动恢复。
+    """
+
+    def __init__(self, config: QuotaConfig, registry: ConnectionRegistry):
+        """
+        初始化配额管理器
+
+        Args:
+            config: 配额配置
+            registry: 活跃连接登记表
+        """
+        self.config = config
+        self.registry = registry
+        self.day_period, self.month_period = _periods()
+        self._usage: Dict[str, _Usage] = {}
+        # 每个连接已计入用量的字节数
+        self._accounted: Dict[int, Tuple[int, int]] = {}
+        self._db: Optional[sqlite3.Connection] = None
+        # 待写入的增量批次: (用户增量列表, 日周期, 月周期)
+        self._backlog: List[Tuple[List[Tuple[str, int, int]], str, str]] = []
+        self._tasks: List[asyncio.Task] = []
+        # 进行中的写入,同一时刻只有一个线程使用数据库连接
+        self._writing: Optional[asyncio.Task] = None
+
+        # 统计
+        self.refused = 0
+        self.closed = 0
+        self.flushes = 0
+        self.flush_errors = 0
+
+        if config.store:
+            self._db = sqlite3.connect(config.store, check_same_thread=False)
+            self._db.execute(_SCHEMA)
+            self._load()
+
+    def _load(self) -> None:
+        """从存储恢复当前周期的用量"""
+        rows = self._db.execute(
+            "SELECT username, period, bytes_sent + bytes_received FROM usage WHERE period IN (?, ?)",
+            (self.day_period, self.month_period)
+        )
+        for username, period, total in rows:
+            usage = self._usage.get(username)
+            if usage is None:
+                usage = self._usage[username] = _Usage()
+            if period == self.day_period:
+                usage.day = total
+            else:
+                usage.month = total
+        for username, usage in self._usage.items():
+            usage.exceeded = self._over_limit(username, usage)
+        logger.info(f"已恢复 {len(self._usage)} 个用户的流量用量 ({self.config.store})")
+
+    def limits(self, username: str) -> Tuple[int, int]:
+        """用户的 (日配额, 月配额),0表示不限制"""
+        override = self.config.users.get(username)
+        if override is None:
+            return self.config.daily, self.config.monthly
+        return (
+            self.config.daily if override.daily is None else override.daily,
+            self.config.monthly if override.monthly is None else override.monthly,
+        )
+
+    def _over_limit(self, username: str, usage: _Usage) -> bool:
+        daily, monthly = self.limits(username)
+        return bool(daily and usage.day >= daily) or bool(monthly and usage.month >= monthly)
+
+    def admit(self, username: Optional[str]) -> bool:
+        """
+        判断用户是否可以建立新连接
+
+        Args:
+            username: 认证用户名,未认证的连接不受配额限制
+
+        Returns:
+            bool: False表示已超出配额
+        """
+        if username is None:
+            return True
+        usage = self._usage.get(username)
+        if usage is not None and usage.exceeded:
+            self.refused += 1
+            return False
+        return True
+
+    def _add(self, username: str, sent: int, received: int) -> Optional[_Usage]:
+        """累加用量,返回本次新超出配额的用户用量"""
+        usage = self._usage.get(username)
+        if usage is None:
+            usage = self._usage[username] = _Usage()
+        total = sent + received
+        usage.day += total
+        usage.month += total
+        usage.pending_sent += sent
+        usage.pending_received += received
+        if not usage.exceeded and self._over_limit(username, usage):
+            usage.exceeded = True
+            daily, monthly = self.limits(username)
+            logger.warning(
+                "quota_exceeded",
+                username=username,
+                day=usage.day,
+                month=usage.month,
+                daily=daily,
+                monthly=monthly
+            )
+            return usage
+        return None
+
+    def finish(self, conn: ConnectionRecord, bytes_sent: int, bytes_received: int) -> None:
+        """
+        连接结束时计入尚未统计的流量
+
+        Args:
+            conn: 连接登记信息
+            bytes_sent: 连接的上行总字节数
+            bytes_received: 连接的下行总字节数
+        """
+        accounted_sent, accounted_received = self._accounted.pop(conn.id, (0, 0))
+        if conn.user is None:
+            return
+        sent = bytes_sent - accounted_sent
+        received = bytes_received - accounted_received
+        if sent > 0 or received > 0:
+            if self._add(conn.user, max(sent, 0), max(received, 0)) is not None:
+                self._close_exceeded({conn.user})
+
+    def collect(self) -> None:
+        """读取活跃连接的流量增量,超出配额时按配置关闭该用户的连接"""
+        day_period, month_period = _periods()
+        if (day_period, month_period) != (self.day_period, self.month_period):
+            self._rollover(day_period, month_period)
+
+        exceeded = []
+        accounted = self._accounted
+        for record in self.registry:
+            if record.user is None or record.relay is None:
+                continue
+            sent, received = record.bytes_sent, record.bytes_received
+            last_sent, last_received = accounted.get(record.id, (0, 0))
+            if sent == last_sent and received == last_received:
+                continue
+            accounted[record.id] = (sent, received)
+            if self._add(record.user, sent - last_sent, received - last_received) is not None:
+                exceeded.append(record.user)
+
+        if exceeded:
+            self._close_exceeded(set(exceeded))
+
+    def _close_exceeded(self, users: Set[str]) -> None:
+        """按配置关闭超出配额用户的活跃连接"""
+        if not self.config.close_exceeded:
+            return
+        for record in list(self.registry):
+            if record.user in users and record.writer is not None and not record.killed:
+                record.kill("流量配额已用尽")
+                self.closed += 1
+
+    def _rollover(self, day_period: str, month_period: str) -> None:
+        """进入新的统计周期"""
+        new_month = month_period != self.month_period
+        # 上一周期的增量按原周期写入
+        if self._db is not None:
+            rows = self._take_pending()
+            if rows:
+                self._backlog.append((rows, self.day_period, self.month_period))
+        logger.info("quota_period_rollover", day=day_period, month=month_period)
+        self.day_period, self.month_period = day_period, month_period
+        for username, usage in self._usage.items():
+            usage.day = 0
+            if new_month:
+                usage.month = 0
+            usage.exceeded = self._over_limit(username, usage)
+
+    def _take_pending(self) -> List[Tuple[str, int, int]]:
+        pending = []
+        for username, usage in self._usage.items():
+            if usage.pending_sent or usage.pending_received:
+                pending.append((username, usage.pending_sent, usage.pending_received))
+                usage.pending_sent = usage.pending_received = 0
+        return pending
+
+    def _write(self, batches: List[Tuple[List[Tuple[str, int, int]], str, str]]) -> None:
+        """在线程中执行: 一次事务写入全部增量"""
+        with self._db:
+            for rows, day_period, month_period in batches:
+                self._db.executemany(
+                    _UPSERT,
+                    [
+                        (username, period, sent, received)
+                        for username, sent, received in rows
+                        for period in (day_period, month_period)
+                    ]
+                )
+
+    async def flush(self) -> None:
+        """将累计的增量写入存储"""
+        if self._db is None:
+            return
+        if self._writing is not None:
+            await asyncio.shield(self._writing)
+        batches = self._backlog
+        rows = self._take_pending()
+        if rows:
+            batches.append((rows, self.day_period, self.month_period))
+        self._backlog = []
+        if not batches:
+            return
+        self._writing = asyncio.get_running_loop().create_task(self._write_batches(batches))
+        # 调用方被取消时写入仍继续完成,不丢失已取出的增量
+        await asyncio.shield(self._writing)
+
+    async def _write_batches(self, batches: List[Tuple[List[Tuple[str, int, int]], str, str]]) -> None:
+        try:
+            await asyncio.to_thread(self._write, batches)
+        except sqlite3.Error as e:
+            # 写入失败的增量保留,下次重试
+            self.flush_errors += 1
+            logger.error("quota_flush_failed", error=str(e), batches=len(batches))
+            self._backlog = batches + self._backlog
+            return
+        self.flushes += 1
+
+    def start(self) -> None:
+        """在当前事件循环中启动用量采集和批量写入"""
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._collect_loop(), name="easyproxy-quota-collect")]
+        if self._db is not None:
+            self._tasks.append(loop.create_task(self._flush_loop(), name="easyproxy-quota-flush"))
+
+    async def stop(self) -> None:
+        """停止后台任务并写入剩余增量"""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._db is not None:
+            self.collect()
+            # flush() 先等待进行中的写入,关闭连接前不再有线程使用它
+            await self.flush()
+            self._db.close()
+            self._db = None
+
+    async def _collect_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.config.check_interval)
+            self.collect()
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.config.flush_interval)
+            await self.flush()
+
+    def usage(self, username: str) -> dict:
+        """用户在当前周期的用量和配额"""
+        usage = self._usage.get(username) or _Usage()
+        daily, monthly = self.limits(username)
+        return {
+            "day": usage.day,
+            "month": usage.month,
+            "daily": daily,
+            "monthly": monthly,
+            "exceeded": usage.exceeded,
+        }
+
+    def get_stats_dict(self) -> dict:
+        """获取配额统计信息"""
+        return {
+            "users": len(self._usage),
+            "exceeded": sum(1 for usage in self._usage.values() if usage.exceeded),
+            "refused": self.refused,
+            "closed": self.closed,
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+        }
+
+
+def create_quota_manager(
+    config: Optional[QuotaConfig],
+    registry: ConnectionRegistry
+) -> Optional[QuotaManager]:
+    """
+    创建配额管理器
+
+    Args:
+        config: 配额配置
+        registry: 活跃连接登记表
+
+    Returns:
+        Optional[QuotaManager]: 未启用时返回None
+    """
+    if not config or not config.enabled:
+        return None
+    return QuotaManager(config, registry)
@@ -0,0 +1,183 @@
+"""活跃连接登记模块"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Dict, Iterator, List, Optional
+
+from .relay import Relay
+
+# 两次计算速率之间的最小间隔(秒),避免多个查看者互相干扰
+MIN_RATE_WINDOW = 0.5
+
+
+class ConnectionRecord:
+    """
+    单个活跃连接的登记信息
+
+    流量直接读取中继的字节计数,登记表本身不在数据路径上做任何更新;
+    速率在查询时根据上次查询以来的字节增量计算。
+    """
+
+    __slots__ = (
+        "id", "client_ip", "client_port", "protocol", "target_host", "target_port",
+        "user", "started", "writer", "relay", "killed",
+        "_sampled_at", "_sampled_sent", "_sampled_received", "rate_sent", "rate_received",
+    )
+
+    def __init__(self, conn_id: int, client_ip: str, client_port: int, writer: asyncio.StreamWriter):
+        self.id = conn_id
+        self.client_ip = client_ip
+        self.client_port = client_port
+        self.protocol = "unknown"
+        self.target_host: Optional[str] = None
+        self.target_port: Optional[int] = None
+        self.user: Optional[str] = None
+        self.started = time.monotonic()
+        self.writer = writer
+        self.relay: Optional[Relay] = None
+        # 被中止的原因
+        self.killed: Optional[str] = None
+        self._sampled_at = self.started
+        self._sampled_sent = 0
+        self._sampled_received = 0
+        self.rate_sent = 0.0
+        self.rate_received = 0.0
+
+    @property
+    def bytes_sent(self) -> int:
+        """客户端发往目标的字节数"""
+        relay = self.relay
+        return relay.client.bytes if relay is not None and relay.client is not None else 0
+
+    @property
+    def bytes_received(self) -> int:
+        """目标返回给客户端的字节数"""
+        relay = self.relay
+        return relay.target.bytes if relay is not None and relay.target is not None else 0
+
+    @property
+    def rate(self) -> float:
+        """当前总吞吐(字节/秒)"""
+        return self.rate_sent + self.rate_received
+
+    def sample(self, now: float) -> None:
+        """更新速率"""
+        elapsed = now - self._sampled_at
+        if elapsed < MIN_RATE_WINDOW:
+            return
+        sent, received = self.bytes_sent, self.bytes_received
+        self.rate_sent = (sent - self._sampled_sent) / elapsed
+        self.rate_received = (received - self._sampled_received) / elapsed
+        self._sampled_at = now
+        self._sampled_sent = sent
+        self._sampled_received = received
+
+    def to_dict(self, now: float) -> dict:
+        return {
+            "id": self.id,
+            "client": f"{self.client_ip}:{self.client_port}",
+            "user": self.user,
+            "protocol": self.protocol,
+            "target": f"{self.target_host}:{self.target_port}" if self.target_host else None,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "rate_sent": round(self.rate_sent, 1),
+            "rate_received": round(self.rate_received, 1),
+            "age": round(now - self.started, 3),
+        }
+
+    def kill(self, reason: str = "连接被管理接口中止") -> None:
+        """立即中止连接"""
+        self.killed = reason
+        if self.relay is not None and self.relay.client is not None:
+            self.relay.abort()
+        else:
+            self.writer.transport.abort()
+
+
+class ConnectionRegistry:
+    """活跃连接登记表,登记和注销均为O(1)"""
+
+    SORT_KEYS = ("rate", "bytes", "age")
+
+    def __init__(self):
+        self._records: Dict[int, ConnectionRecord] = {}
+        self._ids = itertools.count(1)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __iter__(self) -> Iterator[ConnectionRecord]:
+        return iter(self._records.values())
+
+    def register(
+        self,
+        client_ip: str,
+        client_port: int,
+        writer: asyncio.StreamWriter
+    ) -> ConnectionRecord:
+        """
+        登记新连接
+
+        Args:
+            client_ip: 客户端IP
+            client_port: 客户端端口
+            writer: 客户端连接的写入流,用于中止连接
+
+        Returns:
+            ConnectionRecord: 连接登记信息
+        """
+        record = ConnectionRecord(next(self._ids), client_ip, client_port, writer)
+        self._records[record.id] = record
+        return record
+
+    def unregister(self, record: ConnectionRecord) -> None:
+        """注销连接"""
+        self._records.pop(record.id, None)
+        record.relay = None
+        record.writer = None
+
+    def get(self, conn_id: int) -> Optional[ConnectionRecord]:
+        return self._records.get(conn_id)
+
+    def top(self, k: int = 20, sort: str = "rate") -> List[dict]:
+        """
+        按当前吞吐、累计流量或连接时长取前K个连接
+
+        Args:
+            k: 数量
+            sort: rate / bytes / age
+
+        Returns:
+            List[dict]: 连接信息列表
+        """
+        now = time.monotonic()
+        records = list(self._records.values())
+        for record in records:
+            record.sample(now)
+
+        if sort == "bytes":
+            key = lambda r: r.bytes_sent + r.bytes_received
+        elif sort == "age":
+            key = lambda r: now - r.started
+        else:
+            key = lambda r: r.rate
+        return [record.to_dict(now) for record in heapq.nlargest(k, records, key=key)]
+
+    def kill(self, conn_id: int) -> bool:
+        """
+        中止指定连接
+
+        Args:
+            conn_id: 连接ID
+
+        Returns:
+            bool: 连接是否存在
+        """
+        record = self._records.get(conn_id)
+        if record is None or record.writer is None:
+            return False
+        record.kill()
+        return True
@@ -0,0 +1,451 @@
+"""双向数据中继模块"""
+
+import asyncio
+import time
+from typing import Dict, Optional, Tuple
+
+from .buffers import TieredBufferPool
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+# 连续多少次读满缓冲区后升级到更大的缓冲区
+GROW_AFTER_FULL_READS = 4
+# 连续多少次读取不足缓冲区1/4后降级到更小的缓冲区
+SHRINK_AFTER_SMALL_READS = 32
+
+# 暂停读取的原因(位掩码),所有原因都解除后才恢复读取
+PAUSE_BACKPRESSURE = 1  # 对端写缓冲超过高水位
+PAUSE_BUDGET = 2        # 全局写缓冲预算用尽
+
+
+def _take_buffered(reader: asyncio.StreamReader) -> Tuple[bytes, bool]:
+    """
+    取出 StreamReader 中已预读但尚未消费的数据
+
+    握手阶段客户端可能已经发送了隧道数据(如TLS ClientHello)。
+    StreamReader 没有公开的非阻塞读取接口,这里直接访问其内部缓冲区。
+
+    Returns:
+        Tuple[bytes, bool]: (缓冲数据, 是否已收到EOF)
+    """
+    data = bytes(reader._buffer)
+    reader._buffer.clear()
+    return data, reader.at_eof()
+
+
+class _RelayProtocol(asyncio.BufferedProtocol):
+    """
+    挂在一侧 transport 上的中继协议
+
+    从本侧 recv_into 到池化缓冲区,再写入对端 transport;
+    本侧写缓冲超过高水位时暂停对端读取,实现背压。
+    启用自适应时,持续读满则升级缓冲区,持续小包则降级。
+    """
+
+    __slots__ = (
+        "relay", "transport", "original", "pools", "tier", "adaptive", "peer",
+        "pool", "buffer", "view", "full_reads", "small_reads", "bytes", "first_data_at",
+        "eof", "closed", "paused", "written", "delivered", "progress_at",
+    )
+
+    def __init__(
+        self,
+        relay: "Relay",
+        transport: asyncio.Transport,
+        original: asyncio.BaseProtocol,
+        pools: TieredBufferPool,
+        tier: int,
+        adaptive: bool,
+    ):
+        self.relay = relay
+        self.transport = transport
+        self.original = original
+        self.pools = pools
+        self.tier = tier
+        self.adaptive = adaptive
+        self.peer: Optional["_RelayProtocol"] = None
+
+        self.pool = pools.pools[tier]
+        self.buffer = self.pool.acquire()
+        self.view = memoryview(self.buffer)
+        self.full_reads = 0
+        self.small_reads = 0
+        self.bytes = 0
+        # 本侧首次收到数据的单调时钟时间
+        self.first_data_at: Optional[float] = None
+        self.eof = False
+        self.closed = False
+        # 暂停读取的原因
+        self.paused = 0
+        # 写入本侧 transport 的字节数,以及上次检查时已发出的字节数和有进展的时间
+        self.written = 0
+        self.delivered = 0
+        self.progress_at = 0.0
+
+    def get_buffer(self, sizehint: int) -> memoryview:
+        return self.view
+
+    def buffer_updated(self, nbytes: int) -> None:
+        if self.first_data_at is None:
+            self.first_data_at = time.monotonic()
+        self.bytes += nbytes
+        peer = self.peer
+        peer_transport = peer.transport
+        backlog = peer_transport.get_write_buffer_size()
+        if backlog:
+            # 对端已有积压数据,transport 会保留写入内容,必须复制
+            peer_transport.write(self.buffer[:nbytes])
+        else:
+            peer_transport.write(self.view[:nbytes])
+        peer.written += nbytes
+        buffered = peer_transport.get_write_buffer_size()
+        # 未能一次发完时 transport 可能仍引用本缓冲区,需要换一块新的
+        retained = buffered > 0 and not backlog
+        if buffered and self.relay.monitor is not None:
+            self.relay.monitor.track(peer, buffered - backlog, self)
+
+        tier = self.tier
+        if self.adaptive:
+            if nbytes == len(self.buffer):
+                self.full_reads += 1
+                self.small_reads = 0
+                if self.full_reads >= GROW_AFTER_FULL_READS and tier + 1 < len(self.pools.sizes):
+                    tier += 1
+            elif nbytes <= len(self.buffer) // 4:
+                self.small_reads += 1
+                self.full_reads = 0
+                if self.small_reads >= SHRINK_AFTER_SMALL_READS and tier > 0:
+                    tier -= 1
+            else:
+                self.full_reads = 0
+                self.small_reads = 0
+
+        if retained or tier != self.tier:
+            self._release_buffer(discard=retained)
+            self.tier = tier
+            self.pool = self.pools.pools[tier]
+            self.buffer = self.pool.acquire()
+            self.view = memoryview(self.buffer)
+            self.full_reads = 0
+            self.small_reads = 0
+
+    def eof_received(self) -> bool:
+        self.eof = True
+        self.relay._on_eof(self)
+        # 保持连接打开以支持半关闭; TLS传输不支持半关闭,由transport自行关闭
+        return self.transport.can_write_eof()
+
+    def pause_writing(self) -> None:
+        self.peer.pause(PAUSE_BACKPRESSURE)
+
+    def resume_writing(self) -> None:
+        self.peer.resume(PAUSE_BACKPRESSURE)
+
+    def pause(self, reason: int) -> None:
+        """因指定原因暂停读取本侧"""
+        if not self.paused and not self.closed:
+            self.transport.pause_reading()
+        self.paused |= reason
+
+    def resume(self, reason: int) -> None:
+        """解除指定的暂停原因,全部解除后恢复读取"""
+        if not self.paused & reason:
+            return
+        self.paused &= ~reason
+        if not self.paused and not self.closed and not self.eof:
+            self.transport.resume_reading()
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self.closed = True
+        self._release_buffer()
+        # 让原 StreamWriter.wait_closed() 能够正常返回
+        self.original.connection_lost(exc)
+        self.relay._on_lost(self)
+
+    def _release_buffer(self, discard: bool = False) -> None:
+        if self.buffer is None:
+            return
+        self.view.release()
+        if discard:
+            self.pool.discard(self.buffer)
+        else:
+            self.pool.release(self.buffer)
+        self.buffer = None
+        self.view = None
+
+
+class RelayMonitor:
+    """
+    中继写缓冲的全局预算与慢消费者检测
+
+    写入后仍有积压的一侧被登记到积压表中,全局积压量超过预算时暂停写入方的读取;
+    定时检查各积压侧的实际发送进度,积压期间持续无进展超过 stall_timeout 的连接被中止。
+    只有存在积压的连接需要检查,空闲和畅通的连接没有额外开销。
+    """
+
+    def __init__(self, max_buffered: int, stall_timeout: float, interval: float = 1.0):
+        """
+        初始化中继监控
+
+        Args:
+            max_buffered: 所有连接写缓冲的总预算(字节),0表示不限制
+            stall_timeout: 慢消费者判定时间(秒),0表示不检测
+            interval: 检查间隔(秒)
+        """
+        self.max_buffered = max_buffered
+        self.stall_timeout = stall_timeout
+        self.interval = interval
+        # 积压量估计: 写入时累加,检查时按实际值校正
+        self.buffered = 0
+        self.now = time.monotonic()
+        self._backlogged: Dict[_RelayProtocol, None] = {}
+        self._throttled: Dict[_RelayProtocol, None] = {}
+        self._task: Optional[asyncio.Task] = None
+
+        # 统计
+        self.peak_buffered = 0
+        self.throttle_events = 0
+        self.slow_consumers = 0
+
+    def start(self) -> None:
+        """在当前事件循环中启动定时检查"""
+        self._task = asyncio.get_running_loop().create_task(
+            self._run(), name="easyproxy-relay-monitor"
+        )
+
+    def stop(self) -> None:
+        """停止定时检查"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def track(self, side: _RelayProtocol, added: int, source: _RelayProtocol) -> None:
+        """
+        登记一次写入后的积压
+
+        Args:
+            side: 被写入且存在积压的一侧
+            added: 本次写入新增的积压字节数
+            source: 数据来源侧,超出预算时暂停其读取
+        """
+        if side not in self._backlogged:
+            side.delivered = side.written - side.transport.get_write_buffer_size()
+            side.progress_at = self.now
+            self._backlogged[side] = None
+        self.buffered += added
+        if self.max_buffered and self.buffered > self.max_buffered:
+            if not source.paused & PAUSE_BUDGET:
+                source.pause(PAUSE_BUDGET)
+                self._throttled[source] = None
+                self.throttle_events += 1
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            self.check()
+
+    def check(self) -> None:
+        """校正全局积压量,恢复被节流的连接,中止慢消费者"""
+        now = self.now = time.monotonic()
+        total = 0
+        stalled = []
+        for side in list(self._backlogged):
+            size = 0 if side.closed else side.transport.get_write_buffer_size()
+            if not size:
+                del self._backlogged[side]
+                continue
+            total += size
+            delivered = side.written - size
+            if delivered > side.delivered:
+                side.delivered = delivered
+                side.progress_at = now
+            elif self.stall_timeout and now - side.progress_at >= self.stall_timeout:
+                stalled.append(side)
+        self.buffered = total
+        if total > self.peak_buffered:
+            self.peak_buffered = total
+
+        if self._throttled and (not self.max_buffered or total <= self.max_buffered * 3 // 4):
+            throttled, self._throttled = self._throttled, {}
+            for side in throttled:
+                side.resume(PAUSE_BUDGET)
+
+        for side in stalled:
+            relay = side.relay
+            self.slow_consumers += 1
+            logger.warning(
+                "slow_consumer_closed",
+                side="client" if side is relay.client else "target",
+                peer=str(side.transport.get_extra_info('peername')),
+                buffered=side.transport.get_write_buffer_size(),
+                stalled_seconds=round(now - side.progress_at, 1)
+            )
+            relay.abort()
+            self._backlogged.pop(side, None)
+
+    def get_stats_dict(self) -> dict:
+        """获取中继写缓冲统计信息"""
+        return {
+            "buffered": self.buffered,
+            "peak_buffered": self.peak_buffered,
+            "backlogged": len(self._backlogged),
+            "throttled": len(self._throttled),
+            "throttle_events": self.throttle_events,
+            "slow_consumers_closed": self.slow_consumers,
+        }
+
+
+def create_relay_monitor(max_buffered: int, stall_timeout: float) -> Optional[RelayMonitor]:
+    """
+    创建中继监控
+
+    Args:
+        max_buffered: 所有连接写缓冲的总预算(字节),0表示不限制
+        stall_timeout: 慢消费者判定时间(秒),0表示不检测
+
+    Returns:
+        Optional[RelayMonitor]: 两项都未启用时返回None
+    """
+    if not max_buffered and not stall_timeout:
+        return None
+    interval = min(1.0, stall_timeout / 4) if stall_timeout else 1.0
+    return RelayMonitor(max_buffered, stall_timeout, interval)
+
+
+class Relay:
+    """
+    客户端与目标之间的双向中继
+
+    握手完成后接管两侧 transport,替换为基于 BufferedProtocol 的中继协议。
+    每个连接最多占用两个池化缓冲区,加上两侧写缓冲的高水位,内存占用有明确上限。
+    """
+
+    def __init__(
+        self,
+        pools: TieredBufferPool,
+        write_buffer_limit: Optional[int] = None,
+        tier: int = 0,
+        adaptive: bool = False,
+        monitor: Optional[RelayMonitor] = None
+    ):
+        """
+        初始化中继
+
+        Args:
+            pools: 分级缓冲区池
+            write_buffer_limit: 每侧写缓冲高水位(字节),None表示使用asyncio默认值
+            tier: 初始缓冲区级别
+            adaptive: 是否自适应调整缓冲区大小
+            monitor: 全局写缓冲预算与慢消费者检测
+        """
+        self.pools = pools
+        self.write_buffer_limit = write_buffer_limit
+        self.tier = tier
+        self.adaptive = adaptive
+        self.monitor = monitor
+        self.client: Optional[_RelayProtocol] = None
+        self.target: Optional[_RelayProtocol] = None
+        self._done: Optional[asyncio.Future] = None
+
+    def _attach(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter
+    ) -> Tuple[Optional[_RelayProtocol], bytes, bool]:
+        """接管一侧transport,返回(中继协议, 预读数据, 是否已EOF)"""
+        pending, eof = _take_buffered(reader)
+        transport = writer.transport
+        if transport.is_closing():
+            return None, pending, True
+
+        side = _RelayProtocol(
+            self, transport, transport.get_protocol(), self.pools, self.tier, self.adaptive
+        )
+        transport.set_protocol(side)
+        if self.write_buffer_limit is not None:
+            transport.set_write_buffer_limits(high=self.write_buffer_limit)
+        return side, pending, eof
+
+    async def run(
+        self,
+        client_reader: asyncio.StreamReader,
+        client_writer: asyncio.StreamWriter,
+        target_reader: asyncio.StreamReader,
+        target_writer: asyncio.StreamWriter
+    ) -> Tuple[int, int]:
+        """
+        执行中继直到两侧都关闭
+
+        Returns:
+            Tuple[int, int]: (bytes_sent, bytes_received)
+        """
+        self._done = asyncio.get_running_loop().create_future()
+
+        client, client_pending, client_eof = self._attach(client_reader, client_writer)
+        target, target_pending, target_eof = self._attach(target_reader, target_writer)
+        if client is None or target is None:
+            for side, writer in ((client, client_writer), (target, target_writer)):
+                if side is not None:
+                    side.transport.close()
+                else:
+                    writer.close()
+            if client is not None or target is not None:
+                await self._done
+            return (len(client_pending), len(target_pending))
+
+        self.client, self.target = client, target
+        client.peer, target.peer = target, client
+
+        # 先转发握手阶段预读的数据
+        for side, pending, eof in (
+            (client, client_pending, client_eof),
+            (target, target_pending, target_eof),
+        ):
+            if pending:
+                side.first_data_at = time.monotonic()
+                side.bytes += len(pending)
+                side.peer.transport.write(pending)
+                side.peer.written += len(pending)
+            if eof:
+                side.eof = True
+                self._on_eof(side)
+
+        for side in (client, target):
+            if not side.eof and not side.paused:
+                side.transport.resume_reading()
+
+        try:
+            await self._done
+        except asyncio.CancelledError:
+            self.abort()
+            raise
+
+        return (client.bytes, target.bytes)
+
+    def abort(self) -> None:
+        """立即中止两侧连接"""
+        for side in (self.client, self.target):
+            if side is not None and not side.closed:
+                side.transport.abort()
+
+    def _on_eof(self, side: _RelayProtocol) -> None:
+        """一侧读到EOF: 对端半关闭写方向,两个方向都结束时关闭连接"""
+        peer = side.peer
+        if peer is None or peer.closed:
+            side.transport.close()
+            return
+        if peer.eof or not peer.transport.can_write_eof() or not side.transport.can_write_eof():
+            side.transport.close()
+            peer.transport.close()
+            return
+        peer.transport.write_eof()
+
+    def _on_lost(self, side: _RelayProtocol) -> None:
+        """一侧连接断开: 关闭对端,两侧都断开后结束中继"""
+        peer = side.peer
+        if peer is not None and not peer.closed:
+            peer.transport.close()
+            return
+        if not self._done.done():
+            self._done.set_result(None)
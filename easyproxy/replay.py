@@ -0,0 +1,442 @@
+"""访问日志回放模块"""
+
+import asyncio
+import json
+import re
+import struct
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .soak import _ProxyProcess, _raise_fd_limit
+
+PROTOCOLS = ("http", "https", "socks5")
+
+# AccessLogger 输出的事件名
+ACCESS_EVENTS = ("proxy_request", "proxy_request_failed")
+
+_ANSI = re.compile(r"\x1b\[[0-9;]*m")
+# 控制台格式: 时间戳 [级别] 事件名 [记录器名] key=value ...
+_CONSOLE_LINE = re.compile(
+    r"^(?P<timestamp>\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}\S*)\s+"
+    r"\[\s*\w+\s*\]\s+(?P<event>\S+)\s*(?:\[[^\]]*\])?(?P<fields>.*)$"
+)
+_FIELD = re.compile(r"(?:^|\s)(\w+)=")
+
+# 源站协议: 隧道连接先发送 (上行字节数, 下行字节数) 头部
+_TUNNEL_HEADER = struct.Struct("!QQ")
+_CHUNK = b"\0" * 65536
+
+# 百分位
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class ReplayEntry:
+    """一条待回放的连接"""
+
+    __slots__ = ("start", "protocol", "target", "bytes_sent", "bytes_received", "duration")
+
+    def __init__(
+        self,
+        start: float,
+        protocol: str,
+        target: str,
+        bytes_sent: int,
+        bytes_received: int,
+        duration: float
+    ):
+        self.start = start
+        self.protocol = protocol
+        self.target = target
+        self.bytes_sent = bytes_sent
+        self.bytes_received = bytes_received
+        self.duration = duration
+
+
+# =============================================================================
+# 日志解析
+# =============================================================================
+
+def parse_log_line(line: str) -> Optional[dict]:
+    """
+    解析一行访问日志
+
+    支持 structlog 的控制台格式(可带颜色控制码)和 JSON 格式。
+
+    Returns:
+        Optional[dict]: 包含 timestamp、event 和日志字段,不是访问日志时返回None
+    """
+    line = _ANSI.sub("", line).strip()
+    if line.startswith("{"):
+        try:
+            data = json.loads(line)
+        except ValueError:
+            return None
+        if not isinstance(data, dict) or data.get("event") not in ACCESS_EVENTS:
+            return None
+        return data
+
+    match = _CONSOLE_LINE.match(line)
+    if match is None or match["event"] not in ACCESS_EVENTS:
+        return None
+    fields = match["fields"]
+    data = {"timestamp": match["timestamp"], "event": match["event"]}
+    keys = list(_FIELD.finditer(fields))
+    for i, key in enumerate(keys):
+        end = keys[i + 1].start() if i + 1 < len(keys) else len(fields)
+        data[key.group(1)] = fields[key.end():end].strip()
+    return data
+
+
+def load_access_log(
+    lines: Iterable[str],
+    protocols: Sequence[str] = PROTOCOLS
+) -> Tuple[List[ReplayEntry], int]:
+    """
+    从访问日志读取连接模式
+
+    日志时间戳是连接结束时间,减去 duration_ms 得到开始时间。失败的连接、
+    未识别的协议和字段不完整的记录被跳过。
+
+    Args:
+        lines: 日志行
+        protocols: 回放的协议
+
+    Returns:
+        Tuple[List[ReplayEntry], int]: (按开始时间排序、开始时间相对第一条连接的记录, 跳过的记录数)
+    """
+    entries = []
+    skipped = 0
+    for line in lines:
+        data = parse_log_line(line)
+        if data is None:
+            continue
+        if data["event"] != "proxy_request" or data.get("protocol") not in protocols:
+            skipped += 1
+            continue
+        try:
+            duration = float(data["duration_ms"]) / 1000
+            ended = datetime.fromisoformat(str(data["timestamp"])).timestamp()
+            entries.append(ReplayEntry(
+                ended - duration,
+                data["protocol"],
+                str(data.get("target", "")),
+                int(data["bytes_sent"]),
+                int(data["bytes_received"]),
+                duration
+            ))
+        except (KeyError, TypeError, ValueError):
+            skipped += 1
+
+    entries.sort(key=lambda entry: entry.start)
+    if entries:
+        origin = entries[0].start
+        for entry in entries:
+            entry.start -= origin
+    return entries, skipped
+
+
+# =============================================================================
+# 源站与客户端
+# =============================================================================
+
+async def _drain_until_eof(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """等待客户端关闭,使连接在回放的时长内保持打开"""
+    try:
+        while await reader.read(65536):
+            pass
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def _send(writer: asyncio.StreamWriter, size: int) -> None:
+    while size > 0:
+        chunk = _CHUNK if size >= len(_CHUNK) else _CHUNK[:size]
+        writer.write(chunk)
+        await writer.drain()
+        size -= len(chunk)
+
+
+async def _receive(reader: asyncio.StreamReader, size: int) -> Optional[float]:
+    """读取指定字节数,返回收到首个数据的时间"""
+    first = None
+    while size > 0:
+        data = await reader.read(min(size, 65536))
+        if not data:
+            raise asyncio.IncompleteReadError(b"", size)
+        if first is None:
+            first = time.monotonic()
+        size -= len(data)
+    return first
+
+
+async def _tunnel_origin(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """隧道源站: 读取头部声明的上行字节后返回下行字节"""
+    try:
+        upload, download = _TUNNEL_HEADER.unpack(await reader.readexactly(_TUNNEL_HEADER.size))
+        await _receive(reader, upload)
+        await _send(writer, download)
+    except (asyncio.IncompleteReadError, ConnectionError):
+        writer.close()
+        return
+    await _drain_until_eof(reader, writer)
+
+
+async def _http_origin(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """HTTP源站: 请求路径携带下行字节数,读取请求体后返回对应长度的响应体"""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+        request_line, _, header_block = head.decode('latin-1').partition("\r\n")
+        download = int(request_line.split()[1].rpartition("/")[2])
+        upload = 0
+        for header in header_block.split("\r\n"):
+            name, _, value = header.partition(":")
+            if name.strip().lower() == "content-length":
+                upload = int(value)
+        await _receive(reader, upload)
+        writer.write(
+            f"HTTP/1.1 200 OK\r\nContent-Length: {download}\r\nConnection: close\r\n\r\n".encode()
+        )
+        await _send(writer, download)
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError, IndexError):
+        writer.close()
+        return
+    await _drain_until_eof(reader, writer)
+
+
+async def _open_tunnel(
+    protocol: str,
+    proxy: Tuple[str, int],
+    origin_port: int
+) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    """经代理建立到隧道源站的连接"""
+    reader, writer = await asyncio.open_connection(*proxy)
+    try:
+        if protocol == "https":
+            writer.write(f"CONNECT 127.0.0.1:{origin_port} HTTP/1.1\r\n\r\n".encode())
+            head = await reader.readuntil(b"\r\n\r\n")
+            if b" 200 " not in head.split(b"\r\n", 1)[0]:
+                raise ConnectionError(head.split(b"\r\n", 1)[0].decode('latin-1'))
+        else:
+            writer.write(b"\x05\x01\x00")
+            if await reader.readexactly(2) != b"\x05\x00":
+                raise ConnectionError("SOCKS5握手失败")
+            writer.write(b"\x05\x01\x00\x01\x7f\x00\x00\x01" + struct.pack("!H", origin_port))
+            reply = await reader.readexactly(10)
+            if reply[1] != 0x00:
+                raise ConnectionError(f"SOCKS5连接失败: REP={reply[1]}")
+    except BaseException:
+        writer.close()
+        raise
+    return reader, writer
+
+
+async def _replay_one(
+    entry: ReplayEntry,
+    speed: float,
+    byte_scale: float,
+    proxy: Tuple[str, int],
+    tunnel_port: int,
+    http_port: int
+) -> dict:
+    """
+    回放一条连接
+
+    Returns:
+        dict: setup(建立到可以发送数据的耗时)、ttfb(到收到首个响应数据的耗时)、
+        duration(连接总时长)、expected(按加速倍数换算的原始时长),单位为秒
+    """
+    upload = int(entry.bytes_sent * byte_scale)
+    download = int(entry.bytes_received * byte_scale)
+    expected = entry.duration / speed
+    started = time.monotonic()
+
+    if entry.protocol == "http":
+        reader, writer = await asyncio.open_connection(*proxy)
+        setup = time.monotonic()
+        # 使用POST,避免命中代理的HTTP缓存
+        writer.write(
+            f"POST http://127.0.0.1:{http_port}/{download} HTTP/1.1\r\n"
+            f"Host: 127.0.0.1:{http_port}\r\nContent-Length: {upload}\r\n\r\n".encode()
+        )
+    else:
+        reader, writer = await _open_tunnel(entry.protocol, proxy, tunnel_port)
+        setup = time.monotonic()
+        writer.write(_TUNNEL_HEADER.pack(upload, download))
+
+    try:
+        await _send(writer, upload)
+        if entry.protocol == "http":
+            head = await reader.readuntil(b"\r\n\r\n")
+            first = time.monotonic()
+            if b" 200 " not in head.split(b"\r\n", 1)[0]:
+                raise ConnectionError(head.split(b"\r\n", 1)[0].decode('latin-1'))
+            await _receive(reader, download)
+        else:
+            first = await _receive(reader, download)
+        done = time.monotonic()
+        # 保持连接直到原始时长
+        if done - started < expected:
+            await asyncio.sleep(expected - (done - started))
+    finally:
+        writer.close()
+
+    return {
+        "setup": setup - started,
+        "ttfb": (first or done) - started,
+        "transfer": done - setup,
+        "duration": time.monotonic() - started,
+        "expected": expected,
+        "bytes": upload + download,
+    }
+
+
+def _quantiles(values: List[float]) -> Dict[str, float]:
+    """毫秒为单位的百分位"""
+    if not values:
+        return {f"p{round(q * 100)}_ms": 0.0 for q in QUANTILES}
+    ordered = sorted(values)
+    return {
+        f"p{round(q * 100)}_ms": round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+        for q in QUANTILES
+    }
+
+
+def summarize(results: List[dict], wall: float) -> dict:
+    """汇总一组回放结果"""
+    completed = [r for r in results if r["error"] is None]
+    total_bytes = sum(r["bytes"] for r in completed)
+    transfer = sum(r["transfer"] for r in completed)
+    return {
+        "connections": len(results),
+        "errors": len(results) - len(completed),
+        "setup": _quantiles([r["setup"] for r in completed]),
+        "ttfb": _quantiles([r["ttfb"] for r in completed]),
+        # 超出原始时长的部分: 代理引入的额外延迟
+        "overrun": _quantiles([max(r["duration"] - r["expected"], 0) for r in completed]),
+        "bytes": total_bytes,
+        "throughput": total_bytes / wall if wall > 0 else 0.0,
+        "transfer_rate": total_bytes / transfer if transfer > 0 else 0.0,
+    }
+
+
+def compare(current: dict, baseline: dict) -> Dict[str, Dict[str, Optional[float]]]:
+    """
+    计算相对上一次回放结果的变化比例
+
+    Args:
+        current: 本次 run_replay() 的结果
+        baseline: 作为基线的结果
+
+    Returns:
+        Dict[str, Dict[str, Optional[float]]]: 每个协议(及 total)的各指标变化比例,基线为0时为None
+    """
+    def delta(new: float, old: float) -> Optional[float]:
+        return (new - old) / old if old else None
+
+    deltas = {}
+    for name, summary in current["summary"].items():
+        old = baseline.get("summary", {}).get(name)
+        if old is None:
+            continue
+        row = {}
+        for metric in ("setup", "ttfb"):
+            for key in ("p50_ms", "p99_ms"):
+                row[f"{metric}_{key}"] = delta(summary[metric][key], old[metric][key])
+        row["throughput"] = delta(summary["throughput"], old["throughput"])
+        row["transfer_rate"] = delta(summary["transfer_rate"], old["transfer_rate"])
+        deltas[name] = row
+    return deltas
+
+
+# =============================================================================
+# 回放流程
+# =============================================================================
+
+async def run_replay(
+    entries: List[ReplayEntry],
+    speed: float = 1.0,
+    byte_scale: float = 1.0,
+    proxy_address: Optional[Tuple[str, int]] = None,
+    config_path: Optional[str] = None,
+    report: Callable[[str], None] = lambda message: None
+) -> dict:
+    """
+    按访问日志记录的连接模式经代理回放流量
+
+    每条连接在原始开始时间(按 speed 加速)发起,经代理连接本地源站,上传 bytes_sent
+    字节、下载 bytes_received 字节后保持连接直到原始时长(同样按 speed 缩短)。
+    原始目标不会被访问,所有连接都指向本地源站。
+
+    Args:
+        entries: load_access_log() 读取的连接
+        speed: 加速倍数,2表示以两倍速度回放
+        byte_scale: 字节数缩放比例
+        proxy_address: 已运行的代理地址 (host, port),None表示启动独立的代理子进程
+        config_path: 代理子进程使用的配置文件,见 soak._test_config()
+        report: 进度输出回调
+
+    Returns:
+        dict: 回放参数、按协议及总计的汇总 (summary) 和每条连接的结果
+    """
+    _raise_fd_limit()
+    tunnel_server = await asyncio.start_server(_tunnel_origin, "127.0.0.1", 0, limit=1024 * 1024)
+    http_server = await asyncio.start_server(_http_origin, "127.0.0.1", 0, limit=1024 * 1024)
+    tunnel_port = tunnel_server.sockets[0].getsockname()[1]
+    http_port = http_server.sockets[0].getsockname()[1]
+
+    process = None
+    if proxy_address is None:
+        process, _ = await _ProxyProcess.start(config_path=config_path)
+        proxy_address = ("127.0.0.1", process.port)
+        report(f"被测代理进程 pid={process.process.pid} 端口={process.port}")
+
+    async def replay(entry: ReplayEntry) -> dict:
+        result = {"protocol": entry.protocol, "target": entry.target, "error": None}
+        try:
+            result.update(await _replay_one(
+                entry, speed, byte_scale, proxy_address, tunnel_port, http_port
+            ))
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError) as e:
+            result["error"] = repr(e)
+        return result
+
+    span = entries[-1].start / speed if entries else 0
+    report(f"回放 {len(entries)} 条连接, 预计 {span:.1f} 秒 (x{speed:g})")
+    tasks = []
+    try:
+        begin = time.monotonic()
+        next_report = begin + 10
+        for entry in entries:
+            delay = begin + entry.start / speed - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(replay(entry)))
+            if time.monotonic() >= next_report:
+                next_report += 10
+                report(f"已发起 {len(tasks)}/{len(entries)} 条连接")
+        results = await asyncio.gather(*tasks)
+        wall = time.monotonic() - begin
+    finally:
+        for task in tasks:
+            task.cancel()
+        if process is not None:
+            await process.close()
+        tunnel_server.close()
+        http_server.close()
+
+    summary = {
+        protocol: summarize([r for r in results if r["protocol"] == protocol], wall)
+        for protocol in PROTOCOLS
+        if any(r["protocol"] == protocol for r in results)
+    }
+    summary["total"] = summarize(results, wall)
+    return {
+        "speed": speed,
+        "byte_scale": byte_scale,
+        "wall_seconds": wall,
+        "summary": summary,
+        "connections": results,
+    }
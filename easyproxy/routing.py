@@ -0,0 +1,252 @@
+"""分流路由模块"""
+
+import hashlib
+import os
+import pickle
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .acl import AccessDeniedError, CidrTrie, DomainTrie, parse_address, parse_port_range, read_rule_file
+from .config import RoutingConfig
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+DIRECT = "direct"
+REJECT = "reject"
+
+# 编译结果格式版本,数据结构变化时递增以使旧缓存失效
+COMPILED_FORMAT_VERSION = 2
+
+
+class RouteRejectedError(AccessDeniedError):
+    """目标被路由规则拒绝"""
+
+
+class RuleSyntaxError(ValueError):
+    """路由规则格式错误"""
+
+
+class CompiledRules:
+    """
+    编译后的路由规则
+
+    匹配按具体程度而非书写顺序:
+    精确域名 > 更长的域名后缀 > 更长的IP前缀 > 端口 > 默认动作;
+    同一条件重复出现时以先出现者为准。
+    """
+
+    def __init__(self):
+        self.domains = DomainTrie()
+        self.cidrs = CidrTrie()
+        self.ports: Dict[int, str] = {}
+        self.default: Optional[str] = None
+        self.actions: Set[str] = set()
+        self.rule_count = 0
+
+    def add_rule(self, line: str, source: str = "<inline>") -> None:
+        """
+        添加一条规则
+
+        格式: TYPE,VALUE,ACTION 或 MATCH,ACTION
+            DOMAIN,example.com,direct
+            DOMAIN-SUFFIX,example.com,<upstream组名>
+            IP-CIDR,10.0.0.0/8,direct
+            DST-PORT,25,reject
+            MATCH,direct
+        """
+        parts = [part.strip() for part in line.split(',')]
+        kind = parts[0].upper()
+        try:
+            if kind in ("MATCH", "FINAL"):
+                action = parts[1].lower()
+                if self.default is None:
+                    self.default = action
+            else:
+                value, action = parts[1], parts[2].lower()
+                if kind == "DOMAIN":
+                    self.domains.insert(value, action)
+                elif kind == "DOMAIN-SUFFIX":
+                    self.domains.insert("." + value.lstrip('.'), action)
+                elif kind in ("IP-CIDR", "IP-CIDR6"):
+                    self.cidrs.insert(value, action)
+                elif kind == "DST-PORT":
+                    low, high = parse_port_range(value)
+                    for port in range(low, high + 1):
+                        self.ports.setdefault(port, action)
+                else:
+                    raise RuleSyntaxError(f"{source}: 不支持的规则类型: {line}")
+        except (IndexError, ValueError) as e:
+            if isinstance(e, RuleSyntaxError):
+                raise
+            raise RuleSyntaxError(f"{source}: 无效的规则: {line}") from e
+
+        self.actions.add(action)
+        self.rule_count += 1
+
+    def match(self, host: str, port: int) -> Optional[str]:
+        """返回匹配的动作,无匹配返回默认动作"""
+        address = parse_address(host)
+        if address is not None:
+            action = self.cidrs.lookup(address)
+        else:
+            action = self.domains.lookup(host)
+        if action is not None:
+            return action
+        action = self.ports.get(port)
+        if action is not None:
+            return action
+        return self.default
+
+
+def _rules_digest(config: RoutingConfig) -> str:
+    """计算规则内容摘要,作为编译缓存的键"""
+    digest = hashlib.sha256(f"v{COMPILED_FORMAT_VERSION}\n".encode())
+    for rule in config.rules:
+        digest.update(rule.encode('utf-8') + b"\n")
+    for path in config.rule_files:
+        digest.update(f"\0{path}\0".encode('utf-8'))
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def compile_rules(config: RoutingConfig) -> CompiledRules:
+    """
+    编译路由规则,启用缓存时优先加载磁盘上的编译结果
+
+    Args:
+        config: 路由配置
+
+    Returns:
+        CompiledRules: 编译结果
+    """
+    digest = None
+    cache_path = Path(config.compiled_cache) if config.compiled_cache else None
+    if cache_path is not None:
+        digest = _rules_digest(config)
+        try:
+            with open(cache_path, 'rb') as f:
+                # 首行是摘要,与当前规则一致时才反序列化
+                if f.readline().rstrip(b"\n") == digest.encode('ascii'):
+                    compiled = pickle.load(f)
+                    if isinstance(compiled, CompiledRules):
+                        logger.info(
+                            "routing_rules_loaded", rules=compiled.rule_count, cache=str(cache_path)
+                        )
+                        return compiled
+        except Exception:
+            # 缓存损坏或不兼容时重新编译
+            pass
+
+    compiled = CompiledRules()
+    for rule in config.rules:
+        compiled.add_rule(rule)
+    for path in config.rule_files:
+        for rule in read_rule_file(path):
+            compiled.add_rule(rule, source=path)
+    logger.info("routing_rules_compiled", rules=compiled.rule_count)
+
+    if cache_path is not None:
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = cache_path.with_name(cache_path.name + ".tmp")
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(digest.encode('ascii') + b"\n")
+                pickle.dump(compiled, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, cache_path)
+        except OSError as e:
+            logger.warning("routing_cache_write_failed", path=str(cache_path), error=str(e))
+
+    return compiled
+
+
+class Router:
+    """路由决策器,带有限大小的LRU决策缓存"""
+
+    def __init__(self, config: RoutingConfig, default: str, upstream_names: Iterable[str]):
+        """
+        初始化路由器
+
+        Args:
+            config: 路由配置
+            default: 规则未匹配时的动作(direct 或上游代理组名)
+            upstream_names: 已定义的上游代理组名称
+
+        Raises:
+            RuleSyntaxError: 规则引用了未定义的上游代理组
+        """
+        self.config = config
+        self.rules = compile_rules(config)
+        self.default = self.rules.default or default
+
+        valid = {DIRECT, REJECT, *upstream_names}
+        unknown = (self.rules.actions | {self.default}) - valid
+        if unknown:
+            raise RuleSyntaxError(f"路由规则引用了未定义的上游代理组: {', '.join(sorted(unknown))}")
+
+        self._cache: "OrderedDict[Tuple[str, int], str]" = OrderedDict()
+        self._cache_size = config.decision_cache_size
+
+        # 统计
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def route(self, host: str, port: int) -> str:
+        """
+        计算目标的路由决策
+
+        Args:
+            host: 目标主机
+            port: 目标端口
+
+        Returns:
+            str: direct、reject 或上游代理组名
+        """
+        key = (host, port)
+        decision = self._cache.get(key)
+        if decision is not None:
+            self.cache_hits += 1
+            self._cache.move_to_end(key)
+            return decision
+
+        self.cache_misses += 1
+        decision = self.rules.match(host, port) or self.default
+        if self._cache_size:
+            self._cache[key] = decision
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return decision
+
+    def get_stats_dict(self) -> dict:
+        """获取路由统计信息"""
+        return {
+            "rules": self.rules.rule_count,
+            "cache_entries": len(self._cache),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+        }
+
+
+def create_router(
+    config: Optional[RoutingConfig],
+    default: str,
+    upstream_names: List[str]
+) -> Optional[Router]:
+    """
+    创建路由器
+
+    Args:
+        config: 路由配置
+        default: 规则未匹配时的动作
+        upstream_names: 已定义的上游代理组名称
+
+    Returns:
+        Optional[Router]: 未启用时返回None
+    """
+    if not config or not config.enabled:
+        return None
+    return Router(config, default, upstream_names)
@@ -0,0 +1,117 @@
+"""基于事件循环延迟的负载削减模块"""
+
+import random
+from typing import Optional
+
+from .config import LoadSheddingConfig
+from .logger import get_logger
+from .profiler import LoopMonitor
+
+logger = get_logger(__name__)
+
+
+class LoadShedder:
+    """
+    负载削减控制器
+
+    从事件循环监控(LoopMonitor)的心跳读取延迟并做指数平滑;平滑后的延迟超过阈值时,
+    每个心跳周期将新连接的拒绝比例提高 step,恢复后逐步降低,拒绝比例不超过
+    max_shed_ratio。只影响新连接,已建立的隧道不受影响。
+    """
+
+    def __init__(self, config: LoadSheddingConfig, monitor: Optional[LoopMonitor] = None):
+        """
+        初始化负载削减控制器
+
+        Args:
+            config: 负载削减配置
+            monitor: 共用的事件循环监控(由管理接口启停),为None时使用自有的监控
+        """
+        self.config = config
+        # 自有的监控只运行心跳,不启动看门狗线程
+        self._owns_monitor = monitor is None
+        self.monitor = monitor or LoopMonitor(config.interval, watchdog=False)
+        self.smoothed_lag = 0.0
+        self.shed_ratio = 0.0
+        self.overloaded = False
+
+        # 统计
+        self.admitted = 0
+        self.shed = 0
+
+    def start(self) -> None:
+        """在当前事件循环中开始接收延迟测量"""
+        self.monitor.add_listener(self.observe)
+        if self._owns_monitor:
+            self.monitor.start()
+
+    def stop(self) -> None:
+        """停止接收延迟测量"""
+        self.monitor.remove_listener(self.observe)
+        if self._owns_monitor:
+            self.monitor.stop()
+
+    def observe(self, lag: float) -> None:
+        """
+        心跳回调: 按本次测量的延迟调整拒绝比例
+
+        Args:
+            lag: 事件循环延迟(秒)
+        """
+        config = self.config
+        self.smoothed_lag += config.smoothing * (lag - self.smoothed_lag)
+
+        if self.smoothed_lag > config.lag_threshold:
+            self.shed_ratio = min(config.max_shed_ratio, self.shed_ratio + config.step)
+        elif self.shed_ratio > 0:
+            self.shed_ratio = max(0.0, self.shed_ratio - config.step)
+
+        overloaded = self.shed_ratio > 0
+        if overloaded != self.overloaded:
+            self.overloaded = overloaded
+            if overloaded:
+                logger.warning("load_shedding_started", lag_ms=round(self.smoothed_lag * 1000, 1))
+            else:
+                logger.info("load_shedding_stopped", shed=self.shed)
+
+    def admit(self) -> bool:
+        """
+        判断是否接受新连接
+
+        Returns:
+            bool: False表示应拒绝该连接
+        """
+        if self.shed_ratio > 0 and random.random() < self.shed_ratio:
+            self.shed += 1
+            return False
+        self.admitted += 1
+        return True
+
+    def get_stats_dict(self) -> dict:
+        """获取负载削减统计信息"""
+        return {
+            "lag_ms": round(self.smoothed_lag * 1000, 3),
+            "lag": self.monitor.lag.get_stats_dict(),
+            "shed_ratio": round(self.shed_ratio, 3),
+            "admitted": self.admitted,
+            "shed": self.shed,
+        }
+
+
+def create_load_shedder(
+    config: Optional[LoadSheddingConfig],
+    monitor: Optional[LoopMonitor] = None
+) -> Optional[LoadShedder]:
+    """
+    创建负载削减控制器
+
+    Args:
+        config: 负载削减配置
+        monitor: 已有的事件循环监控,提供时共用其心跳
+
+    Returns:
+        Optional[LoadShedder]: 未启用时返回None
+    """
+    if not config or not config.enabled:
+        return None
+    return LoadShedder(config, monitor)
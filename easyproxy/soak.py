@@ -0,0 +1,432 @@
+"""并发压测与单连接内存分析模块"""
+
+import asyncio
+import gc
+import json
+import os
+import random
+import struct
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+PROTOCOLS = ("http", "https", "socks5")
+
+# 代理子进程的控制通道: 父进程按行发送命令,子进程以该前缀输出一行JSON作为应答,
+# 其余输出(如代理日志)被忽略
+_REPLY_PREFIX = "SOAK "
+_SERVER_SCRIPT = "import sys; from easyproxy.soak import serve; serve(*sys.argv[1:])"
+
+# 同时进行握手的连接数
+OPEN_CONCURRENCY = 256
+
+
+def _raise_fd_limit() -> None:
+    """将文件描述符软限制提高到硬限制"""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def _rss() -> int:
+    """当前进程的常驻内存(字节)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        # 非Linux平台只能取到峰值
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# =============================================================================
+# 代理子进程
+# =============================================================================
+
+def serve(trace_frames: str = "0", config_path: str = "") -> None:
+    """
+    在子进程中运行被测代理,并通过标准输入输出响应控制命令
+
+    命令: sample(回收垃圾后采样)、baseline(采样并记录 tracemalloc 基线)、
+    top(相对基线增长最多的分配位置)、exit
+
+    Args:
+        trace_frames: tracemalloc 记录的栈深度,0表示不启用
+        config_path: 配置文件路径,为空时使用默认配置
+    """
+    asyncio.run(_serve(int(trace_frames), config_path))
+
+
+def _test_config(config_path: str):
+    """
+    被测代理的配置
+
+    使用配置文件中的转发和调优参数;监听、认证、访问控制、路由、上游代理、配额、
+    钩子和管理接口被忽略,只在本机随机端口上监听,使测试连接可以直达本地源站。
+    """
+    from .config import ProxyConfig, load_config
+
+    if not config_path:
+        config = ProxyConfig(host="127.0.0.1", log_level="WARNING", access_log=False)
+    else:
+        config = load_config(config_path).model_copy(update={
+            "host": "127.0.0.1",
+            "listeners": [],
+            "log_level": "WARNING",
+            "log_file": None,
+            "access_log": False,
+            "auth": None,
+            "acl": None,
+            "routing": None,
+            "upstream": None,
+            "quota": None,
+            "hooks": [],
+            "tls": None,
+            "admin": None,
+        })
+    config.port = 0
+    return config
+
+
+async def _serve(trace_frames: int, config_path: str) -> None:
+    _raise_fd_limit()
+    if trace_frames:
+        tracemalloc.start(trace_frames)
+
+    from .proxy import SimpleHTTPProxy
+
+    config = _test_config(config_path)
+    proxy = SimpleHTTPProxy(config)
+    await proxy.listen()
+
+    loop = asyncio.get_running_loop()
+    commands = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(commands), sys.stdin)
+
+    def sample() -> dict:
+        gc.collect()
+        return {
+            "time": time.monotonic(),
+            "rss": _rss(),
+            "traced": tracemalloc.get_traced_memory()[0] if trace_frames else None,
+            "connections": len(proxy.registry),
+        }
+
+    def reply(data: dict) -> None:
+        sys.stdout.write(_REPLY_PREFIX + json.dumps(data) + "\n")
+        sys.stdout.flush()
+
+    baseline = None
+    reply({"port": proxy.server.sockets[0].getsockname()[1], **sample()})
+    while True:
+        command = (await commands.readline()).decode().strip()
+        if command == "sample":
+            reply(sample())
+        elif command == "baseline":
+            data = sample()
+            baseline = tracemalloc.take_snapshot() if trace_frames else None
+            reply(data)
+        elif command == "top":
+            top = []
+            if baseline is not None:
+                gc.collect()
+                stats = tracemalloc.take_snapshot().compare_to(baseline, "lineno")
+                top = [
+                    {"where": str(stat.traceback), "size_diff": stat.size_diff, "count_diff": stat.count_diff}
+                    for stat in stats[:10]
+                ]
+            reply({"top": top})
+        else:
+            break
+    await proxy.stop()
+
+
+class _ProxyProcess:
+    """被测代理子进程"""
+
+    def __init__(self, process: asyncio.subprocess.Process, port: int):
+        self.process = process
+        self.port = port
+
+    @classmethod
+    async def start(
+        cls,
+        trace_frames: int = 0,
+        config_path: Optional[str] = None
+    ) -> Tuple["_ProxyProcess", dict]:
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-c", _SERVER_SCRIPT, str(trace_frames), config_path or "",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            limit=1024 * 1024
+        )
+        self = cls(process, 0)
+        first = await self._read_reply()
+        self.port = first["port"]
+        return self, first
+
+    async def _read_reply(self) -> dict:
+        while True:
+            line = await self.process.stdout.readline()
+            if not line:
+                raise RuntimeError("被测代理进程已退出")
+            line = line.decode('utf-8', errors='replace')
+            if line.startswith(_REPLY_PREFIX):
+                return json.loads(line[len(_REPLY_PREFIX):])
+
+    async def request(self, command: str) -> dict:
+        self.process.stdin.write(command.encode() + b"\n")
+        await self.process.stdin.drain()
+        return await self._read_reply()
+
+    async def close(self) -> None:
+        if self.process.returncode is None:
+            self.process.stdin.write(b"exit\n")
+            await self.process.stdin.drain()
+            try:
+                await asyncio.wait_for(self.process.wait(), 10)
+            except asyncio.TimeoutError:
+                self.process.kill()
+                await self.process.wait()
+
+
+# =============================================================================
+# 源站与客户端
+# =============================================================================
+
+async def _echo(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def _http_origin(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """读取请求头后返回响应头,随后回显客户端数据,使明文HTTP连接保持在中继状态"""
+    try:
+        await reader.readuntil(b"\r\n\r\n")
+    except (asyncio.IncompleteReadError, ConnectionError):
+        writer.close()
+        return
+    writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/octet-stream\r\nConnection: close\r\n\r\n")
+    await _echo(reader, writer)
+
+
+async def _open_connection(
+    protocol: str,
+    proxy_port: int,
+    echo_port: int,
+    http_port: int
+) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    """经代理建立一条到源站的连接,返回时已进入中继状态"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", proxy_port)
+    try:
+        if protocol == "https":
+            writer.write(f"CONNECT 127.0.0.1:{echo_port} HTTP/1.1\r\n\r\n".encode())
+            head = await reader.readuntil(b"\r\n\r\n")
+            if b" 200 " not in head.split(b"\r\n", 1)[0]:
+                raise ConnectionError(head.split(b"\r\n", 1)[0].decode('latin-1'))
+        elif protocol == "socks5":
+            writer.write(b"\x05\x01\x00")
+            if await reader.readexactly(2) != b"\x05\x00":
+                raise ConnectionError("SOCKS5握手失败")
+            writer.write(b"\x05\x01\x00\x01\x7f\x00\x00\x01" + struct.pack("!H", echo_port))
+            reply = await reader.readexactly(10)
+            if reply[1] != 0x00:
+                raise ConnectionError(f"SOCKS5连接失败: REP={reply[1]}")
+        else:
+            writer.write(
+                f"GET http://127.0.0.1:{http_port}/ HTTP/1.1\r\nHost: 127.0.0.1:{http_port}\r\n\r\n".encode()
+            )
+            head = await reader.readuntil(b"\r\n\r\n")
+            if b" 200 " not in head.split(b"\r\n", 1)[0]:
+                raise ConnectionError(head.split(b"\r\n", 1)[0].decode('latin-1'))
+    except BaseException:
+        writer.close()
+        raise
+    return reader, writer
+
+
+async def _exchange(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    payload: bytes,
+    interval: float,
+    stop_at: float
+) -> int:
+    """按间隔发送数据并等待回显,返回往返的字节数"""
+    total = 0
+    # 错开各连接的发送时间
+    await asyncio.sleep(random.random() * interval)
+    while time.monotonic() < stop_at:
+        writer.write(payload)
+        await writer.drain()
+        await reader.readexactly(len(payload))
+        total += 2 * len(payload)
+        await asyncio.sleep(interval)
+    return total
+
+
+def _slope(points: Sequence[Tuple[float, float]]) -> float:
+    """最小二乘拟合的斜率"""
+    if len(points) < 2:
+        return 0.0
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    var = sum((x - mean_x) ** 2 for x, _ in points)
+    if not var:
+        return 0.0
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / var
+
+
+# =============================================================================
+# 压测流程
+# =============================================================================
+
+async def run_soak(
+    connections: int = 1000,
+    protocols: Sequence[str] = PROTOCOLS,
+    duration: float = 30,
+    interval: float = 1.0,
+    payload_size: int = 512,
+    sample_interval: float = 5,
+    cycles: int = 1,
+    trace_frames: int = 0,
+    config_path: Optional[str] = None,
+    report: Callable[[str], None] = lambda message: None
+) -> dict:
+    """
+    经本地代理建立大量并发连接,测量每连接内存占用和长时间运行的内存增长趋势
+
+    每个协议、每一轮依次执行: 建立 connections 条空闲连接并采样 → 所有连接按
+    interval 收发 payload_size 字节持续 duration 秒并定期采样 → 关闭全部连接,
+    等待代理释放后采样。代理运行在独立子进程中,采样的RSS不包含客户端和源站。
+
+    Args:
+        connections: 每个协议的并发连接数
+        protocols: 测试的协议
+        duration: 活跃阶段时长(秒)
+        interval: 活跃阶段每条连接的收发间隔(秒)
+        payload_size: 每次发送的字节数
+        sample_interval: 活跃阶段的采样间隔(秒)
+        cycles: 每个协议重复的轮数,关闭后RSS逐轮增长提示存在泄漏
+        trace_frames: tracemalloc 记录的栈深度,0表示不启用
+        config_path: 被测代理使用的配置文件,见 _test_config()
+        report: 进度输出回调
+
+    Returns:
+        dict: 每个协议的测量结果和全部采样
+    """
+    _raise_fd_limit()
+    echo_server = await asyncio.start_server(_echo, "127.0.0.1", 0)
+    http_server = await asyncio.start_server(_http_origin, "127.0.0.1", 0)
+    echo_port = echo_server.sockets[0].getsockname()[1]
+    http_port = http_server.sockets[0].getsockname()[1]
+    proxy, started = await _ProxyProcess.start(trace_frames, config_path)
+    payload = os.urandom(payload_size)
+    results: Dict[str, dict] = {}
+
+    try:
+        report(f"被测代理进程 pid={proxy.process.pid} 端口={proxy.port} 初始RSS={started['rss']}")
+        for protocol in protocols:
+            baseline = await proxy.request("baseline")
+            rounds = []
+            for cycle in range(cycles):
+                before = await proxy.request("sample")
+
+                # 建立空闲连接
+                semaphore = asyncio.Semaphore(OPEN_CONCURRENCY)
+
+                async def open_one():
+                    async with semaphore:
+                        return await _open_connection(protocol, proxy.port, echo_port, http_port)
+
+                opened = await asyncio.gather(
+                    *(open_one() for _ in range(connections)), return_exceptions=True
+                )
+                streams = [item for item in opened if not isinstance(item, BaseException)]
+                failures = [item for item in opened if isinstance(item, BaseException)]
+                idle = await proxy.request("sample")
+                report(
+                    f"[{protocol} #{cycle + 1}] 已建立 {len(streams)} 条连接"
+                    + (f",失败 {len(failures)} 条 ({failures[0]!r})" if failures else "")
+                )
+
+                # 活跃阶段
+                stop_at = time.monotonic() + duration
+                tasks = [
+                    asyncio.create_task(_exchange(reader, writer, payload, interval, stop_at))
+                    for reader, writer in streams
+                ]
+                samples = [idle]
+                while time.monotonic() < stop_at:
+                    await asyncio.sleep(min(sample_interval, max(stop_at - time.monotonic(), 0)))
+                    samples.append(await proxy.request("sample"))
+                    report(
+                        f"[{protocol} #{cycle + 1}] 连接 {samples[-1]['connections']} "
+                        f"RSS {samples[-1]['rss']}"
+                    )
+                exchanged = await asyncio.gather(*tasks, return_exceptions=True)
+                errors = sum(1 for item in exchanged if isinstance(item, BaseException))
+                transferred = sum(item for item in exchanged if not isinstance(item, BaseException))
+                active = await proxy.request("sample")
+
+                # 关闭并等待代理释放连接
+                for _, writer in streams:
+                    writer.close()
+                deadline = time.monotonic() + 30
+                after = await proxy.request("sample")
+                while after["connections"] and time.monotonic() < deadline:
+                    await asyncio.sleep(0.5)
+                    after = await proxy.request("sample")
+
+                count = max(len(streams), 1)
+                rounds.append({
+                    "connections": len(streams),
+                    "open_failures": len(failures),
+                    "exchange_errors": errors,
+                    "bytes_transferred": transferred,
+                    "idle_rss_per_connection": (idle["rss"] - before["rss"]) / count,
+                    "active_rss_per_connection": (active["rss"] - before["rss"]) / count,
+                    "idle_traced_per_connection": (
+                        (idle["traced"] - before["traced"]) / count if before["traced"] is not None else None
+                    ),
+                    "rss_trend_per_minute": _slope(
+                        [(s["time"], s["rss"]) for s in samples]
+                    ) * 60,
+                    "retained_rss": after["rss"] - before["rss"],
+                    "rss_after_close": after["rss"],
+                    "samples": [before] + samples + [active, after],
+                })
+
+            results[protocol] = {
+                "rounds": rounds,
+                "rss_growth_across_rounds": rounds[-1]["rss_after_close"] - baseline["rss"],
+                "top_allocations": (await proxy.request("top"))["top"] if trace_frames else [],
+            }
+    finally:
+        await proxy.close()
+        echo_server.close()
+        http_server.close()
+
+    return {
+        "connections": connections,
+        "duration": duration,
+        "interval": interval,
+        "payload_size": payload_size,
+        "cycles": cycles,
+        "protocols": results,
+    }
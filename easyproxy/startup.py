@@ -0,0 +1,141 @@
+"""启动耗时分析模块"""
+
+import json
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+# 启动阶段(按执行顺序)及显示名称
+PHASES = (
+    ("import_config", "导入配置模块"),
+    ("load_config", "加载配置"),
+    ("import_proxy", "导入代理模块"),
+    ("init_proxy", "初始化代理"),
+    ("listen", "绑定监听端口"),
+)
+
+# 子进程中执行的启动探测脚本,参数: 配置文件 快照路径 父进程启动子进程的时间
+_PROBE_SCRIPT = "import sys; from easyproxy.startup import probe; probe(*sys.argv[1:])"
+
+# (模块名, 自身耗时us, 累计耗时us, 导入层级)
+ImportRecord = Tuple[str, int, int, int]
+
+
+def parse_importtime(output: str) -> List[ImportRecord]:
+    """解析 python -X importtime 的输出"""
+    records = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            self_us, cumulative_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            # 表头行
+            continue
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        records.append((name.strip(), self_us, cumulative_us, depth))
+    return records
+
+
+def import_time_by_package(records: List[ImportRecord]) -> Dict[str, int]:
+    """按顶层包汇总导入的自身耗时(微秒)"""
+    totals: Dict[str, int] = defaultdict(int)
+    for name, self_us, _, _ in records:
+        totals[name.partition('.')[0]] += self_us
+    return dict(totals)
+
+
+def probe(config_path: str, snapshot_path: str, spawned_at: str) -> None:
+    """
+    执行一次启动直到开始监听,并将各阶段耗时(毫秒)以JSON输出到标准输出
+
+    在 measure_startup() 启动的子进程中调用。监听端口改为0(由系统分配),
+    不会与正在运行的实例冲突;监听建立后立即关闭。
+    """
+    phases = {}
+    last = time.perf_counter()
+
+    def mark(phase: str) -> None:
+        nonlocal last
+        now = time.perf_counter()
+        phases[phase] = round((now - last) * 1000, 3)
+        last = now
+
+    from .config import load_config
+    mark("import_config")
+
+    config = load_config(config_path or None, snapshot_path or None)
+    mark("load_config")
+
+    import asyncio
+    from .proxy import SimpleHTTPProxy
+    mark("import_proxy")
+
+    config.port = 0
+    for listener in config.listeners:
+        listener.port = 0
+    if config.tls is not None:
+        config.tls.port = 0
+    if config.admin is not None:
+        config.admin.port = 0
+    config.log_file = None
+    config.log_level = "WARNING"
+    proxy = SimpleHTTPProxy(config)
+    mark("init_proxy")
+
+    async def listen() -> float:
+        await proxy.listen()
+        listening_at = time.time()
+        await proxy.stop()
+        return listening_at
+
+    listening_at = asyncio.run(listen())
+    mark("listen")
+
+    print(json.dumps({
+        "phases": phases,
+        "exec_to_listen_ms": round((listening_at - float(spawned_at)) * 1000, 3),
+    }))
+
+
+def measure_startup(
+    config_path: Optional[str] = None,
+    snapshot_path: Optional[str] = None,
+    python: str = sys.executable
+) -> dict:
+    """
+    在新的解释器进程中测量启动耗时
+
+    Args:
+        config_path: 配置文件路径
+        snapshot_path: 配置快照路径
+        python: 解释器路径
+
+    Returns:
+        dict: phases(各阶段耗时)、exec_to_listen_ms(从创建进程到开始监听的耗时)、
+            imports(-X importtime 的解析结果)
+    """
+    spawned_at = time.time()
+    result = subprocess.run(
+        [
+            python, "-X", "importtime", "-c", _PROBE_SCRIPT,
+            str(config_path or ""), str(snapshot_path or ""), repr(spawned_at),
+        ],
+        capture_output=True,
+        text=True,
+        timeout=60
+    )
+    lines = result.stdout.strip().splitlines()
+    if result.returncode != 0 or not lines:
+        errors = [line for line in result.stderr.splitlines() if not line.startswith("import time:")]
+        raise RuntimeError(errors[-1] if errors else f"启动探测进程退出码 {result.returncode}")
+
+    data = json.loads(lines[-1])
+    data["imports"] = parse_importtime(result.stderr)
+    return data
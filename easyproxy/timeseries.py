@@ -0,0 +1,219 @@
+"""吞吐与连接速率的时间序列模块"""
+
+import asyncio
+import time
+from array import array
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from .logger import ConnectionStats
+    from .registry import ConnectionRegistry
+
+PROTOCOLS = ("http", "https", "socks5", "mux")
+
+# 计数类指标: 每个采样周期内的增量,汇总时求和
+COUNTERS = ("connections", "bytes_sent", "bytes_received", "errors") + tuple(
+    f"{name}.{protocol}"
+    for name in ("connections", "bytes_sent", "bytes_received")
+    for protocol in PROTOCOLS
+)
+# 状态类指标: 采样时刻的值,汇总时取最大值
+GAUGES = ("active",)
+METRICS = COUNTERS + GAUGES
+
+# 分辨率名称及采样周期(秒)
+RESOLUTIONS = {"second": 1, "minute": 60, "hour": 3600}
+
+
+class Ring:
+    """固定容量的环形缓冲区,按指标分列存储,写满后覆盖最旧的采样"""
+
+    def __init__(self, interval: int, capacity: int):
+        """
+        初始化环形缓冲区
+
+        Args:
+            interval: 采样周期(秒)
+            capacity: 保留的采样数量
+        """
+        self.interval = interval
+        self.capacity = capacity
+        self.times = array('q', [0]) * capacity
+        self.columns = {metric: array('q', [0]) * capacity for metric in METRICS}
+        self.next = 0
+        self.size = 0
+
+    def append(self, timestamp: int, values: Dict[str, int]) -> None:
+        """追加一个采样"""
+        i = self.next
+        self.times[i] = timestamp
+        for metric, column in self.columns.items():
+            column[i] = values[metric]
+        self.next = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def query(self, last: int) -> dict:
+        """
+        按时间顺序取最近的采样
+
+        Args:
+            last: 采样数量
+
+        Returns:
+            dict: interval、time(每个采样周期的开始时间)和按指标分列的值
+        """
+        count = max(0, min(last, self.size))
+        start = (self.next - count) % self.capacity
+        indexes = [(start + k) % self.capacity for k in range(count)]
+        return {
+            "interval": self.interval,
+            "time": [self.times[i] for i in indexes],
+            "metrics": {
+                metric: [column[i] for i in indexes] for metric, column in self.columns.items()
+            },
+        }
+
+
+class TimeSeriesRecorder:
+    """
+    时间序列记录器
+
+    单个定时任务每秒读取一次累计计数,将增量写入秒级环形缓冲区,并同时汇总到分钟级和
+    小时级缓冲区。只在进程内存中保留最近的数据,不依赖外部存储。
+    """
+
+    def __init__(
+        self,
+        stats: "ConnectionStats",
+        registry: "ConnectionRegistry",
+        seconds: int = 3600,
+        minutes: int = 1440,
+        hours: int = 168
+    ):
+        """
+        初始化时间序列记录器
+
+        Args:
+            stats: 连接统计
+            registry: 活跃连接登记表
+            seconds: 保留的秒级采样数量
+            minutes: 保留的分钟级采样数量
+            hours: 保留的小时级采样数量
+        """
+        self.stats = stats
+        self.registry = registry
+        self.rings = {
+            "second": Ring(RESOLUTIONS["second"], seconds),
+            "minute": Ring(RESOLUTIONS["minute"], minutes),
+            "hour": Ring(RESOLUTIONS["hour"], hours),
+        }
+        # 正在汇总的分钟/小时采样: (周期开始时间, 值)
+        self._buckets: Dict[str, Tuple[int, Dict[str, int]]] = {}
+        self._last = self._read()
+        self._task: Optional[asyncio.Task] = None
+
+    def _read(self) -> Dict[str, int]:
+        """读取累计计数(先计入活跃连接的流量增量,使每秒采样不依赖统计的采集间隔)"""
+        stats = self.stats
+        stats.collect(self.registry)
+        values = {
+            "connections": stats.total_connections,
+            "bytes_sent": stats.total_bytes_sent,
+            "bytes_received": stats.total_bytes_received,
+            "errors": stats.error_count,
+        }
+        for protocol in PROTOCOLS:
+            sent, received = stats.traffic_by_protocol[protocol]
+            values[f"connections.{protocol}"] = stats.connections_by_protocol[protocol]
+            values[f"bytes_sent.{protocol}"] = sent
+            values[f"bytes_received.{protocol}"] = received
+        return values
+
+    def tick(self, timestamp: int) -> None:
+        """
+        记录一个秒级采样
+
+        Args:
+            timestamp: 采样所属的秒(Unix时间)
+        """
+        current = self._read()
+        last = self._last
+        sample = {metric: current[metric] - last[metric] for metric in COUNTERS}
+        sample["active"] = len(self.registry)
+        self._last = current
+
+        self.rings["second"].append(timestamp, sample)
+        for resolution in ("minute", "hour"):
+            self._rollup(resolution, timestamp, sample)
+
+    def _rollup(self, resolution: str, timestamp: int, sample: Dict[str, int]) -> None:
+        ring = self.rings[resolution]
+        start = timestamp - timestamp % ring.interval
+        bucket = self._buckets.get(resolution)
+        if bucket is not None and bucket[0] != start:
+            ring.append(*bucket)
+            bucket = None
+        if bucket is None:
+            self._buckets[resolution] = (start, dict(sample))
+            return
+        values = bucket[1]
+        for metric in COUNTERS:
+            values[metric] += sample[metric]
+        for metric in GAUGES:
+            values[metric] = max(values[metric], sample[metric])
+
+    def start(self) -> None:
+        """在当前事件循环中启动采样"""
+        self._last = self._read()
+        self._task = asyncio.get_running_loop().create_task(
+            self._run(), name="easyproxy-timeseries"
+        )
+
+    def stop(self) -> None:
+        """停止采样"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            # 对齐到整秒
+            await asyncio.sleep(1 - time.time() % 1)
+            self.tick(round(time.time()))
+
+    def query(self, resolution: str = "second", last: int = 60) -> dict:
+        """
+        查询最近的采样
+
+        Args:
+            resolution: second / minute / hour
+            last: 采样数量
+
+        Returns:
+            dict: 见 Ring.query()
+        """
+        return {"resolution": resolution, **self.rings[resolution].query(last)}
+
+    def capacity(self) -> Dict[str, int]:
+        """各分辨率保留的采样数量"""
+        return {resolution: ring.capacity for resolution, ring in self.rings.items()}
+
+
+def rates(data: dict) -> List[Dict[str, float]]:
+    """
+    将查询结果转换为按采样排列的每秒速率(状态类指标保持原值)
+
+    Args:
+        data: TimeSeriesRecorder.query() 的结果
+
+    Returns:
+        List[Dict[str, float]]: 每个采样一个字典,包含 time 和各指标
+    """
+    interval = data["interval"]
+    rows = []
+    for i, timestamp in enumerate(data["time"]):
+        row: Dict[str, float] = {"time": timestamp}
+        for metric, values in data["metrics"].items():
+            row[metric] = values[i] if metric in GAUGES else values[i] / interval
+        rows.append(row)
+    return rows
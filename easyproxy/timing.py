@@ -0,0 +1,123 @@
+"""连接分阶段计时模块"""
+
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional
+
+# 直方图桶上界(毫秒),最后一个桶收集所有更大的值
+HISTOGRAM_BOUNDS_MS = (
+    0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000,
+)
+
+
+class PhaseTimer:
+    """
+    单个连接的分阶段计时器
+
+    使用单调时钟,每次 mark() 记录从上一个标记到现在的耗时并计入该阶段;
+    同名阶段多次标记时耗时累加(如SOCKS5的协商和请求都计入 headers)。
+    """
+
+    __slots__ = ("start", "last", "phases")
+
+    def __init__(self, start: Optional[float] = None):
+        self.start = time.monotonic() if start is None else start
+        self.last = self.start
+        self.phases: Dict[str, float] = {}
+
+    def mark(self, phase: str) -> None:
+        """结束当前阶段"""
+        self.mark_at(phase, time.monotonic())
+
+    def mark_at(self, phase: str, timestamp: float) -> None:
+        """以指定的单调时钟时间结束当前阶段"""
+        if timestamp < self.last:
+            timestamp = self.last
+        self.phases[phase] = self.phases.get(phase, 0.0) + (timestamp - self.last)
+        self.last = timestamp
+
+    def elapsed(self) -> float:
+        """从开始到现在的耗时(秒)"""
+        return time.monotonic() - self.start
+
+    def as_dict(self) -> Dict[str, float]:
+        """各阶段耗时(毫秒)"""
+        return {phase: round(seconds * 1000, 3) for phase, seconds in self.phases.items()}
+
+
+class Histogram:
+    """固定桶边界的耗时直方图"""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts: List[int] = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value_ms: float) -> None:
+        self.counts[bisect_left(HISTOGRAM_BOUNDS_MS, value_ms)] += 1
+        self.count += 1
+        self.total += value_ms
+        if value_ms > self.max:
+            self.max = value_ms
+
+    def quantile(self, q: float) -> float:
+        """按桶上界估算分位数(毫秒)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return HISTOGRAM_BOUNDS_MS[index] if index < len(HISTOGRAM_BOUNDS_MS) else self.max
+        return self.max
+
+    def get_stats_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max, 3),
+            "p50_ms": self.quantile(0.5),
+            "p90_ms": self.quantile(0.9),
+            "p99_ms": self.quantile(0.99),
+            "buckets": {
+                (f"le_{bound}" if index < len(HISTOGRAM_BOUNDS_MS) else "inf"): n
+                for index, (bound, n) in enumerate(
+                    zip(HISTOGRAM_BOUNDS_MS + (None,), self.counts)
+                )
+                if n
+            },
+        }
+
+
+class PhaseHistograms:
+    """按阶段汇总所有连接的耗时分布"""
+
+    def __init__(self):
+        self.histograms: Dict[str, Histogram] = {}
+
+    def observe(self, timer: PhaseTimer, total_ms: float) -> None:
+        """
+        记录一个已结束连接的各阶段耗时
+
+        Args:
+            timer: 连接的分阶段计时器
+            total_ms: 连接总耗时(毫秒)
+        """
+        histograms = self.histograms
+        for phase, seconds in timer.phases.items():
+            histogram = histograms.get(phase)
+            if histogram is None:
+                histogram = histograms[phase] = Histogram()
+            histogram.observe(seconds * 1000)
+        total = histograms.get("total")
+        if total is None:
+            total = histograms["total"] = Histogram()
+        total.observe(total_ms)
+
+    def get_stats_dict(self) -> dict:
+        """获取各阶段耗时分布"""
+        return {phase: histogram.get_stats_dict() for phase, histogram in self.histograms.items()}
@@ -0,0 +1,132 @@
+"""TLS监听模块"""
+
+import asyncio
+import ssl
+import time
+from typing import Optional
+
+from .config import TLSConfig
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def create_ssl_context(config: TLSConfig) -> ssl.SSLContext:
+    """
+    创建服务端TLS上下文
+
+    OpenSSL 默认启用服务端会话缓存(TLS 1.2 会话ID);TLS 1.3 与 TLS 1.2
+    的会话票据由上下文内随机生成的密钥加密,进程运行期间重连的客户端可以跳过完整握手。
+
+    Args:
+        config: TLS配置
+
+    Returns:
+        ssl.SSLContext: 服务端TLS上下文
+    """
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.minimum_version = getattr(ssl.TLSVersion, config.min_version.replace('.', '_'))
+    context.load_cert_chain(config.certfile, config.keyfile)
+    if config.alpn_protocols:
+        context.set_alpn_protocols(config.alpn_protocols)
+
+    if config.session_tickets:
+        context.num_tickets = config.num_tickets
+    else:
+        context.options |= ssl.OP_NO_TICKET
+        context.num_tickets = 0
+    return context
+
+
+class TLSAcceptor:
+    """TLS握手处理与统计"""
+
+    def __init__(self, config: TLSConfig):
+        """
+        初始化TLS握手处理
+
+        Args:
+            config: TLS配置
+        """
+        self.config = config
+        self.context = create_ssl_context(config)
+
+        # 统计
+        self.full_handshakes = 0
+        self.resumed_handshakes = 0
+        self.failed_handshakes = 0
+        self.handshake_time_total = 0.0
+        self.handshake_time_max = 0.0
+        self.resumed_time_total = 0.0
+
+    async def handshake(self, writer: asyncio.StreamWriter) -> bool:
+        """
+        在已接受的连接上完成服务端TLS握手
+
+        握手成功后 writer 及其 reader 透明地切换到TLS传输。
+
+        Args:
+            writer: 客户端连接的写入流
+
+        Returns:
+            bool: 握手是否成功
+        """
+        start = time.perf_counter()
+        try:
+            await writer.start_tls(
+                self.context,
+                ssl_handshake_timeout=self.config.handshake_timeout
+            )
+        except (ssl.SSLError, ConnectionError, asyncio.TimeoutError, OSError) as e:
+            self.failed_handshakes += 1
+            logger.debug("tls_handshake_failed", error=str(e) or type(e).__name__)
+            return False
+
+        elapsed = time.perf_counter() - start
+        ssl_object = writer.get_extra_info('ssl_object')
+        if ssl_object is not None and ssl_object.session_reused:
+            self.resumed_handshakes += 1
+            self.resumed_time_total += elapsed
+        else:
+            self.full_handshakes += 1
+        self.handshake_time_total += elapsed
+        if elapsed > self.handshake_time_max:
+            self.handshake_time_max = elapsed
+        return True
+
+    def get_stats_dict(self) -> dict:
+        """获取TLS握手统计信息"""
+        completed = self.full_handshakes + self.resumed_handshakes
+        full_time_total = self.handshake_time_total - self.resumed_time_total
+        return {
+            "full_handshakes": self.full_handshakes,
+            "resumed_handshakes": self.resumed_handshakes,
+            "failed_handshakes": self.failed_handshakes,
+            "resumption_rate": round(self.resumed_handshakes / completed, 4) if completed else 0.0,
+            "avg_handshake_ms": round(self.handshake_time_total / completed * 1000, 3) if completed else 0.0,
+            "avg_full_handshake_ms": (
+                round(full_time_total / self.full_handshakes * 1000, 3)
+                if self.full_handshakes else 0.0
+            ),
+            "avg_resumed_handshake_ms": (
+                round(self.resumed_time_total / self.resumed_handshakes * 1000, 3)
+                if self.resumed_handshakes else 0.0
+            ),
+            "max_handshake_ms": round(self.handshake_time_max * 1000, 3),
+            "session_cache": self.context.session_stats(),
+        }
+
+
+def create_tls_acceptor(config: Optional[TLSConfig]) -> Optional[TLSAcceptor]:
+    """
+    创建TLS握手处理
+
+    Args:
+        config: TLS配置
+
+    Returns:
+        Optional[TLSAcceptor]: 未启用时返回None
+    """
+    if not config or not config.enabled:
+        return None
+    return TLSAcceptor(config)
@@ -0,0 +1,247 @@
+"""socket调优与中继缓冲区分级模块"""
+
+import asyncio
+import socket
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from .buffers import TieredBufferPool
+from .config import ProxyConfig, SocketOptionsConfig
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+PROTOCOLS = ("http", "https", "socks5", "mux")
+
+# (level, option, value)
+SocketOption = Tuple[int, int, int]
+
+# Linux 4.11+ 支持,旧版本Python未导出该常量
+TCP_FASTOPEN_CONNECT = getattr(
+    socket, "TCP_FASTOPEN_CONNECT", 30 if sys.platform.startswith("linux") else None
+)
+
+
+def compile_socket_options(options: SocketOptionsConfig) -> List[SocketOption]:
+    """
+    将socket选项配置编译为 setsockopt 参数列表
+
+    当前平台不支持的选项会被跳过。
+
+    Args:
+        options: socket选项配置
+
+    Returns:
+        List[SocketOption]: (level, option, value) 列表
+    """
+    compiled: List[SocketOption] = []
+
+    def add(level: int, name: str, value: Optional[int]) -> None:
+        if value is None:
+            return
+        option = getattr(socket, name, None)
+        if option is None:
+            logger.warning("socket_option_unsupported", option=name)
+            return
+        compiled.append((level, option, int(value)))
+
+    add(socket.IPPROTO_TCP, "TCP_NODELAY", options.tcp_nodelay)
+    add(socket.SOL_SOCKET, "SO_SNDBUF", options.send_buffer)
+    add(socket.SOL_SOCKET, "SO_RCVBUF", options.recv_buffer)
+    add(socket.IPPROTO_TCP, "TCP_NOTSENT_LOWAT", options.notsent_lowat)
+    add(socket.SOL_SOCKET, "SO_KEEPALIVE", options.keepalive)
+    # macOS 上空闲时间选项名为 TCP_KEEPALIVE
+    idle_name = "TCP_KEEPIDLE" if hasattr(socket, "TCP_KEEPIDLE") else "TCP_KEEPALIVE"
+    add(socket.IPPROTO_TCP, idle_name, options.keepalive_idle)
+    add(socket.IPPROTO_TCP, "TCP_KEEPINTVL", options.keepalive_interval)
+    add(socket.IPPROTO_TCP, "TCP_KEEPCNT", options.keepalive_count)
+    return compiled
+
+
+def apply_socket_options(writer: asyncio.StreamWriter, options: List[SocketOption]) -> None:
+    """
+    对连接的底层socket应用选项
+
+    Args:
+        writer: 连接的写入流
+        options: compile_socket_options 的结果
+    """
+    if not options:
+        return
+    sock = writer.get_extra_info('socket')
+    if sock is None:
+        return
+    for level, option, value in options:
+        try:
+            sock.setsockopt(level, option, value)
+        except OSError as e:
+            logger.debug("setsockopt_failed", option=option, error=str(e))
+
+
+def configure_listener(server: asyncio.AbstractServer, fastopen: int = 0, defer_accept: int = 0) -> None:
+    """
+    对监听socket启用 TCP Fast Open 和 TCP_DEFER_ACCEPT
+
+    应在 start_serving() 之前调用。当前平台不支持的选项会被跳过。
+
+    Args:
+        server: asyncio.start_server(start_serving=False) 创建的服务器
+        fastopen: TCP_FASTOPEN 队列长度,0表示不启用
+        defer_accept: 等待客户端首个数据的最长秒数,0表示不启用
+    """
+    options = []
+    for name, value in (("TCP_FASTOPEN", fastopen), ("TCP_DEFER_ACCEPT", defer_accept)):
+        if not value:
+            continue
+        option = getattr(socket, name, None)
+        if option is None:
+            logger.warning("socket_option_unsupported", option=name)
+            continue
+        options.append((name, option, value))
+
+    for sock in server.sockets:
+        for name, option, value in options:
+            try:
+                sock.setsockopt(socket.IPPROTO_TCP, option, value)
+            except OSError as e:
+                logger.warning("setsockopt_failed", option=name, error=str(e))
+
+
+async def open_fastopen_connection(
+    host: str,
+    port: int
+) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    """
+    使用 TCP Fast Open 建立连接
+
+    已缓存对端cookie时,connect() 立即返回,首次写入的数据随SYN发送,
+    省去一次往返;否则退化为普通握手并获取cookie。连接被拒绝等错误
+    此时要到首次读写才会出现,且在发出SYN前无法获取对端地址。
+
+    Args:
+        host: 目标主机
+        port: 目标端口
+
+    Returns:
+        Tuple[StreamReader, StreamWriter]: 连接
+    """
+    if TCP_FASTOPEN_CONNECT is None:
+        return await asyncio.open_connection(host, port)
+
+    loop = asyncio.get_running_loop()
+    infos = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    last_error: Optional[OSError] = None
+    for family, type_, proto, _, sockaddr in infos:
+        sock = socket.socket(family, type_, proto)
+        try:
+            sock.setblocking(False)
+            try:
+                sock.setsockopt(socket.IPPROTO_TCP, TCP_FASTOPEN_CONNECT, 1)
+            except OSError as e:
+                logger.debug("setsockopt_failed", option="TCP_FASTOPEN_CONNECT", error=str(e))
+            await loop.sock_connect(sock, sockaddr)
+        except OSError as e:
+            sock.close()
+            last_error = e
+            continue
+        except BaseException:
+            sock.close()
+            raise
+        return await asyncio.open_connection(sock=sock)
+    raise last_error or OSError(f"无法解析目标地址: {host}")
+
+
+class TuningProfile:
+    """单个协议编译后的调优参数"""
+
+    __slots__ = ("client_options", "target_options", "buffer_tier", "adaptive")
+
+    def __init__(
+        self,
+        client_options: List[SocketOption],
+        target_options: List[SocketOption],
+        buffer_tier: int,
+        adaptive: bool
+    ):
+        self.client_options = client_options
+        self.target_options = target_options
+        self.buffer_tier = buffer_tier
+        self.adaptive = adaptive
+
+
+def max_buffer_size(config: ProxyConfig) -> int:
+    """自适应缓冲区的实际上限: 两个读缓冲区不超过单连接内存上限的一半"""
+    return max(
+        config.buffer_size,
+        min(config.max_buffer_size, config.max_connection_memory // 4)
+    )
+
+
+def create_buffer_pool(config: ProxyConfig) -> TieredBufferPool:
+    """
+    按配置创建分级缓冲区池
+
+    级别从 min_buffer_size 起按2倍递增到上限,并包含各协议配置的初始大小。
+
+    Args:
+        config: 代理配置
+
+    Returns:
+        TieredBufferPool: 缓冲区池
+    """
+    upper = max_buffer_size(config)
+    sizes = {config.buffer_size}
+    size = min(config.min_buffer_size, config.buffer_size)
+    while size <= upper:
+        sizes.add(size)
+        size *= 2
+    for tuning in config.socket_tuning.values():
+        if tuning.buffer_size is not None:
+            sizes.add(min(tuning.buffer_size, upper))
+
+    return TieredBufferPool(
+        sorted(sizes),
+        initial_size=config.buffer_size,
+        preallocate=config.buffer_pool_size,
+        max_free=config.buffer_pool_size
+    )
+
+
+def build_tuning_profiles(
+    config: ProxyConfig,
+    pool: TieredBufferPool
+) -> Dict[str, TuningProfile]:
+    """
+    为每个协议合并 default 与协议专属配置并编译
+
+    Args:
+        config: 代理配置
+        pool: 分级缓冲区池
+
+    Returns:
+        Dict[str, TuningProfile]: 协议名到调优参数的映射
+    """
+    default = config.socket_tuning.get("default")
+    profiles = {}
+    for protocol in PROTOCOLS:
+        layers = [t for t in (default, config.socket_tuning.get(protocol)) if t is not None]
+
+        client: dict = {}
+        target: dict = {}
+        buffer_size = config.buffer_size
+        adaptive = config.adaptive_buffer
+        for layer in layers:
+            client.update(layer.client.model_dump(exclude_none=True))
+            target.update(layer.target.model_dump(exclude_none=True))
+            if layer.buffer_size is not None:
+                buffer_size = layer.buffer_size
+            if layer.adaptive_buffer is not None:
+                adaptive = layer.adaptive_buffer
+
+        profiles[protocol] = TuningProfile(
+            client_options=compile_socket_options(SocketOptionsConfig(**client)),
+            target_options=compile_socket_options(SocketOptionsConfig(**target)),
+            buffer_tier=pool.tier_for(min(buffer_size, max_buffer_size(config))),
+            adaptive=adaptive
+        )
+    return profiles
@@ -0,0 +1,409 @@
+"""上游代理与负载均衡模块"""
+
+import asyncio
+import base64
+import bisect
+import hashlib
+import ipaddress
+import struct
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .config import UpstreamConfig, UpstreamGroupConfig
+from .logger import get_logger
+from .mux import MuxClient, MuxOpenError, MuxOverloadedError
+from .tuning import open_fastopen_connection
+
+logger = get_logger(__name__)
+
+
+class UpstreamTargetError(ConnectionError):
+    """上游代理拒绝或无法连接目标: 节点本身正常,不计入节点故障,也不换节点重试"""
+
+
+class UpstreamProxy:
+    """上游代理节点,附带被动健康状态"""
+
+    def __init__(self, config: UpstreamConfig):
+        self.config = config
+        self.name = config.name or f"{config.host}:{config.port}"
+
+        # 负载与延迟
+        self.active_connections = 0
+        self.ewma_latency_ms: Optional[float] = None
+
+        # 被动健康检查
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+
+        # 多路复用节点的会话池
+        self.mux: Optional[MuxClient] = MuxClient(config) if config.type == "mux" else None
+
+        # 统计
+        self.total_connections = 0
+        self.total_failures = 0
+
+    def is_available(self, now: float) -> bool:
+        """节点当前是否可用(未被摘除)"""
+        return now >= self.ejected_until
+
+    def record_success(self, latency_ms: float, alpha: float) -> None:
+        """记录一次成功连接"""
+        if self.ewma_latency_ms is None:
+            self.ewma_latency_ms = latency_ms
+        else:
+            self.ewma_latency_ms = alpha * latency_ms + (1 - alpha) * self.ewma_latency_ms
+
+        if self.ejections:
+            logger.info("upstream_readmitted", upstream=self.name)
+        self.consecutive_failures = 0
+        self.ejections = 0
+
+    def record_failure(self, group: UpstreamGroupConfig) -> None:
+        """记录一次失败,连续失败达到阈值后摘除节点"""
+        self.total_failures += 1
+        self.consecutive_failures += 1
+        if self.consecutive_failures < group.max_failures:
+            return
+
+        # 重复摘除时指数退避
+        duration = min(
+            group.eject_duration * (2 ** min(self.ejections, 16)),
+            group.max_eject_duration
+        )
+        self.ejections += 1
+        self.ejected_until = time.monotonic() + duration
+        logger.warning(
+            "upstream_ejected",
+            upstream=self.name,
+            failures=self.consecutive_failures,
+            duration=duration
+        )
+
+    async def open_tunnel(
+        self,
+        host: str,
+        port: int
+    ) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        """
+        通过该上游代理建立到目标的隧道
+
+        Args:
+            host: 目标主机
+            port: 目标端口
+
+        Returns:
+            Tuple[StreamReader, StreamWriter]: 已完成握手的隧道
+        """
+        if self.mux is not None:
+            return await self.mux.open_stream(host, port)
+        if self.config.fastopen:
+            reader, writer = await open_fastopen_connection(self.config.host, self.config.port)
+        else:
+            reader, writer = await asyncio.open_connection(self.config.host, self.config.port)
+        try:
+            if self.config.type == "socks5":
+                await self._socks5_handshake(reader, writer, host, port)
+            else:
+                await self._http_connect(reader, writer, host, port)
+        except BaseException:
+            writer.close()
+            raise
+        return reader, writer
+
+    async def _http_connect(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        host: str,
+        port: int
+    ) -> None:
+        """HTTP CONNECT握手"""
+        authority = f"[{host}]:{port}" if ':' in host else f"{host}:{port}"
+        request = f"CONNECT {authority} HTTP/1.1\r\nHost: {authority}\r\n"
+        if self.config.username is not None:
+            token = base64.b64encode(
+                f"{self.config.username}:{self.config.password or ''}".encode('utf-8')
+            ).decode('ascii')
+            request += f"Proxy-Authorization: Basic {token}\r\n"
+        writer.write((request + "\r\n").encode('utf-8'))
+        await writer.drain()
+
+        status_line = await reader.readline()
+        parts = status_line.split(None, 2)
+        if len(parts) < 2 or not parts[1].isdigit():
+            raise ConnectionError(
+                f"上游代理响应无效: {status_line.decode('utf-8', errors='ignore').strip()}"
+            )
+        if not parts[1].startswith(b'2'):
+            message = f"上游代理拒绝CONNECT: {status_line.decode('utf-8', errors='ignore').strip()}"
+            # 407 是到节点的认证问题,其余状态码反映的是目标
+            if parts[1] == b'407':
+                raise ConnectionError(message)
+            raise UpstreamTargetError(message)
+
+        # 跳过响应头
+        while True:
+            line = await reader.readline()
+            if not line:
+                raise ConnectionError("上游代理提前关闭连接")
+            if line == b'\r\n':
+                break
+
+    async def _socks5_handshake(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        host: str,
+        port: int
+    ) -> None:
+        """SOCKS5握手(可选用户名/密码认证)"""
+        use_auth = self.config.username is not None
+        writer.write(b'\x05\x02\x00\x02' if use_auth else b'\x05\x01\x00')
+        await writer.drain()
+
+        ver, method = await reader.readexactly(2)
+        if ver != 0x05 or method == 0xFF:
+            raise ConnectionError("上游SOCKS5代理不接受认证方法")
+
+        if method == 0x02:
+            username = (self.config.username or '').encode('utf-8')
+            password = (self.config.password or '').encode('utf-8')
+            writer.write(
+                bytes([0x01, len(username)]) + username + bytes([len(password)]) + password
+            )
+            await writer.drain()
+            _, status = await reader.readexactly(2)
+            if status != 0x00:
+                raise ConnectionError("上游SOCKS5代理认证失败")
+
+        # 构建CONNECT请求
+        try:
+            ip = ipaddress.ip_address(host)
+            if ip.version == 4:
+                address = b'\x01' + ip.packed
+            else:
+                address = b'\x04' + ip.packed
+        except ValueError:
+            host_bytes = host.encode('idna')
+            address = b'\x03' + bytes([len(host_bytes)]) + host_bytes
+        writer.write(b'\x05\x01\x00' + address + struct.pack('!H', port))
+        await writer.drain()
+
+        ver, rep, _, atyp = await reader.readexactly(4)
+        if rep != 0x00:
+            raise UpstreamTargetError(f"上游SOCKS5代理连接失败: REP={rep}")
+
+        # 跳过BND.ADDR和BND.PORT
+        if atyp == 0x01:
+            await reader.readexactly(4 + 2)
+        elif atyp == 0x04:
+            await reader.readexactly(16 + 2)
+        else:
+            length = (await reader.readexactly(1))[0]
+            await reader.readexactly(length + 2)
+
+    def get_stats_dict(self) -> dict:
+        """获取节点统计信息"""
+        stats = {
+            "name": self.name,
+            "available": self.is_available(time.monotonic()),
+            "active_connections": self.active_connections,
+            "ewma_latency_ms": (
+                round(self.ewma_latency_ms, 2) if self.ewma_latency_ms is not None else None
+            ),
+            "consecutive_failures": self.consecutive_failures,
+            "total_connections": self.total_connections,
+            "total_failures": self.total_failures,
+        }
+        if self.mux is not None:
+            stats["mux"] = self.mux.get_stats_dict()
+        return stats
+
+
+class UpstreamGroup:
+    """上游代理组,负责节点选择和故障转移"""
+
+    def __init__(self, config: UpstreamGroupConfig):
+        self.config = config
+        self.name = config.name
+        self.upstreams = [UpstreamProxy(c) for c in config.upstreams]
+
+        # 加权轮询序列
+        self._rr_sequence = [
+            upstream for upstream in self.upstreams for _ in range(upstream.config.weight)
+        ]
+        self._rr_index = 0
+
+        # 一致性哈希环
+        self._ring_keys: List[int] = []
+        self._ring_nodes: List[UpstreamProxy] = []
+        if config.strategy == "consistent_hash":
+            self._build_ring()
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+    def _build_ring(self) -> None:
+        """构建一致性哈希环"""
+        points = []
+        for upstream in self.upstreams:
+            replicas = self.config.virtual_nodes * upstream.config.weight
+            for i in range(replicas):
+                points.append((self._hash(f"{upstream.name}#{i}"), upstream))
+        points.sort(key=lambda point: point[0])
+        self._ring_keys = [point[0] for point in points]
+        self._ring_nodes = [point[1] for point in points]
+
+    def select(self, host: str, exclude: Tuple[UpstreamProxy, ...] = ()) -> UpstreamProxy:
+        """
+        按策略选择一个上游节点
+
+        Args:
+            host: 目标主机(一致性哈希使用)
+            exclude: 本次已尝试过的节点
+
+        Returns:
+            UpstreamProxy: 选中的节点
+        """
+        now = time.monotonic()
+        candidates = [
+            u for u in self.upstreams if u.is_available(now) and u not in exclude
+        ]
+        if not candidates:
+            # 全部被摘除时退化为使用所有未尝试节点,避免整组不可用
+            candidates = [u for u in self.upstreams if u not in exclude] or self.upstreams
+
+        strategy = self.config.strategy
+        if strategy == "least_connections":
+            return min(candidates, key=lambda u: u.active_connections / u.config.weight)
+
+        if strategy == "ewma_latency":
+            # 未测量过的节点延迟视为0,优先探测
+            return min(
+                candidates,
+                key=lambda u: (u.ewma_latency_ms or 0.0) * (u.active_connections + 1)
+                / u.config.weight
+            )
+
+        if strategy == "consistent_hash":
+            index = bisect.bisect(self._ring_keys, self._hash(host))
+            ring_size = len(self._ring_nodes)
+            for offset in range(ring_size):
+                node = self._ring_nodes[(index + offset) % ring_size]
+                if node in candidates:
+                    return node
+            return candidates[0]
+
+        # round_robin
+        for _ in range(len(self._rr_sequence)):
+            upstream = self._rr_sequence[self._rr_index % len(self._rr_sequence)]
+            self._rr_index += 1
+            if upstream in candidates:
+                return upstream
+        return candidates[0]
+
+    async def open_connection(
+        self,
+        host: str,
+        port: int,
+        timeout: Optional[float] = None
+    ) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        """
+        经代理组建立到目标的连接,节点故障时切换到其他节点
+
+        Args:
+            host: 目标主机
+            port: 目标端口
+            timeout: 建立连接的总超时(秒),None表示不限制
+
+        Returns:
+            Tuple[StreamReader, StreamWriter]: 已建立的隧道
+
+        Raises:
+            UpstreamTargetError: 节点拒绝或无法连接目标
+            MuxOpenError: 多路复用节点拒绝或无法连接目标
+            TimeoutError: 超过 timeout 仍未建立连接
+        """
+        tried: Tuple[UpstreamProxy, ...] = ()
+        attempts = min(self.config.max_attempts, len(self.upstreams))
+        last_error: Optional[BaseException] = None
+
+        async with asyncio.timeout(timeout) as deadline:
+            for _ in range(attempts):
+                upstream = self.select(host, tried)
+                tried += (upstream,)
+                upstream.total_connections += 1
+                upstream.active_connections += 1
+                started = time.monotonic()
+                try:
+                    reader, writer = await upstream.open_tunnel(host, port)
+                except asyncio.CancelledError:
+                    upstream.active_connections -= 1
+                    # 连接超时计入节点故障,客户端断开等外部取消不计入
+                    if deadline.expired():
+                        upstream.record_failure(self.config)
+                    raise
+                except (UpstreamTargetError, MuxOpenError):
+                    # 目标级错误(含多路复用节点回复的 OPEN_FAIL): 换节点只会重复请求目标
+                    upstream.active_connections -= 1
+                    raise
+                except Exception as e:
+                    # 连接、握手、认证失败和提前断开计入节点故障;
+                    # 节点过载时换节点重试,但不摘除该节点
+                    upstream.active_connections -= 1
+                    if not isinstance(e, MuxOverloadedError):
+                        upstream.record_failure(self.config)
+                    last_error = e
+                    logger.warning(
+                        "upstream_connect_failed",
+                        group=self.name,
+                        upstream=upstream.name,
+                        target=f"{host}:{port}",
+                        error=str(e)
+                    )
+                    continue
+
+                upstream.record_success((time.monotonic() - started) * 1000, self.config.ewma_alpha)
+                self._track_release(writer, upstream)
+                return reader, writer
+
+        raise ConnectionError(f"上游代理组 {self.name} 无可用节点: {last_error}")
+
+    @staticmethod
+    def _track_release(writer: asyncio.StreamWriter, upstream: UpstreamProxy) -> None:
+        """连接关闭时释放节点的活跃连接计数"""
+        def release(task: asyncio.Future) -> None:
+            upstream.active_connections -= 1
+            if not task.cancelled():
+                task.exception()
+
+        asyncio.ensure_future(writer.wait_closed()).add_done_callback(release)
+
+    def close(self) -> None:
+        """关闭到各节点的持久连接(多路复用会话)"""
+        for upstream in self.upstreams:
+            if upstream.mux is not None:
+                upstream.mux.close()
+
+    def get_stats_dict(self) -> dict:
+        """获取代理组统计信息"""
+        return {
+            "strategy": self.config.strategy,
+            "upstreams": [u.get_stats_dict() for u in self.upstreams],
+        }
+
+
+def create_upstream_groups(configs: List[UpstreamGroupConfig]) -> Dict[str, UpstreamGroup]:
+    """
+    创建上游代理组
+
+    Args:
+        configs: 代理组配置列表
+
+    Returns:
+        Dict[str, UpstreamGroup]: 名称到代理组的映射
+    """
+    return {config.name: UpstreamGroup(config) for config in configs}
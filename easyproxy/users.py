@@ -0,0 +1,361 @@
+"""用户存储模块"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+from .config import AuthConfig
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+# 用户文件中的密码以此开头表示用户已禁用(与 /etc/shadow 的锁定约定一致)
+DISABLED_PREFIX = "!"
+
+# verify() 的失败原因
+UNKNOWN_USER = "unknown_user"
+USER_DISABLED = "user_disabled"
+INVALID_PASSWORD = "invalid_credentials"
+UNSUPPORTED_HASH = "unsupported_hash"
+
+_ITOA64 = "./0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+
+# 慢哈希(需要多轮计算)验证成功后缓存,同一用户后续使用相同密码时不再重复计算
+_SLOW_HASH_PREFIXES = ("$apr1$", "$1$", "$2a$", "$2b$", "$2y$")
+
+
+def _md5_crypt(password: bytes, salt: bytes, magic: bytes) -> str:
+    """MD5-crypt($1$)及 Apache 变体($apr1$)"""
+    final = hashlib.md5(password + salt + password).digest()
+    ctx = password + magic + salt
+    for length in range(len(password), 0, -16):
+        ctx += final[:min(16, length)]
+    length = len(password)
+    while length:
+        ctx += b"\0" if length & 1 else password[:1]
+        length >>= 1
+    final = hashlib.md5(ctx).digest()
+
+    for i in range(1000):
+        data = password if i & 1 else final
+        if i % 3:
+            data += salt
+        if i % 7:
+            data += password
+        data += final if i & 1 else password
+        final = hashlib.md5(data).digest()
+
+    encoded = []
+    for a, b, c in ((0, 6, 12), (1, 7, 13), (2, 8, 14), (3, 9, 15), (4, 10, 5)):
+        value = final[a] << 16 | final[b] << 8 | final[c]
+        for _ in range(4):
+            encoded.append(_ITOA64[value & 0x3f])
+            value >>= 6
+    value = final[11]
+    for _ in range(2):
+        encoded.append(_ITOA64[value & 0x3f])
+        value >>= 6
+    return f"{magic.decode()}{salt.decode()}${''.join(encoded)}"
+
+
+def check_password(stored: str, password: str) -> Optional[bool]:
+    """
+    校验密码
+
+    支持明文、{SHA}、$apr1$ / $1$ (MD5-crypt),以及安装 bcrypt 后的 $2a$ / $2b$ / $2y$。
+
+    Args:
+        stored: 存储的密码或哈希
+        password: 客户端提供的密码
+
+    Returns:
+        Optional[bool]: 是否匹配,不支持的哈希格式返回None
+    """
+    secret = password.encode('utf-8')
+    if stored.startswith("{SHA}"):
+        digest = base64.b64encode(hashlib.sha1(secret).digest()).decode('ascii')
+        return hmac.compare_digest(digest, stored[5:])
+    if stored.startswith(("$apr1$", "$1$")):
+        magic, _, rest = stored[1:].partition("$")
+        salt = rest.partition("$")[0][:8]
+        computed = _md5_crypt(secret, salt.encode('ascii'), f"${magic}$".encode('ascii'))
+        return hmac.compare_digest(computed, stored)
+    if stored.startswith(("$2a$", "$2b$", "$2y$")):
+        try:
+            import bcrypt
+        except ImportError:
+            return None
+        # bcrypt 库不识别 htpasswd 使用的 $2y$ 前缀,两者算法相同
+        return bcrypt.checkpw(secret, ("$2b$" + stored[4:]).encode('ascii'))
+    if stored.startswith("$"):
+        return None
+    return hmac.compare_digest(stored.encode('utf-8'), secret)
+
+
+class UserStore:
+    """
+    用户存储
+
+    用户在加载时建立内存索引(用户名 → 存储的密码),连接路径上的查找只是一次字典访问,
+    与用户数量无关。文件类存储由后台任务定期检查文件变化,在线程中重新加载后替换索引,
+    不阻塞事件循环;加载失败时保留原有索引。
+    """
+
+    source = "inline"
+    # 存储的是否为 htpasswd 格式的密码(可能带哈希前缀或 DISABLED_PREFIX)
+    hashed = True
+
+    def __init__(self, reload_interval: float = 0):
+        """
+        初始化用户存储
+
+        Args:
+            reload_interval: 检查变化的间隔(秒),0表示不自动重新加载
+        """
+        self.reload_interval = reload_interval
+        self._users: Dict[str, str] = {}
+        self._verified: Dict[str, bytes] = {}
+        self._signature: Optional[Tuple] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # 统计
+        self.reloads = 0
+        self.reload_errors = 0
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def load(self) -> Dict[str, str]:
+        """读取全部用户,返回 用户名 → 存储的密码(禁用用户带 DISABLED_PREFIX 前缀)"""
+        raise NotImplementedError
+
+    def is_disabled(self, username: str, stored: str) -> bool:
+        """用户是否已禁用"""
+        return stored.startswith(DISABLED_PREFIX)
+
+    def signature(self) -> Optional[Tuple]:
+        """数据源的版本标识,变化时触发重新加载;None表示不支持检测"""
+        return None
+
+    def reload(self) -> None:
+        """同步加载全部用户并替换索引"""
+        self._signature = self.signature()
+        self._replace(self.load())
+
+    def _replace(self, users: Dict[str, str]) -> None:
+        old = self._users
+        added = sum(1 for name in users if name not in old)
+        removed = sum(1 for name in old if name not in users)
+        changed = sum(1 for name, stored in users.items() if name in old and old[name] != stored)
+        self._users = users
+        # 密码变化或被删除的用户使缓存失效
+        if removed or changed:
+            self._verified = {
+                name: digest for name, digest in self._verified.items()
+                if users.get(name) == old.get(name)
+            }
+        if old:
+            logger.info(
+                "users_reloaded",
+                source=self.source,
+                users=len(users),
+                added=added,
+                removed=removed,
+                changed=changed
+            )
+
+    def _check_changed(self) -> Optional[Dict[str, str]]:
+        """在线程中执行: 数据源有变化时返回新的用户表"""
+        signature = self.signature()
+        if signature is None or signature == self._signature:
+            return None
+        # 先记录版本,加载失败时等待下一次变化,不重复报错
+        self._signature = signature
+        return self.load()
+
+    def start(self) -> None:
+        """在当前事件循环中启动变化检测"""
+        if self.reload_interval > 0 and self.signature() is not None:
+            self._task = asyncio.get_running_loop().create_task(
+                self._watch(), name="easyproxy-user-store"
+            )
+
+    def stop(self) -> None:
+        """停止变化检测"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                users = await asyncio.to_thread(self._check_changed)
+            except (OSError, ValueError, sqlite3.Error) as e:
+                self.reload_errors += 1
+                logger.error("users_reload_failed", source=self.source, error=str(e))
+                continue
+            if users is not None:
+                self.reloads += 1
+                self._replace(users)
+
+    def verify(self, username: str, password: str) -> Optional[str]:
+        """
+        校验用户名和密码
+
+        Returns:
+            Optional[str]: 成功返回None,失败返回原因
+        """
+        stored = self._users.get(username)
+        if stored is None:
+            return UNKNOWN_USER
+        if self.is_disabled(username, stored):
+            return USER_DISABLED
+        if not self.hashed:
+            if hmac.compare_digest(stored.encode('utf-8'), password.encode('utf-8')):
+                return None
+            return INVALID_PASSWORD
+
+        slow = stored.startswith(_SLOW_HASH_PREFIXES)
+        if slow:
+            key = hashlib.sha256(f"{stored}\0{password}".encode('utf-8')).digest()
+            cached = self._verified.get(username)
+            if cached is not None and hmac.compare_digest(cached, key):
+                return None
+
+        matched = check_password(stored, password)
+        if matched is None:
+            logger.warning("unsupported_password_hash", username=username, source=self.source)
+            return UNSUPPORTED_HASH
+        if not matched:
+            return INVALID_PASSWORD
+        if slow:
+            self._verified[username] = key
+        return None
+
+    def get_stats_dict(self) -> dict:
+        """获取用户存储统计信息"""
+        return {
+            "source": self.source,
+            "users": len(self._users),
+            "disabled": sum(
+                1 for name, stored in self._users.items() if self.is_disabled(name, stored)
+            ),
+            "reloads": self.reloads,
+            "reload_errors": self.reload_errors,
+        }
+
+
+class InlineUserStore(UserStore):
+    """
+    配置文件中 users 定义的用户
+
+    密码始终按明文比较,不解析 ! 或哈希前缀;禁用的用户由 disabled_users 单独指定。
+    """
+
+    hashed = False
+
+    def __init__(self, users: Dict[str, str], disabled: List[str]):
+        super().__init__()
+        self.users = users
+        self.disabled = set(disabled)
+
+    def load(self) -> Dict[str, str]:
+        return dict(self.users)
+
+    def is_disabled(self, username: str, stored: str) -> bool:
+        return username in self.disabled
+
+
+class _FileUserStore(UserStore):
+    """基于本地文件的用户存储"""
+
+    def __init__(self, path: str, reload_interval: float):
+        super().__init__(reload_interval)
+        self.path = path
+
+    def signature(self) -> Optional[Tuple]:
+        # 同时检查 SQLite 的WAL文件,WAL模式下写入不会修改主文件
+        result = []
+        for path in (self.path, self.path + "-wal"):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                result.append(None)
+                continue
+            result.append((st.st_ino, st.st_size, st.st_mtime_ns))
+        return tuple(result)
+
+
+class HtpasswdUserStore(_FileUserStore):
+    """
+    htpasswd 格式的用户文件
+
+    每行 "用户名:密码或哈希",空行和 # 开头的行被忽略;
+    密码以 ! 开头表示该用户已禁用。
+    """
+
+    source = "htpasswd"
+
+    def load(self) -> Dict[str, str]:
+        users: Dict[str, str] = {}
+        with open(self.path, encoding="utf-8") as f:
+            for number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                username, sep, stored = line.partition(":")
+                if not sep or not username or not stored:
+                    raise ValueError(f"{self.path}:{number}: 无效的用户行")
+                users[username] = stored
+        return users
+
+
+class SqliteUserStore(_FileUserStore):
+    """
+    SQLite 用户数据库
+
+    表结构: users(username TEXT PRIMARY KEY, password TEXT NOT NULL,
+    disabled INTEGER NOT NULL DEFAULT 0),password 支持与 htpasswd 相同的格式。
+    """
+
+    source = "sqlite"
+
+    def load(self) -> Dict[str, str]:
+        # 只读打开,避免创建空数据库
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            rows = conn.execute("SELECT username, password, disabled FROM users")
+            return {
+                username: DISABLED_PREFIX + stored if disabled else stored
+                for username, stored, disabled in rows
+            }
+        finally:
+            conn.close()
+
+
+def create_user_store(config: AuthConfig) -> UserStore:
+    """
+    按认证配置创建用户存储并完成首次加载
+
+    Args:
+        config: 认证配置
+
+    Returns:
+        UserStore: 用户存储
+
+    Raises:
+        OSError / ValueError / sqlite3.Error: 用户文件无法读取或格式错误
+    """
+    if config.backend == "htpasswd":
+        store: UserStore = HtpasswdUserStore(config.users_file, config.reload_interval)
+    elif config.backend == "sqlite":
+        store = SqliteUserStore(config.users_file, config.reload_interval)
+    else:
+        store = InlineUserStore(config.users, config.disabled_users)
+    store.reload()
+    return store